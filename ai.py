@@ -0,0 +1,179 @@
+"""CPU opponent: short-horizon lookahead over cloned fighters, within a per-frame time budget.
+
+Usage: python ai.py [--difficulty LEVEL] [--seconds S]
+(a headless benchmark: the CPU plays a scripted player 1 and decision times are reported)
+
+Every few ticks (depending on difficulty) the CPU copies both fighters' state
+into a pair of headless sandbox fighters and plays out each candidate input
+for a few ticks, with the other player assumed to keep its current input. The
+candidate whose end state scores best is held until the next decision. The
+search deepens (2, 4, 8, ... ticks, each level continuing the previous one)
+until the difficulty's horizon is reached or the next level would not fit in
+the time budget; the deepest fully searched horizon decides.
+"""
+import argparse
+import random
+import time
+from collections import namedtuple, deque
+
+import numpy as np
+
+from engine import ATTACK1, ATTACK2, JUMP, LEFT, MASK_KEYS, RIGHT, Match, headless_fighters, random_script
+from settings import SIM_RATE
+
+#inputs the CPU chooses between
+CANDIDATES = (0, LEFT, RIGHT, JUMP, ATTACK1, ATTACK2, LEFT | JUMP, RIGHT | JUMP)
+
+#think_every: ticks between decisions (reaction time), max_depth: longest lookahead in ticks,
+#mistake: chance of taking a random candidate instead of the best, aggression: pull towards attack range
+Difficulty = namedtuple("Difficulty", ["think_every", "max_depth", "mistake", "aggression"])
+DIFFICULTIES = {
+  "easy": Difficulty(12, 4, 0.3, 0.02),
+  "normal": Difficulty(6, 8, 0.1, 0.05),
+  "hard": Difficulty(2, 16, 0.0, 0.1),
+}
+DEFAULT_BUDGET = 0.0008#seconds per decision, under 1 ms of a 16.7 ms frame
+
+
+class AiStats():
+  #decision count, time budget overruns, searched depth and rolling decision times
+  def __init__(self, window=600):
+    self.decisions = 0
+    self.overruns = 0
+    self.depths = {}#deepest completed horizon -> decisions
+    self.times = deque(maxlen=window)
+
+  def summary(self, budget):
+    lines = [f"decisions: {self.decisions}  over the {budget * 1000:.2f} ms budget: {self.overruns}"]
+    if self.times:
+      times = np.fromiter(self.times, dtype=np.float64) * 1000
+      lines.append(f"decision time: p50 {np.percentile(times, 50):.3f}  p95 {np.percentile(times, 95):.3f}  "
+                   f"max {times.max():.3f} ms")
+    if self.depths:
+      lines.append("search depth: " + "  ".join(f"{depth} ticks x{count}" for depth, count in sorted(self.depths.items())))
+    return "\n".join(lines)
+
+
+class CpuOpponent():
+  #produces an input mask for one fighter each tick; main.py turns it into player 2's key state
+  def __init__(self, player=2, difficulty="normal", budget=DEFAULT_BUDGET, seed=None, profiler=None):
+    self.player = player
+    self.difficulty = DIFFICULTIES[difficulty]
+    self.budget = budget
+    self.rng = random.Random(seed)
+    self.profiler = profiler
+    self.stats = AiStats()
+    self.sandbox_1, self.sandbox_2 = headless_fighters()
+    self.mask = 0
+    self.next_decision = 0
+    self.tick_cost = 5e-6#running estimate of seconds per sandbox tick, keeps whole levels inside the budget
+
+  def decide(self, match, opponent_mask):
+    #input mask for this tick; opponent_mask is the other player's input on the same tick
+    if match.intro_count > 0 or match.round_over:
+      self.mask = 0
+      return 0
+    if match.tick < self.next_decision:
+      return self.mask
+    self.next_decision = match.tick + self.difficulty.think_every
+    start = time.perf_counter()
+    best, depth = self._search(match, opponent_mask, start + self.budget)
+    if self.difficulty.mistake and self.rng.random() < self.difficulty.mistake:
+      self.mask = self.rng.choice(CANDIDATES)
+    else:
+      self.mask = best
+    elapsed = time.perf_counter() - start
+    stats = self.stats
+    stats.decisions += 1
+    stats.times.append(elapsed)
+    stats.depths[depth] = stats.depths.get(depth, 0) + 1
+    if elapsed > self.budget:
+      stats.overruns += 1
+    if self.profiler is not None:
+      self.profiler.record("ai.decide", start, start + elapsed)
+    return self.mask
+
+  def _search(self, match, opponent_mask, deadline):
+    #iterative deepening: returns (best candidate, deepest horizon searched completely)
+    state = (match.fighter_1.snapshot(), match.fighter_2.snapshot())
+    #the sandbox lands hits the same way as the match (frame counts match, so hitbox tables carry over)
+    self.sandbox_1.hitboxes = match.fighter_1.hitboxes
+    self.sandbox_2.hitboxes = match.fighter_2.hitboxes
+    states = dict.fromkeys(CANDIDATES, state)
+    best, searched = self.mask, 0
+    depth = 2
+    while depth <= self.difficulty.max_depth:
+      #each candidate continues from where the previous horizon left it, so a level costs depth - searched ticks
+      ticks = (depth - searched) * len(CANDIDATES)
+      if time.perf_counter() + ticks * self.tick_cost > deadline:
+        break
+      level_start = time.perf_counter()
+      scores = {}
+      for mask in CANDIDATES:
+        scores[mask], states[mask] = self._rollout(match, states[mask], mask, opponent_mask, depth - searched)
+      self.tick_cost += 0.25 * ((time.perf_counter() - level_start) / ticks - self.tick_cost)
+      #ties keep the current input so the fighter does not twitch between equal options
+      best = max(CANDIDATES, key=lambda mask: (scores[mask], mask == self.mask))
+      searched = depth
+      depth *= 2
+    return best, searched
+
+  def _rollout(self, match, state, mask, opponent_mask, ticks):
+    #advance a sandbox copy of both fighters; returns (score, state after the extra ticks)
+    fighter_1, fighter_2 = self.sandbox_1, self.sandbox_2
+    fighter_1.restore(state[0])
+    fighter_2.restore(state[1])
+    if self.player == 1:
+      keys_1, keys_2 = MASK_KEYS[1][mask], MASK_KEYS[2][opponent_mask]
+    else:
+      keys_1, keys_2 = MASK_KEYS[1][opponent_mask], MASK_KEYS[2][mask]
+    width = match.screen_width
+    height = match.screen_height
+    strikes = fighter_1.hitboxes is not None or fighter_2.hitboxes is not None
+    #same order as Match.step
+    for _ in range(ticks):
+      fighter_1.move(width, height, None, fighter_2, False, keys_1)
+      fighter_2.move(width, height, None, fighter_1, False, keys_2)
+      fighter_1.update()
+      fighter_2.update()
+      if strikes:
+        fighter_1.strike(fighter_2)
+        fighter_2.strike(fighter_1)
+    own, other = (fighter_1, fighter_2) if self.player == 1 else (fighter_2, fighter_1)
+    return self._evaluate(own, other), (fighter_1.snapshot(), fighter_2.snapshot())
+
+  def _evaluate(self, own, other):
+    #health lead first, then being just inside attack reach with the opponent's attack spent
+    value = (own.health - other.health) * 100.0
+    reach = own.ATTACK_WIDTH * own.rect.width
+    distance = abs(own.rect.centerx - other.rect.centerx)
+    value -= abs(distance - reach * 0.75) * self.difficulty.aggression
+    value += (other.attack_cooldown - own.attack_cooldown) * 0.5
+    return value
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Benchmark the CPU opponent against scripted input")
+  parser.add_argument("--difficulty", choices=sorted(DIFFICULTIES), default=None, help="one level (default: all)")
+  parser.add_argument("--seconds", type=float, default=60.0)
+  parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET * 1000, help="decision budget in ms")
+  parser.add_argument("--seed", type=int, default=0)
+  args = parser.parse_args()
+
+  ticks = int(args.seconds * SIM_RATE)
+  script = random_script(args.seed, ticks)
+  for name in [args.difficulty] if args.difficulty else ["easy", "normal", "hard"]:
+    cpu = CpuOpponent(difficulty=name, budget=args.budget / 1000, seed=args.seed)
+    match = Match()
+    start = time.perf_counter()
+    for tick in range(ticks):
+      mask_1 = script[tick]
+      match.step(MASK_KEYS[1][mask_1], MASK_KEYS[2][cpu.decide(match, mask_1)])
+    elapsed = time.perf_counter() - start
+    print(f"{name}: score {match.score[0]}-{match.score[1]} against random input over {ticks} ticks "
+          f"({elapsed:.2f} s)")
+    print(cpu.stats.summary(cpu.budget))
+
+
+if __name__ == "__main__":
+  main()
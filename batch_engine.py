@@ -0,0 +1,286 @@
+import sys
+import time
+
+import numpy as np
+from engine import INTRO_COUNT, INTRO_COUNT_TICKS, ROUND_OVER_TICKS, LEFT, RIGHT, JUMP, ATTACK1, ATTACK2
+from fighter import Fighter
+from settings import SCREEN_WIDTH, SCREEN_HEIGHT, WARRIOR_ANIMATION_STEPS, WIZARD_ANIMATION_STEPS
+
+#fighter body and spawn positions, as set up by engine.headless_fighters
+BODY_WIDTH = 80
+BODY_HEIGHT = 180
+SPAWN_X = (200, 700)
+SPAWN_Y = 310
+SPAWN_FLIP = (False, True)
+#per fighter, per action: number of animation frames
+ANIMATION_LENGTHS = np.array([WARRIOR_ANIMATION_STEPS, WIZARD_ANIMATION_STEPS], dtype=np.int32)
+
+#rules default to the Fighter class values so both engines share one source of truth
+DEFAULT_RULES = {
+  "SPEED": Fighter.SPEED,
+  "GRAVITY": Fighter.GRAVITY,
+  "JUMP_VELOCITY": Fighter.JUMP_VELOCITY,
+  "ATTACK_DAMAGE": Fighter.ATTACK_DAMAGE,
+  "ATTACK_COOLDOWN": Fighter.ATTACK_COOLDOWN,
+  "ATTACK_WIDTH": Fighter.ATTACK_WIDTH,
+  "ANIMATION_COOLDOWN_TICKS": Fighter.ANIMATION_COOLDOWN_TICKS,
+}
+
+
+class BatchMatch():
+  #N independent matches held as arrays of shape (2, N) (fighter, match), advanced together one tick per step()
+  def __init__(self, n, rules=None, screen_width=SCREEN_WIDTH, screen_height=SCREEN_HEIGHT,
+               intro_count=INTRO_COUNT, round_over_ticks=ROUND_OVER_TICKS):
+    self.n = n
+    self.rules = dict(DEFAULT_RULES, **(rules or {}))
+    self.screen_width = screen_width
+    self.screen_height = screen_height
+    self.intro_start = intro_count
+    self.round_over_limit = round_over_ticks
+    self.reach = int(self.rules["ATTACK_WIDTH"] * BODY_WIDTH)
+
+    #fighter state
+    self.x = np.zeros((2, n), dtype=np.int32)
+    self.y = np.zeros((2, n), dtype=np.int32)
+    self.vel_y = np.zeros((2, n), dtype=np.int32)
+    self.health = np.zeros((2, n), dtype=np.int32)
+    self.action = np.zeros((2, n), dtype=np.int32)
+    self.frame_index = np.zeros((2, n), dtype=np.int32)
+    self.update_ticks = np.zeros((2, n), dtype=np.int32)
+    self.attack_type = np.zeros((2, n), dtype=np.int32)
+    self.attack_cooldown = np.zeros((2, n), dtype=np.int32)
+    self.flip = np.zeros((2, n), dtype=bool)
+    self.running = np.zeros((2, n), dtype=bool)
+    self.jump = np.zeros((2, n), dtype=bool)
+    self.attacking = np.zeros((2, n), dtype=bool)
+    self.hit = np.zeros((2, n), dtype=bool)
+    self.alive = np.zeros((2, n), dtype=bool)
+
+    #match state
+    self.score = np.zeros((2, n), dtype=np.int32)
+    self.tick = 0
+    self.intro_count = np.full(n, intro_count, dtype=np.int32)
+    self.intro_ticks = np.zeros(n, dtype=np.int32)
+    self.round_over = np.zeros(n, dtype=bool)
+    self.round_over_ticks = np.zeros(n, dtype=np.int32)
+    self.rounds = np.zeros(n, dtype=np.int32)
+    self.reset_fighters(np.ones(n, dtype=bool))
+
+  def reset_fighters(self, mask):
+    #respawn both fighters in the selected matches
+    for i in (0, 1):
+      self.x[i, mask] = SPAWN_X[i]
+      self.y[i, mask] = SPAWN_Y
+      self.flip[i, mask] = SPAWN_FLIP[i]
+      self.health[i, mask] = 100
+      self.alive[i, mask] = True
+      for array in (self.vel_y, self.action, self.frame_index, self.update_ticks, self.attack_type, self.attack_cooldown):
+        array[i, mask] = 0
+      for array in (self.running, self.jump, self.attacking, self.hit):
+        array[i, mask] = False
+
+  def _move(self, i, keys, active):
+    #vectorized Fighter.move for fighter i against fighter 1 - i
+    j = 1 - i
+    rules = self.rules
+    x, y = self.x[i], self.y[i]
+    self.running[i] = False
+    self.attack_type[i] = 0
+    dx = np.zeros(self.n, dtype=np.int32)
+
+    can_act = active & ~self.attacking[i] & self.alive[i] & ~self.round_over
+    left = can_act & (keys & LEFT != 0)
+    right = can_act & (keys & RIGHT != 0)
+    dx[left] = -rules["SPEED"]
+    dx[right] = rules["SPEED"]
+    self.running[i] |= left | right
+    jumping = can_act & (keys & JUMP != 0) & ~self.jump[i]
+    self.vel_y[i][jumping] = rules["JUMP_VELOCITY"]
+    self.jump[i] |= jumping
+
+    attack1 = can_act & (keys & ATTACK1 != 0)
+    attack2 = can_act & (keys & ATTACK2 != 0)
+    attacking = (attack1 | attack2) & (self.attack_cooldown[i] == 0)
+    if attacking.any():
+      #attack rect: reach wide, on the facing side of the body centre, tested against the target body
+      ax = x + BODY_WIDTH // 2 - self.reach * self.flip[i]
+      tx, ty = self.x[j], self.y[j]
+      landed = attacking & (ax < tx + BODY_WIDTH) & (tx < ax + self.reach) & (y < ty + BODY_HEIGHT) & (ty < y + BODY_HEIGHT)
+      self.attacking[i] |= attacking
+      self.health[j][landed] -= rules["ATTACK_DAMAGE"]
+      self.hit[j] |= landed
+    self.attack_type[i][attack1] = 1
+    self.attack_type[i][attack2] = 2
+
+    #apply gravity
+    self.vel_y[i][active] += rules["GRAVITY"]
+    dy = np.where(active, self.vel_y[i], 0)
+    dx = np.where(active, dx, 0)
+
+    #ensure player stays on screen
+    dx = np.where(x + dx < 0, -x, dx)
+    dx = np.where(x + BODY_WIDTH + dx > self.screen_width, self.screen_width - (x + BODY_WIDTH), dx)
+    floor = self.screen_height - 110
+    grounded = active & (y + BODY_HEIGHT + dy > floor)
+    self.vel_y[i][grounded] = 0
+    self.jump[i][grounded] = False
+    dy = np.where(grounded, floor - (y + BODY_HEIGHT), dy)
+
+    #ensure players face each other
+    self.flip[i] = np.where(active, ~(self.x[j] + BODY_WIDTH // 2 > x + BODY_WIDTH // 2), self.flip[i])
+
+    #apply attack cooldown
+    cooling = active & (self.attack_cooldown[i] > 0)
+    self.attack_cooldown[i][cooling] -= 1
+
+    #update player position
+    self.x[i] += dx
+    self.y[i] += dy
+
+  def _update(self, i):
+    #vectorized Fighter.update for fighter i
+    health = self.health[i]
+    dead = health <= 0
+    health[dead] = 0
+    self.alive[i][dead] = False
+    hit = ~dead & self.hit[i]
+    attacking = ~dead & ~hit & self.attacking[i]
+    jump = ~dead & ~hit & ~self.attacking[i] & self.jump[i]
+    running = ~dead & ~hit & ~self.attacking[i] & ~self.jump[i] & self.running[i]
+    idle = ~dead & ~hit & ~self.attacking[i] & ~self.jump[i] & ~self.running[i]
+
+    new_action = self.action[i].copy()
+    new_action[dead] = 6
+    new_action[hit] = 5
+    new_action[attacking & (self.attack_type[i] == 1)] = 3
+    new_action[attacking & (self.attack_type[i] == 2)] = 4
+    new_action[jump] = 2
+    new_action[running] = 1
+    new_action[idle] = 0
+    changed = new_action != self.action[i]
+    self.action[i] = new_action
+    self.frame_index[i][changed] = 0
+    self.update_ticks[i][changed] = 0
+
+    self.update_ticks[i] += 1
+    advance = self.update_ticks[i] >= self.rules["ANIMATION_COOLDOWN_TICKS"]
+    self.frame_index[i][advance] += 1
+    self.update_ticks[i][advance] = 0
+
+    length = ANIMATION_LENGTHS[i][self.action[i]]
+    finished = self.frame_index[i] >= length
+    if finished.any():
+      alive = self.alive[i]
+      self.frame_index[i] = np.where(finished & ~alive, length - 1, np.where(finished, 0, self.frame_index[i]))
+      recovering = finished & alive & ((self.action[i] == 3) | (self.action[i] == 4) | (self.action[i] == 5))
+      self.attacking[i][recovering] = False
+      self.attack_cooldown[i][recovering] = self.rules["ATTACK_COOLDOWN"]
+      self.hit[i][finished & alive & (self.action[i] == 5)] = False
+
+  def step(self, keys_1, keys_2):
+    #advance every match by one tick; keys are (N,) input masks per fighter
+    self.tick += 1
+    fighting = self.intro_count <= 0
+    self._move(0, keys_1, fighting)
+    self._move(1, keys_2, fighting)
+
+    #update count timers
+    counting = ~fighting
+    self.intro_ticks[counting] += 1
+    step_count = counting & (self.intro_ticks >= INTRO_COUNT_TICKS)
+    self.intro_count[step_count] -= 1
+    self.intro_ticks[step_count] = 0
+
+    self._update(0)
+    self._update(1)
+
+    #check for player defeat
+    was_over = self.round_over.copy()
+    p2_wins = ~was_over & ~self.alive[0]
+    p1_wins = ~was_over & self.alive[0] & ~self.alive[1]
+    self.score[1][p2_wins] += 1
+    self.score[0][p1_wins] += 1
+    ended = p1_wins | p2_wins
+    self.round_over |= ended
+    self.round_over_ticks[ended] = 0
+    self.rounds[ended] += 1
+
+    self.round_over_ticks[was_over] += 1
+    restart = was_over & (self.round_over_ticks > self.round_over_limit)
+    if restart.any():
+      self.round_over[restart] = False
+      self.intro_count[restart] = self.intro_start
+      self.intro_ticks[restart] = 0
+      self.reset_fighters(restart)
+
+  def fighter_states(self, match):
+    #the same per-fighter snapshot engine.fighter_state gives, for one match
+    return tuple((int(self.x[i, match]), int(self.y[i, match]), int(self.vel_y[i, match]), int(self.health[i, match]),
+                  int(self.action[i, match]), int(self.frame_index[i, match]), bool(self.attacking[i, match]),
+                  int(self.attack_cooldown[i, match])) for i in (0, 1))
+
+
+def run_batch(scripts_1, scripts_2, max_ticks, **options):
+  #run N matches from (N, ticks) input mask arrays and return the BatchMatch
+  scripts_1 = np.asarray(scripts_1)
+  scripts_2 = np.asarray(scripts_2)
+  batch = BatchMatch(len(scripts_1), **options)
+  zeros = np.zeros(len(scripts_1), dtype=scripts_1.dtype)
+  for tick in range(max_ticks):
+    keys_1 = scripts_1[:, tick] if tick < scripts_1.shape[1] else zeros
+    keys_2 = scripts_2[:, tick] if tick < scripts_2.shape[1] else zeros
+    batch.step(keys_1, keys_2)
+  return batch
+
+
+#option sets the batch engine must match engine.Match under (run by test_batch_engine.py)
+PARITY_OPTIONS = ({}, {"intro_count": 0, "round_over_ticks": 0}, {"rules": {"SPEED": 14, "ATTACK_WIDTH": 1.5}})
+
+
+def check_parity(n=64, ticks=3000, seed=0, **options):
+  #compare every tick of every match against the reference Fighter-based engine, return mismatches
+  from engine import random_script, run_match
+  scripts_1 = np.array([random_script(seed * 1000 + m, ticks) for m in range(n)], dtype=np.int32)
+  scripts_2 = np.array([random_script(seed * 1000 + m + 500, ticks) for m in range(n)], dtype=np.int32)
+  reference = [run_match(list(scripts_1[m]), list(scripts_2[m]), ticks, record_states=True,
+                         match=_reference_match(options)).states for m in range(n)]
+  batch = BatchMatch(n, **options)
+  mismatches = []
+  for tick in range(ticks):
+    batch.step(scripts_1[:, tick], scripts_2[:, tick])
+    for m in range(n):
+      expected = tuple(tuple(state) for state in reference[m][tick])
+      if batch.fighter_states(m) != expected:
+        mismatches.append((m, tick, expected, batch.fighter_states(m)))
+  return mismatches
+
+
+def _reference_match(options):
+  from engine import Match, headless_fighters
+  rules = options.get("rules") or {}
+
+  def make_fighters():
+    fighters = headless_fighters()
+    for fighter in fighters:
+      for name, value in rules.items():
+        setattr(fighter, name, value)
+    return fighters
+
+  match_options = {key: value for key, value in options.items() if key != "rules"}
+  return Match(make_fighters, **match_options)
+
+
+if __name__ == "__main__":
+  #parity check against engine.Match, then throughput
+  n = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+  for options in PARITY_OPTIONS:
+    mismatches = check_parity(**options)
+    print(f"parity {options}: {'ok' if not mismatches else mismatches[:3]}")
+  rng = np.random.default_rng(0)
+  ticks = 1000
+  scripts = rng.integers(0, 32, size=(2, n, ticks), dtype=np.int32).repeat(8, axis=2)[:, :, :ticks]
+  start = time.perf_counter()
+  batch = run_batch(scripts[0], scripts[1], ticks, intro_count=0, round_over_ticks=0)
+  elapsed = time.perf_counter() - start
+  print(f"{n} matches x {ticks} ticks in {elapsed:.2f} s: {n * ticks / elapsed:,.0f} match-ticks/s, "
+        f"{batch.rounds.sum() / elapsed * 60:,.0f} rounds/min")
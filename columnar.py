@@ -0,0 +1,125 @@
+import json
+import os
+import struct
+
+import numpy as np
+
+# Append-only columnar file:
+#   magic | version | schema length | schema JSON | chunk*
+#   chunk = row count (uint32) followed by each column's rows as raw little-endian data
+MAGIC = b"GCOL"
+VERSION = 1
+PREFIX = struct.Struct("<4sHI")
+CHUNK_HEADER = struct.Struct("<I")
+
+
+def _schema(columns):
+    return [{"name": name, "dtype": np.dtype(dtype).newbyteorder("<").str, "shape": list(shape)}
+            for name, dtype, shape in columns]
+
+
+def _read_schema(f):
+    magic, version, length = PREFIX.unpack(f.read(PREFIX.size))
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{f.name} is not a columnar file")
+    return json.loads(f.read(length).decode())
+
+
+def _complete_length(f, schema):
+    """Byte length of the file up to the end of its last complete chunk; ``f`` is positioned after the schema"""
+    row_bytes = sum(np.dtype(col["dtype"]).itemsize * int(np.prod(col["shape"], dtype=np.int64)) for col in schema)
+    size = os.fstat(f.fileno()).st_size
+    end = f.tell()
+    while end + CHUNK_HEADER.size <= size:
+        f.seek(end)
+        (rows,) = CHUNK_HEADER.unpack(f.read(CHUNK_HEADER.size))
+        chunk_end = end + CHUNK_HEADER.size + rows * row_bytes
+        if chunk_end > size:
+            break
+        end = chunk_end
+    return end
+
+
+class ColumnWriter:
+    """Buffers rows in preallocated arrays and appends them to the file a chunk at a time.
+
+    ``columns`` is a list of (name, dtype, per-row shape). Reopening an existing
+    file with the same schema appends to it, first cutting off any partial chunk
+    a writer that died mid-flush left behind, so the new chunks stay readable.
+    """
+
+    def __init__(self, path, columns, chunk_rows=4096):
+        self.path = path
+        self.columns = columns
+        self.chunk_rows = chunk_rows
+        self.buffers = {name: np.zeros((chunk_rows,) + tuple(shape), dtype=np.dtype(dtype).newbyteorder("<"))
+                        for name, dtype, shape in columns}
+        self.rows = 0
+        self.total_rows = 0
+        schema = _schema(columns)
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            self.file = open(path, "r+b")
+            if _read_schema(self.file) != schema:
+                self.file.close()
+                raise ValueError(f"{path} has a different schema")
+            self.file.truncate(_complete_length(self.file, schema))
+            self.file.seek(0, os.SEEK_END)
+        else:
+            self.file = open(path, "wb")
+            encoded = json.dumps(schema).encode()
+            self.file.write(PREFIX.pack(MAGIC, VERSION, len(encoded)))
+            self.file.write(encoded)
+
+    def append(self, **values):
+        """Add one row; columns that are not given are written as zeros"""
+        row = self.rows
+        for name, buffer in self.buffers.items():
+            if name in values:
+                buffer[row] = values[name]
+            else:
+                buffer[row] = 0
+        self.rows += 1
+        if self.rows == self.chunk_rows:
+            self.flush()
+
+    def flush(self):
+        if self.rows == 0:
+            return
+        self.file.write(CHUNK_HEADER.pack(self.rows))
+        for name, _, _ in self.columns:
+            self.file.write(self.buffers[name][:self.rows].tobytes())
+        self.file.flush()
+        self.total_rows += self.rows
+        self.rows = 0
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+def iter_chunks(path):
+    """Yield each chunk as a dict of column name -> array"""
+    with open(path, "rb") as f:
+        schema = _read_schema(f)
+        dtypes = [(col["name"], np.dtype(col["dtype"]), tuple(col["shape"])) for col in schema]
+        while True:
+            header = f.read(CHUNK_HEADER.size)
+            if len(header) < CHUNK_HEADER.size:
+                return
+            (rows,) = CHUNK_HEADER.unpack(header)
+            chunk = {}
+            for name, dtype, shape in dtypes:
+                count = rows * int(np.prod(shape, dtype=np.int64))
+                data = np.fromfile(f, dtype=dtype, count=count)
+                if len(data) < count:
+                    return  # truncated final chunk from an interrupted writer
+                chunk[name] = data.reshape((rows,) + shape)
+            yield chunk
+
+
+def read_columns(path):
+    """Read a whole file into one array per column"""
+    chunks = list(iter_chunks(path))
+    if not chunks:
+        return {}
+    return {name: np.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0]}
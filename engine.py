@@ -0,0 +1,184 @@
+import random
+import time
+from collections import namedtuple
+
+import pygame
+from fighter import Fighter
+from settings import (SCREEN_WIDTH, SCREEN_HEIGHT, SIM_RATE, WARRIOR_DATA, WIZARD_DATA, WARRIOR_ANIMATION_STEPS,
+                      WIZARD_ANIMATION_STEPS)
+
+#round timers in simulation ticks
+INTRO_COUNT = 3
+INTRO_COUNT_TICKS = SIM_RATE#one second per countdown step
+ROUND_OVER_TICKS = 2 * SIM_RATE#two seconds of victory screen
+
+#per-player controls as bit positions in an input mask: left, right, jump, attack1, attack2
+PLAYER_KEYS = {
+  1: (pygame.K_a, pygame.K_d, pygame.K_w, pygame.K_r, pygame.K_t),
+  2: (pygame.K_LEFT, pygame.K_RIGHT, pygame.K_UP, pygame.K_KP1, pygame.K_KP2),
+}
+LEFT, RIGHT, JUMP, ATTACK1, ATTACK2 = (1 << i for i in range(5))
+#prebuilt key dicts for every mask so scripted input does not allocate per tick
+MASK_KEYS = {player: [{key: bool(mask & (1 << i)) for i, key in enumerate(keys)} for mask in range(32)]
+             for player, keys in PLAYER_KEYS.items()}
+
+#per-tick snapshot of one fighter for headless runs
+FighterState = namedtuple("FighterState", ["x", "y", "vel_y", "health", "action", "frame_index", "attacking", "attack_cooldown"])
+MatchResult = namedtuple("MatchResult", ["score", "ticks", "rounds", "states"])
+
+
+def keys_to_mask(player, keys):
+  #pack a key state dict into the player's 5-bit input mask
+  mask = 0
+  for i, key in enumerate(PLAYER_KEYS[player]):
+    if keys.get(key, False):
+      mask |= 1 << i
+  return mask
+
+
+def mask_to_keys(player, mask):
+  return MASK_KEYS[player][mask]
+
+
+def headless_fighters():
+  #fighters with the real frame counts but no sprites and no sound
+  fighter_1 = Fighter(1, 200, 310, False, WARRIOR_DATA, None, WARRIOR_ANIMATION_STEPS, None)
+  fighter_2 = Fighter(2, 700, 310, True, WIZARD_DATA, None, WIZARD_ANIMATION_STEPS, None)
+  return fighter_1, fighter_2
+
+
+def fighter_state(fighter):
+  return FighterState(fighter.rect.x, fighter.rect.y, fighter.vel_y, fighter.health, fighter.action,
+                      fighter.frame_index, fighter.attacking, fighter.attack_cooldown)
+
+
+def random_script(seed, ticks, hold=(4, 30)):
+  #seeded random input masks, each held for a random number of ticks
+  rng = random.Random(seed)
+  script = []
+  while len(script) < ticks:
+    script.extend([rng.randrange(32)] * rng.randint(*hold))
+  return script[:ticks]
+
+
+class Match():
+  #fixed-timestep simulation of a two-fighter match, one call to step() is one tick
+  def __init__(self, make_fighters=headless_fighters, screen_width=SCREEN_WIDTH, screen_height=SCREEN_HEIGHT,
+               intro_count=INTRO_COUNT, round_over_ticks=ROUND_OVER_TICKS, profiler=None):
+    self.make_fighters = make_fighters
+    self.profiler = profiler#optional profiler.Profiler timing fighter move/update (main.py passes PROFILER)
+    self.intro_start = intro_count
+    self.round_over_limit = round_over_ticks
+    self.screen_width = screen_width
+    self.screen_height = screen_height
+    self.fighter_1, self.fighter_2 = make_fighters()
+    self.score = [0, 0]#player scores. [P1, P2]
+    self.tick = 0
+    self.intro_count = intro_count
+    self.intro_ticks = 0
+    self.round_over = False
+    self.round_over_ticks = 0
+    self.rounds = 0#finished rounds
+
+  def step(self, keys_1, keys_2):
+    #advance the match by one tick and return the events it produced
+    events = []
+    fighter_1 = self.fighter_1
+    fighter_2 = self.fighter_2
+    profiler = self.profiler if self.profiler is not None and self.profiler.enabled else None
+    self.tick += 1
+
+    if self.intro_count <= 0:
+      #move fighters
+      if profiler:
+        start = time.perf_counter()
+      fighter_1.move(self.screen_width, self.screen_height, None, fighter_2, self.round_over, keys_1)
+      fighter_2.move(self.screen_width, self.screen_height, None, fighter_1, self.round_over, keys_2)
+      if profiler:
+        profiler.record("fighter.move", start, time.perf_counter())
+    else:
+      #update count timer
+      self.intro_ticks += 1
+      if self.intro_ticks >= INTRO_COUNT_TICKS:
+        self.intro_count -= 1
+        self.intro_ticks = 0
+        events.append("countdown")
+
+    #update fighters
+    if profiler:
+      start = time.perf_counter()
+    fighter_1.update()
+    fighter_2.update()
+    if profiler:
+      profiler.record("fighter.update", start, time.perf_counter())
+
+    #per-frame hitboxes: attacks land on whichever tick their hitbox first meets the target's hurtbox
+    if fighter_1.hitboxes is not None or fighter_2.hitboxes is not None:
+      if profiler:
+        start = time.perf_counter()
+      fighter_1.strike(fighter_2)
+      fighter_2.strike(fighter_1)
+      if profiler:
+        profiler.record("fighter.strike", start, time.perf_counter())
+
+    #check for player defeat
+    if self.round_over == False:
+      if fighter_1.alive == False:
+        self.score[1] += 1
+        self.round_over = True
+        self.round_over_ticks = 0
+        self.rounds += 1
+        events.append("p2_wins")
+      elif fighter_2.alive == False:
+        self.score[0] += 1
+        self.round_over = True
+        self.round_over_ticks = 0
+        self.rounds += 1
+        events.append("p1_wins")
+    else:
+      self.round_over_ticks += 1
+      if self.round_over_ticks > self.round_over_limit:
+        self.new_round()
+        events.append("new_round")
+    return events
+
+  def snapshot(self):
+    #everything step() reads or writes, as nested tuples; restore() puts it back into the current fighters
+    return (self.tick, self.intro_count, self.intro_ticks, self.round_over, self.round_over_ticks, self.rounds,
+            tuple(self.score), self.fighter_1.snapshot(), self.fighter_2.snapshot())
+
+  def restore(self, state):
+    self.tick, self.intro_count, self.intro_ticks, self.round_over, self.round_over_ticks, self.rounds, score, \
+      fighter_1, fighter_2 = state
+    self.score = list(score)
+    self.fighter_1.restore(fighter_1)
+    self.fighter_2.restore(fighter_2)
+
+  def new_round(self):
+    self.round_over = False
+    self.intro_count = self.intro_start
+    self.intro_ticks = 0
+    self.fighter_1, self.fighter_2 = self.make_fighters()
+
+
+def _script_input(script, tick, match):
+  #a script is either a callable (tick, match) -> mask or a sequence of masks (0 once exhausted)
+  if callable(script):
+    return script(tick, match)
+  return script[tick] if tick < len(script) else 0
+
+
+def run_match(script_1, script_2, max_ticks, rounds=None, record_states=False, match=None, **match_options):
+  #run a match with no window, audio or frame pacing as fast as the CPU allows
+  if match is None:
+    match = Match(**match_options)
+  keys_1 = MASK_KEYS[1]
+  keys_2 = MASK_KEYS[2]
+  states = [] if record_states else None
+  for tick in range(max_ticks):
+    match.step(keys_1[_script_input(script_1, tick, match)], keys_2[_script_input(script_2, tick, match)])
+    if record_states:
+      states.append((fighter_state(match.fighter_1), fighter_state(match.fighter_2)))
+    if rounds is not None and match.rounds >= rounds:
+      break
+  return MatchResult(list(match.score), match.tick, match.rounds, states)
@@ -0,0 +1,188 @@
+"""Low-overhead structured event log for the game loop and the gesture threads.
+
+Calls such as ``GESTURE.debug("Current gesture: %s", gesture)`` store a tuple
+in a preallocated ring; formatting and file writes happen on a background
+flusher thread. A call below its subsystem's level returns after one integer
+comparison, so hot-path logging costs next to nothing when it is disabled.
+"""
+import itertools
+import sys
+import threading
+import time
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+LEVELS = {name.lower(): level for level, name in LEVEL_NAMES.items()}
+
+
+class Channel:
+    """Logging entry points for one subsystem"""
+
+    __slots__ = ("log", "name", "level")
+
+    def __init__(self, log, name, level):
+        self.log = log
+        self.name = name
+        self.level = level
+
+    def enabled(self, level):
+        return level >= self.level
+
+    def debug(self, fmt, *args):
+        if DEBUG >= self.level:
+            self.log.emit(DEBUG, self.name, fmt, args)
+
+    def info(self, fmt, *args):
+        if INFO >= self.level:
+            self.log.emit(INFO, self.name, fmt, args)
+
+    def warning(self, fmt, *args):
+        if WARNING >= self.level:
+            self.log.emit(WARNING, self.name, fmt, args)
+
+    def error(self, fmt, *args):
+        if ERROR >= self.level:
+            self.log.emit(ERROR, self.name, fmt, args)
+
+
+class EventLog:
+    """Fixed-size ring of (seq, time, level, subsystem, format, args) records.
+
+    Writers from any thread claim a sequence number and store one tuple, with no
+    lock. The flusher thread formats records in order every ``flush_interval``
+    seconds, appends them to ``path`` (if set) and echoes records at or above
+    ``echo_level`` to stderr. If writers lap the flusher, the overwritten
+    records are counted in ``dropped``.
+    """
+
+    def __init__(self, capacity=8192, default_level=INFO):
+        self.capacity = capacity
+        self.ring = [None] * capacity
+        self.counter = itertools.count()
+        self.flushed = 0  # sequence number of the next record to flush
+        self.dropped = 0
+        self.default_level = default_level
+        self.channels = {}
+        self.path = None
+        self.echo_level = INFO
+        self.flush_interval = 0.5
+        self.file = None
+        self.thread = None
+        self.running = False
+        self.origin = time.perf_counter()
+
+    def channel(self, name):
+        """The Channel for a subsystem, created at the default level on first use"""
+        channel = self.channels.get(name)
+        if channel is None:
+            channel = self.channels.setdefault(name, Channel(self, name, self.default_level))
+        return channel
+
+    def set_level(self, name, level):
+        self.channel(name).level = level
+
+    def configure(self, levels=None, default_level=None, path=None, echo_level=None, flush_interval=None):
+        """Apply per-subsystem levels ({name: level}) and output settings"""
+        if default_level is not None:
+            self.default_level = default_level
+            for channel in self.channels.values():
+                channel.level = default_level
+        for name, level in (levels or {}).items():
+            self.set_level(name, level)
+        if path is not None:
+            self.path = path
+        if echo_level is not None:
+            self.echo_level = echo_level
+        if flush_interval is not None:
+            self.flush_interval = flush_interval
+
+    def emit(self, level, subsystem, fmt, args):
+        seq = next(self.counter)
+        self.ring[seq % self.capacity] = (seq, time.perf_counter(), level, subsystem, fmt, args)
+
+    def start(self):
+        """Open the log file and start the background flusher"""
+        if self.thread is not None:
+            return
+        if self.path:
+            self.file = open(self.path, "a", buffering=1 << 16)
+        self.running = True
+        self.thread = threading.Thread(target=self._flush_loop, name="eventlog", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Flush everything still in the ring and close the file"""
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.flush()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def pending(self):
+        """Records written since the last flush, oldest first"""
+        records = []
+        seq = self.flushed
+        for _ in range(self.capacity):
+            record = self.ring[seq % self.capacity]
+            if record is None or record[0] < seq:
+                break  # not written yet (or claimed but not stored); picked up next flush
+            if record[0] > seq:
+                # Writers lapped the flusher: skip to the oldest record still in the ring
+                oldest = record[0] - self.capacity + 1
+                self.dropped += oldest - seq
+                seq = oldest
+                continue
+            records.append(record)
+            seq += 1
+        self.flushed = seq
+        return records
+
+    def flush(self):
+        echo = []
+        lines = []
+        for seq, timestamp, level, subsystem, fmt, args in self.pending():
+            try:
+                message = fmt % args if args else fmt
+            except (TypeError, ValueError):
+                message = f"{fmt} {args!r}"
+            line = f"{timestamp - self.origin:10.4f} {LEVEL_NAMES.get(level, level):<7} {subsystem:<8} {message}\n"
+            lines.append(line)
+            if level >= self.echo_level:
+                echo.append(line)
+        if self.file is not None and lines:
+            self.file.writelines(lines)
+            self.file.flush()
+        if echo:
+            sys.stderr.writelines(echo)
+
+    def _flush_loop(self):
+        while self.running:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+
+def parse_levels(spec):
+    """Parse "debug" or "gesture=debug,input=info" into (default level or None, {subsystem: level})"""
+    default = None
+    levels = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, level = item.rpartition("=")
+        if name:
+            levels[name.strip()] = LEVELS[level.strip().lower()]
+        else:
+            default = LEVELS[level.strip().lower()]
+    return default, levels
+
+
+# Process-wide log and the subsystems that write to it
+LOG = EventLog()
+GAME = LOG.channel("game")
+INPUT = LOG.channel("input")
+GESTURE = LOG.channel("gesture")
+QUALITY = LOG.channel("quality")
@@ -1,47 +1,148 @@
 import pygame
+from hitboxes import boxes_overlap
+
+#process-wide bank of scaled animation frames, shared by every fighter and round
+#key: (sprite sheet, frame size, image scale, animation steps, flip) -> animation list
+#the sheet part of the key is either the loaded sheet surface or an atlas handle from sprite_atlas
+#frames are stored with premultiplied alpha and must be blitted with BLEND_PREMULTIPLIED
+frame_bank = {}
+#same keys -> where each frame sits in the full (size * image_scale) square: atlas frames are cropped to their
+#opaque box, frames cut straight from a sheet are the full square at (0, 0)
+frame_origins = {}
+
+
+def register_frames(sprite_sheet, size, image_scale, animation_steps, animation_list, flipped_list=None,
+                    origins=None, flipped_origins=None):
+  #store premultiplied frames in the bank along with their mirrored copies
+  if flipped_list is None:
+    flipped_list = [[pygame.transform.flip(img, True, False) for img in row] for row in animation_list]
+  if origins is None:
+    origins = [[(0, 0)] * len(row) for row in animation_list]
+  if flipped_origins is None:
+    #a mirrored crop sits as far from the right edge as the original does from the left
+    frame_size = size * image_scale
+    flipped_origins = [[(frame_size - x - img.get_width(), y) for img, (x, y) in zip(row, origin_row)]
+                       for row, origin_row in zip(animation_list, origins)]
+  key = (sprite_sheet, size, image_scale, tuple(animation_steps))
+  frame_bank[key + (False,)] = animation_list
+  frame_bank[key + (True,)] = flipped_list
+  frame_origins[key + (False,)] = origins
+  frame_origins[key + (True,)] = flipped_origins
+
+
+def load_frames(sprite_sheet, size, image_scale, animation_steps, flip=False):
+  #return the scaled animation frames for one facing direction, building both directions on a miss
+  key = (sprite_sheet, size, image_scale, tuple(animation_steps), flip)
+  if key not in frame_bank:
+    animation_list = []
+    for y, animation in enumerate(animation_steps):
+      temp_img_list = []
+      for x in range(animation):
+        temp_img = sprite_sheet.subsurface(x * size, y * size, size, size)
+        scaled_img = pygame.transform.scale(temp_img, (size * image_scale, size * image_scale))
+        if scaled_img.get_flags() & pygame.SRCALPHA:
+          scaled_img = scaled_img.premul_alpha()
+        temp_img_list.append(scaled_img)
+      animation_list.append(temp_img_list)
+    register_frames(sprite_sheet, size, image_scale, animation_steps, animation_list)
+  return frame_bank[key]
+
+
+def load_origins(sprite_sheet, size, image_scale, animation_steps, flip=False):
+  #return the frame origins matching load_frames for one facing direction
+  load_frames(sprite_sheet, size, image_scale, animation_steps, flip)
+  return frame_origins[(sprite_sheet, size, image_scale, tuple(animation_steps), flip)]
+
 
 class Fighter():
+  #animation frames advance once this many simulation ticks have passed (just over 50 ms at 60 ticks/s)
+  ANIMATION_COOLDOWN_TICKS = 4
+  #gameplay rules, overridable per instance for balance sweeps
+  SPEED = 10
+  GRAVITY = 2
+  JUMP_VELOCITY = -30
+  ATTACK_DAMAGE = 10
+  ATTACK_COOLDOWN = 20#ticks after an attack or a hit before attacking again
+  ATTACK_WIDTH = 2#attack hitbox width in body widths
+  #per-frame hitbox and hurtbox table (hitboxes.HitboxTable); None keeps the single attack rect checked as the attack starts
+  hitboxes = None
+
   def __init__(self, player, x, y, flip, data, sprite_sheet, animation_steps, sound):
     self.player = player
     self.size = data[0]
     self.image_scale = data[1]
     self.offset = data[2]
     self.flip = flip
-    self.animation_list = self.load_images(sprite_sheet, animation_steps)
     self.action = 0#0:idle #1:run #2:jump #3:attack1 #4: attack2 #5:hit #6:death
     self.frame_index = 0
-    self.image = self.animation_list[self.action][self.frame_index]
-    self.update_time = pygame.time.get_ticks()
+    self.set_sprites(sprite_sheet, animation_steps)
+    self.update_ticks = 0#simulation ticks since the last animation frame change
     self.rect = pygame.Rect((x, y, 80, 180))
+    self.prev_x = x#position at the start of the latest tick, for render interpolation
+    self.prev_y = y
     self.vel_y = 0
     self.running = False
     self.jump = False
     self.attacking = False
     self.attack_type = 0
     self.attack_cooldown = 0
+    self.attack_landed = False#the current attack is settled (it hit, or the rect rule decided it), so it cannot hit again
     self.attack_sound = sound
     self.hit = False
     self.health = 100
     self.alive = True
 
 
+  def snapshot(self):
+    #simulation state only (no sprites or sounds), cheap enough to take every tick for rollback
+    return (self.rect.x, self.rect.y, self.prev_x, self.prev_y, self.vel_y, self.running, self.jump, self.attacking,
+            self.attack_type, self.attack_cooldown, self.attack_landed, self.hit, self.health, self.alive, self.flip,
+            self.action, self.frame_index, self.update_ticks)
+
+
+  def restore(self, state):
+    (self.rect.x, self.rect.y, self.prev_x, self.prev_y, self.vel_y, self.running, self.jump, self.attacking,
+     self.attack_type, self.attack_cooldown, self.attack_landed, self.hit, self.health, self.alive, self.flip,
+     self.action, self.frame_index, self.update_ticks) = state
+    self.show_frame()
+
+
+  def set_sprites(self, sprite_sheet, animation_steps):
+    #swap the animation frames without touching simulation state (sprites may finish loading mid-countdown)
+    if sprite_sheet is None:
+      #headless fighter: only the frame counts are needed to run the animation logic
+      self.animation_list = [[None] * animation for animation in animation_steps]
+      self.flipped_list = self.animation_list
+      self.origin_list = [[(0, 0)] * animation for animation in animation_steps]
+      self.flipped_origin_list = self.origin_list
+    else:
+      self.animation_list = self.load_images(sprite_sheet, animation_steps)
+      self.flipped_list = load_frames(sprite_sheet, self.size, self.image_scale, animation_steps, True)
+      self.origin_list = load_origins(sprite_sheet, self.size, self.image_scale, animation_steps)
+      self.flipped_origin_list = load_origins(sprite_sheet, self.size, self.image_scale, animation_steps, True)
+    self.show_frame()
+
+
+  def show_frame(self):
+    #pick the current action and frame's image for both facings, with where each sits in the full frame
+    self.image = self.animation_list[self.action][self.frame_index]
+    self.flipped_image = self.flipped_list[self.action][self.frame_index]
+    self.image_origin = self.origin_list[self.action][self.frame_index]
+    self.flipped_image_origin = self.flipped_origin_list[self.action][self.frame_index]
+
+
   def load_images(self, sprite_sheet, animation_steps):
-    #extract images from spritesheet
-    animation_list = []
-    for y, animation in enumerate(animation_steps):
-      temp_img_list = []
-      for x in range(animation):
-        temp_img = sprite_sheet.subsurface(x * self.size, y * self.size, self.size, self.size)
-        temp_img_list.append(pygame.transform.scale(temp_img, (self.size * self.image_scale, self.size * self.image_scale)))
-      animation_list.append(temp_img_list)
-    return animation_list
+    #extract images from spritesheet (cached in the frame bank after the first call)
+    return load_frames(sprite_sheet, self.size, self.image_scale, animation_steps)
 
 
   def move(self, screen_width, screen_height, surface, target, round_over, keys):
-    SPEED = 10
-    GRAVITY = 2
+    SPEED = self.SPEED
+    GRAVITY = self.GRAVITY
     dx = 0
     dy = 0
+    self.prev_x = self.rect.x
+    self.prev_y = self.rect.y
     self.running = False
     self.attack_type = 0
 
@@ -58,7 +159,7 @@ class Fighter():
           self.running = True
         #jump
         if keys.get(pygame.K_w, False) and self.jump == False:
-          self.vel_y = -30
+          self.vel_y = self.JUMP_VELOCITY
           self.jump = True
         #attack
         if keys.get(pygame.K_r, False) or keys.get(pygame.K_t, False):
@@ -81,7 +182,7 @@ class Fighter():
           self.running = True
         #jump
         if keys.get(pygame.K_UP, False) and self.jump == False:
-          self.vel_y = -30
+          self.vel_y = self.JUMP_VELOCITY
           self.jump = True
         #attack
         if keys.get(pygame.K_KP1, False) or keys.get(pygame.K_KP2, False):
@@ -143,13 +244,13 @@ class Fighter():
     else:
       self.update_action(0)#0:idle
 
-    animation_cooldown = 50
     #update image
-    self.image = self.animation_list[self.action][self.frame_index]
-    #check if enough time has passed since the last update
-    if pygame.time.get_ticks() - self.update_time > animation_cooldown:
+    self.show_frame()
+    #check if enough simulation ticks have passed since the last update
+    self.update_ticks += 1
+    if self.update_ticks >= self.ANIMATION_COOLDOWN_TICKS:
       self.frame_index += 1
-      self.update_time = pygame.time.get_ticks()
+      self.update_ticks = 0
     #check if the animation has finished
     if self.frame_index >= len(self.animation_list[self.action]):
       #if the player is dead then end the animation
@@ -160,34 +261,68 @@ class Fighter():
         #check if an attack was executed
         if self.action == 3 or self.action == 4:
           self.attacking = False
-          self.attack_cooldown = 20
+          self.attack_cooldown = self.ATTACK_COOLDOWN
         #check if damage was taken
         if self.action == 5:
           self.hit = False
           #if the player was in the middle of an attack, then the attack is stopped
           self.attacking = False
-          self.attack_cooldown = 20
+          self.attack_cooldown = self.ATTACK_COOLDOWN
 
 
   def attack(self, target):
     if self.attack_cooldown == 0:
       #execute attack
       self.attacking = True
-      self.attack_sound.play()
-      attacking_rect = pygame.Rect(self.rect.centerx - (2 * self.rect.width * self.flip), self.rect.y, 2 * self.rect.width, self.rect.height)
+      if self.attack_sound is not None:
+        self.attack_sound.play()
+      if self.hitboxes is not None and target.hitboxes is not None:
+        #the hit is decided tick by tick in strike(), against the animation frames
+        self.attack_landed = False
+        return
+      #without tables on both sides (a sheet still loading, or one without alpha) the attack rect decides at once
+      self.attack_landed = True
+      reach = int(self.ATTACK_WIDTH * self.rect.width)
+      attacking_rect = pygame.Rect(self.rect.centerx - (reach * self.flip), self.rect.y, reach, self.rect.height)
       if attacking_rect.colliderect(target.rect):
-        target.health -= 10
+        target.health -= self.ATTACK_DAMAGE
         target.hit = True
 
 
+  def strike(self, target):
+    #per-tick hit check with hitboxes: this frame's hitbox against the target's hurtbox, at most one hit per attack
+    if (self.hitboxes is None or not self.attacking or self.attack_landed or not target.alive
+        or target.hitboxes is None):
+      return
+    hit = self.hitboxes.hit[self.flip][self.action][self.frame_index]
+    if hit is None:
+      return
+    hurt = target.hitboxes.hurt[target.flip][target.action][target.frame_index]
+    if hurt is not None and boxes_overlap(hit, self.rect.topleft, hurt, target.rect.topleft):
+      self.attack_landed = True
+      target.health -= self.ATTACK_DAMAGE
+      target.hit = True
+
+
   def update_action(self, new_action):
     #check if the new action is different to the previous one
     if new_action != self.action:
       self.action = new_action
       #update the animation settings
       self.frame_index = 0
-      self.update_time = pygame.time.get_ticks()
+      self.update_ticks = 0
 
-  def draw(self, surface):
-    img = pygame.transform.flip(self.image, self.flip, False)
-    surface.blit(img, (self.rect.x - (self.offset[0] * self.image_scale), self.rect.y - (self.offset[1] * self.image_scale)))
\ No newline at end of file
+  def draw(self, surface, alpha=1.0):
+    if self.image is None:
+      return
+    #pick the pre-flipped frame instead of flipping every draw
+    if self.flip:
+      img = self.flipped_image
+      origin = self.flipped_image_origin
+    else:
+      img = self.image
+      origin = self.image_origin
+    #interpolate between the previous and current simulation positions
+    x = round(self.prev_x + (self.rect.x - self.prev_x) * alpha)
+    y = round(self.prev_y + (self.rect.y - self.prev_y) * alpha)
+    surface.blit(img, (x - (self.offset[0] * self.image_scale) + origin[0], y - (self.offset[1] * self.image_scale) + origin[1]), special_flags=pygame.BLEND_PREMULTIPLIED)
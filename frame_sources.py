@@ -0,0 +1,156 @@
+import os
+import time
+
+import cv2
+import numpy as np
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+
+
+class FrameSource:
+    """Base class for anything that feeds BGR frames to the gesture pipeline.
+
+    Sources follow the small part of the cv2.VideoCapture interface the pipeline
+    uses (read, isOpened, release, set). With ``realtime`` set, read() paces
+    frames at the source's native rate; otherwise frames come as fast as possible.
+    A failed read() from a recorded source means its end; finished() tells the
+    pipeline so, since isOpened() stays True until release().
+    """
+
+    def __init__(self, fps=30.0, realtime=True):
+        self.fps = fps
+        self.realtime = realtime
+        self.frame_index = -1
+        self._next_time = None
+        self._finished = False
+
+    def _read(self):
+        raise NotImplementedError
+
+    def read(self):
+        ok, frame = self._read()
+        if not ok:
+            self._finished = True
+            return False, None
+        self.frame_index += 1
+        if self.realtime and self.fps:
+            now = time.perf_counter()
+            if self._next_time is None:
+                self._next_time = now
+            elif self._next_time > now:
+                time.sleep(self._next_time - now)
+            self._next_time += 1.0 / self.fps
+        return True, frame
+
+    def isOpened(self):
+        return True
+
+    def finished(self):
+        """True once the source has no more frames to give"""
+        return self._finished
+
+    def set(self, prop, value):
+        return False
+
+    def release(self):
+        pass
+
+
+class CameraSource(FrameSource):
+    """Live webcam; the camera already delivers frames in real time"""
+
+    def __init__(self, index=0):
+        super().__init__(fps=None, realtime=False)
+        self.cap = cv2.VideoCapture(index)
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or None
+
+    def _read(self):
+        return self.cap.read()
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def finished(self):
+        # A failed read from a live camera is a dropped frame, not the end; only a closed camera is done
+        return not self.cap.isOpened()
+
+    def set(self, prop, value):
+        return self.cap.set(prop, value)
+
+    def release(self):
+        self.cap.release()
+
+
+class VideoFileSource(FrameSource):
+    """Recorded video clip"""
+
+    def __init__(self, path, realtime=True):
+        self.cap = cv2.VideoCapture(path)
+        super().__init__(fps=self.cap.get(cv2.CAP_PROP_FPS) or 30.0, realtime=realtime)
+
+    def _read(self):
+        return self.cap.read()
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def release(self):
+        self.cap.release()
+
+
+class ImageDirectorySource(FrameSource):
+    """Directory of still images, played back in file name order"""
+
+    def __init__(self, path, fps=30.0, realtime=True):
+        super().__init__(fps=fps, realtime=realtime)
+        self.paths = sorted(os.path.join(path, name) for name in os.listdir(path)
+                            if name.lower().endswith(IMAGE_EXTENSIONS))
+        self._position = 0
+
+    def _read(self):
+        while self._position < len(self.paths):
+            frame = cv2.imread(self.paths[self._position])
+            self._position += 1
+            if frame is not None:
+                return True, frame
+        return False, None
+
+
+class SyntheticSource(FrameSource):
+    """In-memory generator: ``make_frame(i)`` returns frame i, or None to end.
+
+    The default generator draws a moving bright block on a dark background.
+    """
+
+    def __init__(self, make_frame=None, count=300, size=(640, 480), fps=30.0, realtime=True):
+        super().__init__(fps=fps, realtime=realtime)
+        self.count = count
+        self.size = size
+        self.make_frame = make_frame or self._default_frame
+
+    def _default_frame(self, i):
+        w, h = self.size
+        frame = np.full((h, w, 3), 32, dtype=np.uint8)
+        x = (i * 8) % max(1, w - 80)
+        frame[h // 3:h // 3 + 120, x:x + 80] = (180, 200, 230)
+        return frame
+
+    def _read(self):
+        i = self.frame_index + 1
+        if i >= self.count:
+            return False, None
+        frame = self.make_frame(i)
+        if frame is None:
+            return False, None
+        return True, frame
+
+
+def open_source(spec, realtime=True):
+    """Open a source from a spec: camera index, "synthetic", an image directory or a video file"""
+    if isinstance(spec, int) or str(spec).isdigit():
+        return CameraSource(int(spec))
+    if spec == "synthetic":
+        return SyntheticSource(realtime=realtime)
+    if os.path.isdir(spec):
+        return ImageDirectorySource(spec, realtime=realtime)
+    return VideoFileSource(spec, realtime=realtime)
@@ -0,0 +1,113 @@
+"""Benchmark the gesture detection path on a recorded clip.
+
+Usage: python gesture_bench.py SOURCE [--labels FILE] [--realtime] [--scale S] [--roi] [--smooth]
+
+SOURCE is a video file, an image directory, "synthetic" or a camera index.
+Labels are a CSV sidecar of "frame,gesture" rows (empty gesture = no gesture);
+by default SOURCE + ".labels.csv" is used when it exists. With labels the
+report includes activation latency and false triggers; --smooth runs the
+temporal filter and hysteresis used by the live controller.
+"""
+import argparse
+import os
+import time
+
+import cv2
+import mediapipe as mp
+import numpy as np
+
+from frame_sources import open_source
+from gesture_features import classify_hand
+from gesture_filter import GestureFilterBank, activation_report
+from hand_tracking import HandTracker
+from landmark_log import load_labels
+
+STAGES = ["capture", "convert", "detect", "classify", "total"]
+
+
+def run_benchmark(source, tracker, gesture_filter=None):
+    """Feed every frame of ``source`` through detection and classification.
+
+    With a GestureFilterBank, predictions are the filtered gestures, timed on
+    the clip's own clock (frame index / fps) so results do not depend on speed.
+    Returns (per-stage timings in seconds, predicted gesture per frame, wall time).
+    """
+    frame_interval = 1.0 / (source.fps or 30.0)
+    timings = {stage: [] for stage in STAGES}
+    predictions = []
+    start = time.perf_counter()
+    while True:
+        frame_start = time.perf_counter()
+        ok, frame = source.read()
+        if not ok:
+            break
+        captured = time.perf_counter()
+        # Flip the frame horizontally, as the live pipeline does
+        frame = cv2.flip(frame, 1)
+        tracked = tracker.process(frame)
+        detected = time.perf_counter()
+        h, w = frame.shape[:2]
+        gesture = None
+        if gesture_filter is not None:
+            gesture = gesture_filter.update(tracked, len(predictions) * frame_interval, (w, h))
+        else:
+            for hand in tracked:
+                gesture = classify_hand(hand.landmarks, (w, h))
+                if gesture:
+                    break
+        done = time.perf_counter()
+
+        timings["capture"].append(captured - frame_start)
+        timings["convert"].append(tracker.timings["convert"])
+        timings["detect"].append(tracker.timings["detect"])
+        timings["classify"].append(done - detected)
+        timings["total"].append(done - frame_start)
+        predictions.append(gesture)
+    return timings, predictions, time.perf_counter() - start
+
+
+def summarize(timings, predictions, elapsed, labels=None, fps=30.0):
+    lines = [f"frames: {len(predictions)}  throughput: {len(predictions) / elapsed:.1f} frames/s"]
+    lines.append(f"{'stage':<10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage in STAGES:
+        values = np.array(timings[stage]) * 1000
+        if len(values):
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            lines.append(f"{stage:<10}{p50:>10.2f}{p95:>10.2f}{p99:>10.2f}")
+    if labels:
+        scored = [(i, g) for i, g in labels.items() if i < len(predictions)]
+        correct = sum(1 for i, g in scored if predictions[i] == g)
+        if scored:
+            lines.append(f"accuracy: {correct / len(scored):.1%} ({correct}/{len(scored)} labelled frames)")
+        lines.append(activation_report(predictions, labels, np.arange(len(predictions)) / fps))
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the gesture detection path")
+    parser.add_argument("source")
+    parser.add_argument("--labels", help="CSV sidecar of frame,gesture labels")
+    parser.add_argument("--realtime", action="store_true", help="replay at native speed instead of flat out")
+    parser.add_argument("--scale", type=float, default=1.0, help="inference downscale factor")
+    parser.add_argument("--roi", action="store_true", help="enable region-of-interest tracking")
+    parser.add_argument("--smooth", action="store_true", help="apply the temporal filter and hysteresis")
+    args = parser.parse_args()
+
+    labels_path = args.labels or args.source + ".labels.csv"
+    labels = load_labels(labels_path) if os.path.exists(labels_path) else None
+
+    hands = mp.solutions.hands.Hands(min_detection_confidence=0.7, min_tracking_confidence=0.7)
+    tracker = HandTracker(hands, inference_scale=args.scale, use_roi=args.roi)
+    source = open_source(args.source, realtime=args.realtime)
+    gesture_filter = GestureFilterBank() if args.smooth else None
+    try:
+        timings, predictions, elapsed = run_benchmark(source, tracker, gesture_filter)
+    finally:
+        source.release()
+    print(summarize(timings, predictions, elapsed, labels, source.fps or 30.0))
+    if args.roi:
+        print(f"tracker: {tracker.stats}")
+
+
+if __name__ == "__main__":
+    main()
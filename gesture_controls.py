@@ -2,33 +2,155 @@ import cv2
 import mediapipe as mp
 import pygame
 import threading
-from queue import Queue
 import time
+from collections import namedtuple
+from gesture_filter import GestureFilterBank, assign_hands
+from hand_tracking import HandTracker, draw_hand
+from frame_sources import CameraSource
+from landmark_log import LandmarkRecorder
+from eventlog import GESTURE
+from profiler import PROFILER
+
+# One published gesture; timestamps are time.perf_counter() seconds
+GestureSample = namedtuple("GestureSample", ["seq", "gesture", "confidence", "capture_time", "inference_time"])
+
+class FrameSlot:
+    """Bounded single-slot buffer between pipeline stages.
+
+    A put always succeeds and replaces any item the consumer has not taken yet,
+    so the consumer only ever sees the newest frame. Replaced items are counted
+    in ``dropped``.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._item = None
+        self._full = False
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if self._full:
+                self.dropped += 1
+            self._item = item
+            self._full = True
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Take the newest item, waiting up to ``timeout`` seconds; None if nothing arrived"""
+        with self._cond:
+            if not self._full and not self._cond.wait_for(lambda: self._full, timeout):
+                return None
+            item = self._item
+            self._item = None
+            self._full = False
+            return item
+
+
+class GestureChannel:
+    """Single-writer/single-reader latest-value slot for gestures.
+
+    The inference stage publishes by swapping in a new immutable sample, which
+    is a single reference store, so neither side ever takes a lock or blocks.
+    The sequence number tells the reader whether a sample is new.
+    """
+
+    def __init__(self):
+        self._sample = None
+        self._seq = 0
+
+    def publish(self, gesture, confidence, capture_time, inference_time):
+        self._seq += 1
+        self._sample = GestureSample(self._seq, gesture, confidence, capture_time, inference_time)
+
+    def latest(self):
+        """The newest sample, or None if nothing has been published yet"""
+        return self._sample
+
+
+# Key held while each gesture is active, per player
+GESTURE_KEYS = {
+    1: {"Move Left": pygame.K_a, "Move Right": pygame.K_d, "Jump": pygame.K_w, "Punch": pygame.K_r},
+    2: {"Move Left": pygame.K_LEFT, "Move Right": pygame.K_RIGHT, "Jump": pygame.K_UP, "Punch": pygame.K_KP1},
+}
+
 
 class GestureController:
-    def __init__(self, player_num=1):
-        self.player_num = player_num
+    """Camera capture, hand inference and gesture filtering for one or more players.
+
+    All players share one camera reader and one MediaPipe graph. Each frame's
+    hands are split between ``players`` by ``assignment`` ("screen_half" or
+    "handedness", see gesture_filter.assign_hands) and every player gets their
+    own filters and gesture channel. ``player_input(player)`` returns a per-player
+    view with the single-player ``get_current_keys()`` interface.
+    """
+
+    def __init__(self, player_num=1, show_preview=True, preview_fps=15, max_gesture_age=0.25,
+                 inference_scale=1.0, use_roi=False, record_path=None, no_hand_timeout=0.15,
+                 players=None, assignment="screen_half", **filter_options):
+        self.players = tuple(players) if players else (player_num,)
+        self.player_num = self.players[0]
+        self.assignment = assignment
         self.mp_hands = mp.solutions.hands
-        self.hands = self.mp_hands.Hands(min_detection_confidence=0.7, min_tracking_confidence=0.7)
-        self.mp_draw = mp.solutions.drawing_utils
+        self.hands = self.mp_hands.Hands(max_num_hands=max(2, len(self.players)),
+                                         min_detection_confidence=0.7, min_tracking_confidence=0.7)
+        # Reduced-resolution / region-of-interest inference (defaults keep full-frame detection)
+        self.tracker = HandTracker(self.hands, inference_scale=inference_scale, use_roi=use_roi,
+                                   expected_hands=len(self.players))
+        # Optional landmark recording for offline threshold tuning (see landmark_log.py)
+        self.recorder = LandmarkRecorder(record_path) if record_path else None
         self.cap = None
         self.is_running = False
-        self.current_gesture = None
-        self.gesture_queue = Queue()
-        self.last_attack_time = 0
-        self.attack_cooldown = 1.0  
+        self.current_gestures = {player: None for player in self.players}
+        self.gesture_channels = {player: GestureChannel() for player in self.players}
+        self.gesture_channel = self.gesture_channels[self.player_num]
+        self.last_seqs = {player: 0 for player in self.players}
+        # Gestures older than this (seconds since capture) are ignored on every read, so a stalled
+        # pipeline releases its key instead of holding it; None disables
+        self.max_gesture_age = max_gesture_age
+        self.stale_gestures = 0
+        # A held Punch presses the attack key at most once per attack_cooldown seconds, per player
+        self.attack_cooldown = 1.0
+        self.last_attack_times = {player: float("-inf") for player in self.players}
+        # Per-player, per-hand One-Euro smoothing and enter/exit hysteresis (see gesture_filter.py)
+        self.gesture_filters = {player: GestureFilterBank(no_hand_timeout=no_hand_timeout, **filter_options)
+                                for player in self.players}
+        # Pipeline: capture -> inference -> optional preview, linked by single-slot buffers
+        self.show_preview = show_preview
+        self.preview_fps = preview_fps
+        # Most hand detections per second, 0 for every captured frame (see set_quality)
+        self.inference_fps = 0
+        self.capture_slot = FrameSlot()
+        self.preview_slot = FrameSlot()
+        self.stage_stats = {stage: {"frames": 0, "dropped": 0} for stage in ("capture", "inference", "preview")}
+
+    @property
+    def current_gesture(self):
+        return self.current_gestures[self.player_num]
 
-    def start(self):
-        """Start the gesture detection in a separate thread"""
+    def player_input(self, player):
+        """Per-player view of this controller with its own get_current_keys()"""
+        return PlayerGestureInput(self, player)
+
+    def start(self, source=None):
+        """Start the capture, inference and preview stages on their own threads.
+
+        ``source`` is any frame source from frame_sources; the default is the live camera.
+        """
         try:
-            self.cap = cv2.VideoCapture(0)
+            self.cap = source if source is not None else CameraSource(0)
             if not self.cap.isOpened():
-                print("Error: Could not open camera")
+                GESTURE.error("Could not open camera")
                 return
+            # Keep the driver queue short so the capture stage always reads a fresh frame
+            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
             self.is_running = True
-            threading.Thread(target=self._process_gestures, daemon=True).start()
+            threading.Thread(target=self._capture_loop, name="gesture-capture", daemon=True).start()
+            threading.Thread(target=self._inference_loop, name="gesture-inference", daemon=True).start()
+            if self.show_preview:
+                threading.Thread(target=self._preview_loop, name="gesture-preview", daemon=True).start()
         except Exception as e:
-            print(f"Error starting gesture detection: {e}")
+            GESTURE.error("Error starting gesture detection: %s", e)
             self.stop()
 
     def stop(self):
@@ -39,151 +161,212 @@ class GestureController:
         cv2.destroyAllWindows()
         time.sleep(0.5)  # Give time for windows to close
 
-    def get_current_keys(self):
-        """Convert gestures to Pygame key states"""
-        try:
-            # Get the latest gesture without blocking
-            if not self.gesture_queue.empty():
-                self.current_gesture = self.gesture_queue.get_nowait()
-                print(f"Current gesture: {self.current_gesture}")  # Debug output
-        except:
-            pass
-
-        # Initialize an empty list for pressed keys
-        pressed_keys = []
-        
-        if self.current_gesture:
-            current_time = time.time()
-            if self.player_num == 1:
-                # Player 1 controls
-                if self.current_gesture == "Move Left":
-                    pressed_keys.append(pygame.K_a)
-                    print("Moving Left")  # Debug output
-                elif self.current_gesture == "Move Right":
-                    pressed_keys.append(pygame.K_d)
-                    print("Moving Right")  # Debug output
-                elif self.current_gesture == "Jump":
-                    pressed_keys.append(pygame.K_w)
-                    print("Jumping")  # Debug output
-                elif self.current_gesture == "Punch" and (current_time - self.last_attack_time) >= self.attack_cooldown:
-                    pressed_keys.append(pygame.K_r)
-                    self.last_attack_time = current_time
-                    print("Punching")  # Debug output
+    def get_current_keys(self, player=None):
+        """Convert a player's held gesture to Pygame key states (the first player by default)"""
+        player = self.player_num if player is None else player
+        # The inference stage publishes the filtered gesture (or None) every frame; read it without blocking
+        sample = self.gesture_channels[player].latest()
+        gesture = None
+        if sample is not None:
+            stale = self.max_gesture_age is not None and time.perf_counter() - sample.capture_time > self.max_gesture_age
+            if sample.seq != self.last_seqs[player]:
+                self.last_seqs[player] = sample.seq
+                if stale:
+                    self.stale_gestures += 1
+            # Release keys when the pipeline has stopped delivering (camera stall, inference hang)
+            if not stale:
+                gesture = sample.gesture
+        key = GESTURE_KEYS[player].get(gesture)
+        if gesture == "Punch":
+            # One press, then another every attack_cooldown seconds while the fist is held
+            now = time.perf_counter()
+            if now - self.last_attack_times[player] >= self.attack_cooldown:
+                self.last_attack_times[player] = now
             else:
-                # Player 2 controls
-                if self.current_gesture == "Move Left":
-                    pressed_keys.append(pygame.K_LEFT)
-                elif self.current_gesture == "Move Right":
-                    pressed_keys.append(pygame.K_RIGHT)
-                elif self.current_gesture == "Jump":
-                    pressed_keys.append(pygame.K_UP)
-                elif self.current_gesture == "Punch" and (current_time - self.last_attack_time) >= self.attack_cooldown:
-                    pressed_keys.append(pygame.K_KP1)
-                    self.last_attack_time = current_time
-        
-        return pressed_keys
-
-    def _process_gestures(self):
-        """Process video feed and detect gestures"""
-        print("Starting gesture detection...")
-        last_gesture_time = time.time()
-        gesture_cooldown = 0.2  # 200ms cooldown between gestures
-        
+                key = None
+        if gesture != self.current_gestures[player]:
+            GESTURE.debug("Player %d gesture: %s", player, gesture)
+            self.current_gestures[player] = gesture
+        return [key] if key is not None else []
+
+    def set_quality(self, preview_fps=None, inference_scale=None, inference_fps=None):
+        """Change pipeline settings while running; None leaves a setting as it is.
+
+        ``preview_fps`` 0 hides the preview (it can only be shown again if the
+        controller was built with ``show_preview``), ``inference_scale`` is the
+        full-frame detection scale and ``inference_fps`` caps hand detections
+        per second (0 for every captured frame).
+        """
+        if preview_fps is not None:
+            self.preview_fps = preview_fps
+        if inference_scale is not None:
+            self.tracker.inference_scale = inference_scale
+        if inference_fps is not None:
+            self.inference_fps = inference_fps
+
+    def _capture_loop(self):
+        """Capture stage: read frames as fast as the camera delivers and keep only the newest"""
         while self.is_running:
             try:
                 if not self.cap or not self.cap.isOpened():
-                    print("Error: Camera not available")
+                    GESTURE.error("Camera not available")
                     break
 
+                read_start = time.perf_counter()
                 ret, frame = self.cap.read()
+                PROFILER.record("gesture.capture", read_start, time.perf_counter())
                 if not ret:
-                    print("Failed to get frame from camera")
+                    if self.cap.finished():
+                        GESTURE.info("Frame source finished")
+                        break
+                    GESTURE.warning("Failed to get frame from camera")
+                    time.sleep(0.05)  # Let the camera recover instead of spinning on it
                     continue
 
                 # Flip the frame horizontally for a later selfie-view display
                 frame = cv2.flip(frame, 1)
-                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                results = self.hands.process(frame_rgb)
-
-                current_time = time.time()
-                if results.multi_hand_landmarks and (current_time - last_gesture_time) >= gesture_cooldown:
-                    for idx, hand_landmarks in enumerate(results.multi_hand_landmarks):
-                        try:
-                            self.mp_draw.draw_landmarks(frame, hand_landmarks, self.mp_hands.HAND_CONNECTIONS)
-                            
-                            # Get handedness
-                            handedness = results.multi_handedness[idx].classification[0].label
-                            
-                            # Get landmark coordinates
-                            landmark_list = []
-                            h, w, c = frame.shape
-                            for lm in hand_landmarks.landmark:
-                                cx, cy = int(lm.x * w), int(lm.y * h)
-                                landmark_list.append([cx, cy])
-
-                            # Detect gestures
-                            gesture = None
-                            if len(landmark_list) >= 21:  # Ensure we have all landmarks
-                                # Check for fist first (most important)
-                                # A fist is when all fingers are curled down
-                                fingers_down = True
-                                # Check each finger (index, middle, ring, pinky)
-                                for tip, pip in [(8,6), (12,10), (16,14), (20,18)]:
-                                    if landmark_list[tip][1] <= landmark_list[pip][1]:  # If tip is above or at PIP
-                                        fingers_down = False
-                                        break
-
-                                if fingers_down:
-                                    gesture = "Punch"
-                                    print("Fist detected - PUNCH!")
-                                # Only check other gestures if it's not a fist
-                                else:
-                                    # Open Hand (Jump)
-                                    if (all(landmark_list[tip][1] < landmark_list[pip][1] - 20
-                                           for tip, pip in [(8,6), (12,10), (16,14), (20,18)])):
-                                        gesture = "Jump"
-                                    
-                                    # Point Right (Move Right)
-                                    elif (landmark_list[8][0] > landmark_list[5][0] + 15 and  # Index finger extended right
-                                          landmark_list[8][1] > landmark_list[5][1] - 20 and  # Index finger roughly horizontal
-                                          all(landmark_list[tip][1] > landmark_list[pip][1]  # Other fingers down
-                                              for tip, pip in [(12,10), (16,14), (20,18)])):
-                                        gesture = "Move Right"
-                                    
-                                    # Point Left (Move Left)
-                                    elif (landmark_list[8][0] < landmark_list[5][0] - 15 and  # Index finger extended left
-                                          landmark_list[8][1] > landmark_list[5][1] - 20 and  # Index finger roughly horizontal
-                                          all(landmark_list[tip][1] > landmark_list[pip][1]  # Other fingers down
-                                              for tip, pip in [(12,10), (16,14), (20,18)])):
-                                        gesture = "Move Left"
-
-                                if gesture:
-                                    last_gesture_time = current_time
-                                    try:
-                                        # Clear old gesture and put new one
-                                        while not self.gesture_queue.empty():
-                                            self.gesture_queue.get_nowait()
-                                        self.gesture_queue.put_nowait(gesture)
-                                    except:
-                                        pass
-                        except Exception as e:
-                            print(f"Error processing hand landmarks: {e}")
-                            continue
+                self.stage_stats["capture"]["frames"] += 1
+                self.capture_slot.put((frame, time.perf_counter()))
+            except Exception as e:
+                GESTURE.error("Error in gesture capture loop: %s", e)
+                time.sleep(0.1)  # Prevent tight error loop
 
+        self.stop()
+
+    def _inference_loop(self):
+        """Inference stage: run hand detection on the newest frame and publish gestures"""
+        GESTURE.info("Starting gesture detection...")
+
+        next_inference = 0.0
+        throttled_from = None  # capture slot drop count when the current rate-cap wait began
+        while self.is_running:
+            try:
+                # Under a rate cap, wait out the interval; the capture slot keeps only the newest frame meanwhile
+                delay = next_inference - time.perf_counter()
+                if delay > 0:
+                    time.sleep(min(delay, 0.1))
+                    continue
+                # Frames overwritten during the wait were skipped by this stage, not lost by capture
+                if throttled_from is not None:
+                    self.stage_stats["inference"]["dropped"] += self.capture_slot.dropped - throttled_from
+                    throttled_from = None
+                item = self.capture_slot.get(timeout=0.1)
+                if item is None:
+                    continue
+                frame, capture_time = item
+                inference_fps = self.inference_fps
+                if inference_fps:
+                    next_inference = time.perf_counter() + 1.0 / inference_fps
+
+                tracked = self.tracker.process(frame)
+                if self.recorder:
+                    self.recorder.record(capture_time, tracked, (frame.shape[1], frame.shape[0]))
+                self.stage_stats["inference"]["frames"] += 1
+
+                # Split hands between players, then smooth, classify and apply hysteresis per player;
+                # publish every frame so releases arrive promptly
+                classify_start = time.perf_counter()
+                frame_size = (frame.shape[1], frame.shape[0])
+                assigned = assign_hands(tracked, self.players, self.assignment)
+                for player, hands in assigned.items():
+                    try:
+                        gesture = self.gesture_filters[player].update(hands, capture_time, frame_size)
+                    except Exception as e:
+                        GESTURE.error("Error processing hand landmarks: %s", e)
+                        gesture = None
+                    confidence = max((hand.score for hand in hands), default=0.0)
+                    self.gesture_channels[player].publish(gesture, confidence, capture_time, time.perf_counter())
+                PROFILER.record("gesture.classify", classify_start, time.perf_counter())
+
+                if self.show_preview and self.preview_fps:
+                    self.preview_slot.put((frame, tracked))
+                if inference_fps:
+                    throttled_from = self.capture_slot.dropped
+            except Exception as e:
+                GESTURE.error("Error in gesture inference loop: %s", e)
+                time.sleep(0.1)  # Prevent tight error loop
+
+        if self.recorder:
+            self.recorder.close()
+
+    def _preview_loop(self):
+        """Preview stage: show the newest annotated frame at a reduced rate"""
+        window_name = "Hand Gesture Controls - Player " + " & ".join(str(player) for player in self.players)
+        shown = False
+        while self.is_running:
+            # Read the rate once per pass: set_quality may turn the preview off at any moment
+            preview_fps = self.preview_fps
+            if not preview_fps:
+                # Preview turned off while running: close the window and idle until it is turned back on
+                if shown:
+                    cv2.destroyWindow(window_name)
+                    shown = False
+                time.sleep(0.1)
+                continue
+            next_time = time.time() + 1.0 / preview_fps
+            item = self.preview_slot.get(timeout=0.1)
+            if item is not None:
+                frame, tracked = item
+                self.stage_stats["preview"]["frames"] += 1
+                self.stage_stats["preview"]["dropped"] = self.preview_slot.dropped
                 # Display the frame with larger window size
                 try:
-                    frame = cv2.resize(frame, (800, 600))
-                    cv2.imshow(f'Hand Gesture Controls - Player {self.player_num}', frame)
+                    with PROFILER.section("gesture.preview"):
+                        frame = frame.copy()
+                        for hand in tracked:
+                            draw_hand(frame, hand.landmarks, self.mp_hands.HAND_CONNECTIONS)
+                        frame = cv2.resize(frame, (800, 600))
+                        cv2.imshow(window_name, frame)
+                        shown = True
                 except Exception as e:
-                    print(f"Error displaying frame: {e}")
+                    GESTURE.error("Error displaying frame: %s", e)
 
-                # Break the loop when 'q' is pressed
-                if cv2.waitKey(1) & 0xFF == ord('q'):
-                    print("Quitting gesture detection...")
-                    break
+            # Break the loop when 'q' is pressed
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                GESTURE.info("Quitting gesture detection...")
+                self.is_running = False
+                break
+            delay = next_time - time.time()
+            if delay > 0:
+                time.sleep(delay)
 
-            except Exception as e:
-                print(f"Error in gesture processing loop: {e}")
-                time.sleep(0.1)  # Prevent tight error loop
+    def latest_sample(self, player=None):
+        """A player's newest GestureSample (the first player by default), None if there is none"""
+        return self.gesture_channels[self.player_num if player is None else player].latest()
 
-        self.stop()
+    def input_age(self, player=None):
+        """Seconds since the frame behind the newest gesture was captured, None if there is none"""
+        sample = self.latest_sample(player)
+        if sample is None:
+            return None
+        return time.perf_counter() - sample.capture_time
+
+    def latency(self, player=None):
+        """Seconds from capture to published gesture for the newest sample, None if there is none"""
+        sample = self.latest_sample(player)
+        if sample is None:
+            return None
+        return sample.inference_time - sample.capture_time
+
+    def get_pipeline_stats(self):
+        """Frames handled and frames dropped by each pipeline stage
+
+        A frame overwritten in the capture slot counts once: against inference if it was
+        skipped while waiting out ``inference_fps``, against capture otherwise.
+        """
+        self.stage_stats["capture"]["dropped"] = self.capture_slot.dropped - self.stage_stats["inference"]["dropped"]
+        return {stage: dict(stats) for stage, stats in self.stage_stats.items()}
+
+
+class PlayerGestureInput:
+    """One player's share of a GestureController"""
+
+    def __init__(self, controller, player):
+        self.controller = controller
+        self.player = player
+
+    def get_current_keys(self):
+        return self.controller.get_current_keys(self.player)
+
+    def input_age(self):
+        return self.controller.input_age(self.player)
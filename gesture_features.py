@@ -0,0 +1,96 @@
+import numpy as np
+
+# Landmark indices (MediaPipe hand model)
+WRIST = 0
+INDEX_MCP = 5
+MIDDLE_MCP = 9
+INDEX_TIP = 8
+FINGER_TIPS = np.array([8, 12, 16, 20])  # index, middle, ring, pinky
+FINGER_PIPS = np.array([6, 10, 14, 18])
+
+# Feature columns, all measured in hand sizes (wrist to middle-finger MCP distance)
+FEATURES = ["index_curl", "middle_curl", "ring_curl", "pinky_curl", "index_dx", "index_dy"]
+FEATURE_INDEX = {name: i for i, name in enumerate(FEATURES)}
+
+# The old pixel offsets (20 px and 15 px) at a typical 90 px hand in a 640x480 frame
+VERTICAL_MARGIN = 20 / 90
+HORIZONTAL_MARGIN = 15 / 90
+
+
+def build_rules(vertical_margin=VERTICAL_MARGIN, horizontal_margin=HORIZONTAL_MARGIN, curl_margin=0.0):
+    """Gesture rules in priority order: gesture -> {feature: (lower, upper)}, bounds are exclusive.
+
+    A curl is (tip y - PIP y), so a positive curl means the finger is bent down.
+    ``curl_margin`` lets a curled finger straighten that far and still count as curled.
+    """
+    curled = (-curl_margin, np.inf)
+    extended = (-np.inf, -vertical_margin)
+    return [
+        ("Punch", {"index_curl": curled, "middle_curl": curled, "ring_curl": curled, "pinky_curl": curled}),
+        ("Jump", {"index_curl": extended, "middle_curl": extended, "ring_curl": extended, "pinky_curl": extended}),
+        ("Move Right", {"index_dx": (horizontal_margin, np.inf), "index_dy": (-vertical_margin, np.inf),
+                        "middle_curl": curled, "ring_curl": curled, "pinky_curl": curled}),
+        ("Move Left", {"index_dx": (-np.inf, -horizontal_margin), "index_dy": (-vertical_margin, np.inf),
+                       "middle_curl": curled, "ring_curl": curled, "pinky_curl": curled}),
+    ]
+
+
+def rule_bounds(rules):
+    """Lower and upper bound arrays of shape (rules, features) for classify_features"""
+    lower = np.full((len(rules), len(FEATURES)), -np.inf, dtype=np.float32)
+    upper = np.full((len(rules), len(FEATURES)), np.inf, dtype=np.float32)
+    for r, (_, conditions) in enumerate(rules):
+        for feature, (lo, hi) in conditions.items():
+            lower[r, FEATURE_INDEX[feature]] = lo
+            upper[r, FEATURE_INDEX[feature]] = hi
+    return lower, upper
+
+
+RULES = build_rules()
+GESTURES = [name for name, _ in RULES]
+NO_GESTURE = -1
+RULE_LOWER, RULE_UPPER = rule_bounds(RULES)
+
+
+def landmarks_to_array(hand_landmarks):
+    """Copy one MediaPipe hand into a (21, 3) float32 array of normalized x, y, z"""
+    return np.array([(lm.x, lm.y, lm.z) for lm in hand_landmarks.landmark], dtype=np.float32)
+
+
+def extract_features(landmarks, frame_size=(640, 480)):
+    """Compute the (N, len(FEATURES)) feature matrix for (N, 21, 3) normalized landmarks.
+
+    Points are scaled to the frame's aspect ratio and divided by the hand size,
+    so the features do not depend on camera resolution or distance to the camera.
+    ``frame_size`` is one (width, height) pair or an (N, 2) array of them.
+    """
+    landmarks = np.asarray(landmarks, dtype=np.float32).reshape(-1, 21, 3)
+    frame_size = np.asarray(frame_size, dtype=np.float32)
+    aspect = (frame_size[..., 0] / frame_size[..., 1]).reshape(-1, 1)
+    points = landmarks[:, :, :2].copy()
+    points[:, :, 0] *= aspect
+    hand_size = np.linalg.norm(points[:, MIDDLE_MCP] - points[:, WRIST], axis=1)
+    points = points / np.maximum(hand_size, 1e-6)[:, None, None]
+
+    features = np.empty((len(points), len(FEATURES)), dtype=np.float32)
+    features[:, 0:4] = points[:, FINGER_TIPS, 1] - points[:, FINGER_PIPS, 1]
+    features[:, 4:6] = points[:, INDEX_TIP] - points[:, INDEX_MCP]
+    return features
+
+
+def classify_features(features, lower=RULE_LOWER, upper=RULE_UPPER):
+    """Index of the first matching rule for each feature row, NO_GESTURE when none match"""
+    features = np.asarray(features, dtype=np.float32)
+    matches = np.all((features[:, None, :] > lower) & (features[:, None, :] < upper), axis=2)
+    return np.where(matches.any(axis=1), matches.argmax(axis=1), NO_GESTURE)
+
+
+def classify(landmarks, frame_size=(640, 480)):
+    """Classify a batch of (N, 21, 3) landmark arrays in one call"""
+    return classify_features(extract_features(landmarks, frame_size))
+
+
+def classify_hand(landmarks, frame_size=(640, 480)):
+    """Gesture name for a single (21, 3) landmark array, or None"""
+    index = classify(landmarks, frame_size)[0]
+    return GESTURES[index] if index != NO_GESTURE else None
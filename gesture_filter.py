@@ -0,0 +1,248 @@
+"""Temporal smoothing and hysteresis for per-frame gesture classification.
+
+Each hand's landmarks go through a One-Euro filter before classification. A
+hysteresis state machine then decides which gesture is held:
+- a gesture becomes active after its (strict) rule matches ``enter_frames``
+  frames in a row
+- it stays active while a looser exit rule still matches (curled fingers may
+  also straighten a little), and is released after ``exit_frames`` frames
+  without a match
+- if no hand is seen for ``no_hand_timeout`` seconds the gesture is released
+  and the filter state is dropped
+For several players on one camera, assign_hands splits each frame's hands
+between players before they reach each player's filters.
+"""
+import math
+
+import numpy as np
+
+from gesture_features import (GESTURES, HORIZONTAL_MARGIN, NO_GESTURE, VERTICAL_MARGIN, build_rules,
+                              classify_features, extract_features, rule_bounds)
+
+# Exit rules use this fraction of the entry margins, so a held gesture does not drop on a small wobble
+EXIT_MARGIN_SCALE = 0.5
+
+
+class OneEuroFilter:
+    """One-Euro low-pass filter over arrays of a fixed shape (Casiez et al., CHI 2012).
+
+    The cutoff rises with the filtered speed: slow jitter is smoothed heavily
+    and fast moves pass through with little lag. Cutoffs are in Hz; ``beta`` is
+    per unit of speed in the input's units per second (normalized image
+    coordinates for landmarks).
+    """
+
+    def __init__(self, min_cutoff=1.5, beta=10.0, d_cutoff=1.0):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.reset()
+
+    def reset(self):
+        self.x_prev = None
+        self.dx_prev = None
+        self.t_prev = None
+
+    @staticmethod
+    def _alpha(cutoff, dt):
+        tau = 1.0 / (2 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def __call__(self, x, t):
+        x = np.asarray(x, dtype=np.float32)
+        if self.x_prev is None:
+            self.x_prev = x
+            self.dx_prev = np.zeros_like(x)
+            self.t_prev = t
+            return x
+        dt = max(t - self.t_prev, 1e-6)
+        dx = (x - self.x_prev) / dt
+        a_d = self._alpha(self.d_cutoff, dt)
+        dx_hat = a_d * dx + (1 - a_d) * self.dx_prev
+        cutoff = self.min_cutoff + self.beta * np.abs(dx_hat)
+        a = self._alpha(cutoff, dt)
+        x_hat = a * x + (1 - a) * self.x_prev
+        self.x_prev = x_hat
+        self.dx_prev = dx_hat
+        self.t_prev = t
+        return x_hat
+
+
+class GestureHysteresis:
+    """Enter/exit state machine over per-frame feature rows"""
+
+    def __init__(self, enter_frames=2, exit_frames=3, vertical_margin=VERTICAL_MARGIN,
+                 horizontal_margin=HORIZONTAL_MARGIN, exit_scale=EXIT_MARGIN_SCALE):
+        self.enter_frames = enter_frames
+        self.exit_frames = exit_frames
+        self.enter_lower, self.enter_upper = rule_bounds(build_rules(vertical_margin, horizontal_margin))
+        self.exit_lower, self.exit_upper = rule_bounds(
+            build_rules(vertical_margin * exit_scale, horizontal_margin * exit_scale,
+                        curl_margin=vertical_margin * exit_scale))
+        self.reset()
+
+    def reset(self):
+        self.active = NO_GESTURE
+        self.candidate = NO_GESTURE
+        self.candidate_frames = 0
+        self.missed_frames = 0
+
+    def update(self, features):
+        """Feed one frame's feature row; returns the active gesture index or NO_GESTURE"""
+        features = np.asarray(features, dtype=np.float32).reshape(1, -1)
+        entered = classify_features(features, self.enter_lower, self.enter_upper)[0]
+
+        if self.active != NO_GESTURE:
+            row = self.active
+            holding = np.all((features[0] > self.exit_lower[row]) & (features[0] < self.exit_upper[row]))
+            self.missed_frames = 0 if holding else self.missed_frames + 1
+            if self.missed_frames >= self.exit_frames:
+                self.active = NO_GESTURE
+                self.missed_frames = 0
+
+        # A different gesture has to match its entry rule for enter_frames frames in a row
+        if entered != NO_GESTURE and entered != self.active:
+            if entered == self.candidate:
+                self.candidate_frames += 1
+            else:
+                self.candidate = entered
+                self.candidate_frames = 1
+            if self.candidate_frames >= self.enter_frames:
+                self.active = entered
+                self.missed_frames = 0
+                self.candidate_frames = 0
+        else:
+            self.candidate = NO_GESTURE
+            self.candidate_frames = 0
+        return self.active
+
+
+class HandGestureFilter:
+    """One hand: One-Euro landmark smoothing, classification and hysteresis"""
+
+    def __init__(self, no_hand_timeout=0.15, min_cutoff=1.5, beta=10.0, **hysteresis_options):
+        self.no_hand_timeout = no_hand_timeout
+        self.smoother = OneEuroFilter(min_cutoff, beta)
+        self.hysteresis = GestureHysteresis(**hysteresis_options)
+        self.last_seen = None
+
+    def reset(self):
+        self.smoother.reset()
+        self.hysteresis.reset()
+        self.last_seen = None
+
+    def update(self, landmarks, timestamp, frame_size):
+        """Feed a (21, 3) landmark array, or None when the hand was not seen; returns a gesture index"""
+        if landmarks is None:
+            # Hold through short dropouts, release once the hand has been gone long enough
+            if self.last_seen is not None and timestamp - self.last_seen > self.no_hand_timeout:
+                self.reset()
+            return self.hysteresis.active
+        if self.last_seen is not None and timestamp - self.last_seen > self.no_hand_timeout:
+            self.reset()
+        self.last_seen = timestamp
+        smoothed = self.smoother(landmarks, timestamp)
+        return self.hysteresis.update(extract_features(smoothed, frame_size)[0])
+
+
+class GestureFilterBank:
+    """Per-hand filters keyed by handedness, combined into one gesture per frame"""
+
+    def __init__(self, **options):
+        self.options = options
+        self.hands = {}
+
+    def reset(self):
+        self.hands.clear()
+
+    def update(self, tracked, timestamp, frame_size):
+        """Feed one frame's TrackedHand list; returns the held gesture name or None.
+
+        The first hand (in detection order) holding a gesture wins; hands that
+        dropped out keep their gesture until their no-hand timeout.
+        """
+        seen = {}
+        for hand in tracked:
+            key = hand.handedness
+            if key in seen:
+                continue  # two hands with the same label: keep the first
+            hand_filter = self.hands.get(key)
+            if hand_filter is None:
+                hand_filter = self.hands[key] = HandGestureFilter(**self.options)
+            seen[key] = hand_filter.update(hand.landmarks, timestamp, frame_size)
+        for key, hand_filter in self.hands.items():
+            if key not in seen:
+                seen[key] = hand_filter.update(None, timestamp, frame_size)
+        for index in seen.values():
+            if index != NO_GESTURE:
+                return GESTURES[index]
+        return None
+
+
+def assign_hands(tracked, players, mode="screen_half"):
+    """Split one frame's TrackedHand list between players: {player: [hands]}.
+
+    "screen_half" gives each player an equal vertical band of the (mirrored)
+    frame, left to right in player order, by the hand's mean x. "handedness"
+    gives "Left" hands to the first player and "Right" hands to the second.
+    With a single player every hand belongs to it.
+    """
+    assigned = {player: [] for player in players}
+    if len(players) == 1:
+        assigned[players[0]] = list(tracked)
+        return assigned
+    for hand in tracked:
+        if mode == "handedness":
+            player = players[0] if hand.handedness == "Left" else players[1]
+        elif mode == "screen_half":
+            x = float(np.mean(hand.landmarks[:, 0]))
+            player = players[min(max(int(x * len(players)), 0), len(players) - 1)]
+        else:
+            raise ValueError(f"unknown hand assignment {mode!r}")
+        assigned[player].append(hand)
+    return assigned
+
+
+def activation_report(predicted, labels, timestamps):
+    """Activation latency and false triggers of per-frame predictions against labels.
+
+    ``predicted`` holds a gesture name or None per frame and ``labels`` is a
+    {frame: gesture or None} dict (see landmark_log.load_labels); each label
+    holds until the next labelled frame. Latency runs from a labelled
+    gesture's first frame to the first frame it is predicted within that
+    labelled stretch. A false trigger is a prediction switching to a gesture
+    the label does not show on that frame.
+    """
+    n = min(len(predicted), len(timestamps))
+    filled = []
+    current = None
+    for frame in range(n):
+        current = labels.get(frame, current)
+        filled.append(current)
+    latencies = []
+    missed = 0
+    i = 0
+    while i < n:
+        label = filled[i]
+        if label is None or (i > 0 and filled[i - 1] == label):
+            i += 1
+            continue
+        end = i
+        while end < n and filled[end] == label:
+            end += 1
+        hit = next((j for j in range(i, end) if predicted[j] == label), None)
+        if hit is None:
+            missed += 1
+        else:
+            latencies.append(timestamps[hit] - timestamps[i])
+        i = end
+    activations = [j for j in range(n) if predicted[j] is not None and (j == 0 or predicted[j - 1] != predicted[j])]
+    false_triggers = sum(1 for j in activations if filled[j] != predicted[j])
+    duration = float(timestamps[n - 1] - timestamps[0]) if n > 1 else 0.0
+    lines = [f"labelled onsets: {len(latencies) + missed}  detected: {len(latencies)}  missed: {missed}"]
+    if latencies:
+        p50, p95 = np.percentile(np.array(latencies) * 1000, [50, 95])
+        lines.append(f"activation latency: p50 {p50:.0f} ms  p95 {p95:.0f} ms")
+    lines.append(f"activations: {len(activations)}  false triggers: {false_triggers}"
+                 + (f"  ({false_triggers / duration * 60:.1f}/min)" if duration > 0 else ""))
+    return "\n".join(lines)
@@ -0,0 +1,582 @@
+"""Hand capture and inference in a separate worker process.
+
+Usage: python gesture_worker.py [SOURCE] [--seconds S] [--modes none,thread,process]
+(compares game-loop frame times with no gestures, the threaded controller and the worker process)
+
+ProcessGestureController has the same interface as gesture_controls.GestureController,
+but camera capture, MediaPipe, the landmark loops and the gesture filters all
+run in a child process, so none of them hold the game process's GIL. It does
+not import OpenCV or MediaPipe itself.
+
+Inside the worker, the capture thread flips each camera frame straight into a
+slot of a shared-memory frame ring and the inference thread reads the newest
+slot in place: frames are never copied between stages. Only compact
+per-player gesture records come back to the game, through a shared control
+block with one seqlock-guarded record per player. The block also carries
+separate capture and inference heartbeats and frame counters. A monitor
+thread in the game restarts the worker if it exits or either heartbeat stops,
+so a blocked camera read and a hung hand model are both caught.
+
+Timestamps are time.perf_counter() seconds, which is system-wide monotonic on
+Linux, Windows and macOS, so the two processes can compare them.
+"""
+import argparse
+import json
+import subprocess
+import sys
+import threading
+import time
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from eventlog import GESTURE, LOG
+from gesture_features import GESTURES
+
+# Control block fields (float64 slots); PREVIEW_FPS, INFERENCE_SCALE and INFERENCE_FPS are quality settings
+# written by the game. Each heartbeat is the time its stage last finished a frame. A frame overwritten in the ring
+# counts once: in INFERENCE_SKIPPED if inference was waiting out INFERENCE_FPS, in CAPTURE_DROPPED otherwise.
+CAPTURE_HEARTBEAT, STOP, READY, DONE, CAPTURED, CAPTURE_DROPPED, INFERRED, PREVIEWED, PREVIEW_FPS, INFERENCE_SCALE, \
+    INFERENCE_FPS, INFERENCE_HEARTBEAT, INFERENCE_SKIPPED = range(13)
+CONTROL_FIELDS = 16
+# Per-player record after the control fields: seq, key code, gesture index, confidence, capture time, inference time
+RECORD_SIZE = 6
+NO_KEY = -1
+# Worker exit code when the frame source cannot be opened; restarting would not help
+EXIT_NO_CAMERA = 2
+
+# One gesture record as read by the game
+WorkerSample = namedtuple("WorkerSample", ["seq", "gesture", "key", "confidence", "capture_time", "inference_time"])
+
+
+class FrameRing:
+    """Fixed ring of frames in shared memory: one writer thread, one reader thread.
+
+    The writer fills a slot that is neither the newest nor the one the reader
+    holds, then publishes it as the newest. ``acquire`` hands the reader a view
+    of the newest slot and holds it until the next ``acquire``, so the view
+    stays valid while inference runs on it. Frames the reader never took are
+    counted in ``dropped``.
+    """
+
+    def __init__(self, name, shape, slots=3, create=True):
+        import cv2
+        self._flip = cv2.flip
+        self.shape = tuple(shape)
+        frame_bytes = int(np.prod(self.shape))
+        # Created by the worker, unlinked by the game (also after a crash, see _unlink)
+        self.shm = _untracked(name, create=create, size=slots * frame_bytes)
+        self.frames = np.ndarray((slots,) + self.shape, dtype=np.uint8, buffer=self.shm.buf)
+        self.slots = slots
+        self.times = [0.0] * slots
+        self.seqs = [0] * slots
+        self.latest = -1
+        self.held = -1
+        self.written = 0
+        self.taken = 0
+        self._cond = threading.Condition()
+
+    @property
+    def dropped(self):
+        return self.written - self.taken
+
+    def write(self, frame, capture_time, flip=True):
+        """Store a BGR frame (mirrored for the selfie view unless ``flip`` is False)"""
+        with self._cond:
+            slot = next(i for i in range(self.slots) if i != self.latest and i != self.held)
+        if flip:
+            self._flip(frame, 1, dst=self.frames[slot])
+        else:
+            self.frames[slot] = frame
+        with self._cond:
+            self.written += 1
+            self.seqs[slot] = self.written
+            self.times[slot] = capture_time
+            self.latest = slot
+            self._cond.notify()
+
+    def acquire(self, timeout=None):
+        """Hold the newest unseen frame: (view, capture time), or None if none arrived in time"""
+        with self._cond:
+            seen = self.seqs[self.held] if self.held >= 0 else 0
+            if not self._cond.wait_for(lambda: self.latest >= 0 and self.seqs[self.latest] > seen, timeout):
+                return None
+            self.held = self.latest
+            self.taken += 1
+            return self.frames[self.held], self.times[self.held]
+
+    def close(self):
+        self.frames = None
+        self.shm.close()
+
+
+def _unlink(name):
+    """Remove a shared memory block left behind by a worker that died"""
+    try:
+        shm = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
+
+
+def _untracked(name, create=False, size=0):
+    """Open a block the game process cleans up, so the worker's resource tracker leaves it alone"""
+    try:
+        return shared_memory.SharedMemory(name=name, create=create, size=size, track=False)
+    except TypeError:  # Python < 3.13
+        from multiprocessing import resource_tracker
+        shm = shared_memory.SharedMemory(name=name, create=create, size=size)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+def run_worker(control_name, config):
+    """Worker process body: capture and inference threads writing into the control block"""
+    import cv2
+    import mediapipe as mp
+    from frame_sources import open_source
+    from gesture_controls import GESTURE_KEYS, FrameSlot
+    from gesture_filter import GestureFilterBank, assign_hands
+    from hand_tracking import HandTracker, draw_hand
+    from landmark_log import LandmarkRecorder
+
+    shm = _untracked(control_name)
+    control = np.ndarray((shm.size // 8,), dtype=np.float64, buffer=shm.buf)
+    players = config["players"]
+    hands = mp.solutions.hands.Hands(max_num_hands=max(2, len(players)),
+                                     min_detection_confidence=0.7, min_tracking_confidence=0.7)
+    tracker = HandTracker(hands, use_roi=config["use_roi"], expected_hands=len(players))
+    filters = {player: GestureFilterBank(no_hand_timeout=config["no_hand_timeout"], **config["filter_options"])
+               for player in players}
+    recorder = LandmarkRecorder(config["record_path"]) if config["record_path"] else None
+    source = open_source(config["source"] if config["source"] is not None else 0)
+    if not source.isOpened():
+        GESTURE.error("Could not open camera")
+        return EXIT_NO_CAMERA
+    source.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+    state = {"ring": None, "running": True}
+    ring_ready = threading.Event()
+    preview_slot = FrameSlot()
+
+    def capture_loop():
+        while state["running"] and not control[STOP]:
+            ok, frame = source.read()
+            if not ok:
+                if source.finished():
+                    GESTURE.info("Frame source finished")
+                    control[DONE] = 1
+                    break
+                time.sleep(0.05)  # a failed camera read: let it recover instead of spinning
+                continue
+            if state["ring"] is None:
+                state["ring"] = FrameRing(config["ring_name"], frame.shape)
+                ring_ready.set()
+            state["ring"].write(frame, time.perf_counter())
+            control[CAPTURED] += 1
+            control[CAPTURE_HEARTBEAT] = time.perf_counter()
+        state["running"] = False
+
+    def preview_loop():
+        window_name = "Hand Gesture Controls - Player " + " & ".join(str(player) for player in players)
+        shown = False
+        while state["running"]:
+            if not control[PREVIEW_FPS]:
+                # Preview turned off by the game: close the window until it is turned back on
+                if shown:
+                    cv2.destroyWindow(window_name)
+                    shown = False
+                time.sleep(0.1)
+                continue
+            item = preview_slot.get(timeout=0.1)
+            if item is not None:
+                frame, tracked = item
+                for hand in tracked:
+                    draw_hand(frame, hand.landmarks, mp.solutions.hands.HAND_CONNECTIONS)
+                cv2.imshow(window_name, cv2.resize(frame, (800, 600)))
+                shown = True
+                control[PREVIEWED] += 1
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                GESTURE.info("Quitting gesture detection...")
+                control[DONE] = 1
+                state["running"] = False
+
+    capture_thread = threading.Thread(target=capture_loop, name="gesture-capture", daemon=True)
+    capture_thread.start()
+    if config["show_preview"]:
+        threading.Thread(target=preview_loop, name="gesture-preview", daemon=True).start()
+    GESTURE.info("Gesture worker started")
+
+    next_preview = 0.0
+    next_inference = 0.0
+    throttled_from = None  # frames written to the ring when the current rate-cap wait began
+    try:
+        while state["running"] and not control[STOP]:
+            # Under a rate cap, wait out the interval; the ring keeps the newest frame meanwhile
+            delay = next_inference - time.perf_counter()
+            if delay > 0:
+                time.sleep(min(delay, 0.1))
+                continue
+            if not ring_ready.wait(0.1):
+                continue
+            ring = state["ring"]
+            item = ring.acquire(timeout=0.1)
+            if item is None:
+                continue
+            if throttled_from is not None:
+                # Frames written during the wait and passed over for this one were skipped by inference
+                control[INFERENCE_SKIPPED] += max(0, ring.seqs[ring.held] - 1 - throttled_from)
+                throttled_from = None
+            frame, capture_time = item
+            # Quality fields are read once: the game may zero them between two reads
+            inference_fps = control[INFERENCE_FPS]
+            if inference_fps:
+                next_inference = time.perf_counter() + 1.0 / inference_fps
+            tracker.inference_scale = control[INFERENCE_SCALE]
+            tracked = tracker.process(frame)
+            frame_size = (frame.shape[1], frame.shape[0])
+            if recorder:
+                recorder.record(capture_time, tracked, frame_size)
+            assigned = assign_hands(tracked, players, config["assignment"])
+            for i, player in enumerate(players):
+                player_hands = assigned[player]
+                try:
+                    gesture = filters[player].update(player_hands, capture_time, frame_size)
+                except Exception as e:
+                    GESTURE.error("Error processing hand landmarks: %s", e)
+                    gesture = None
+                key = GESTURE_KEYS[player].get(gesture, NO_KEY)
+                confidence = max((hand.score for hand in player_hands), default=0.0)
+                # Seqlock: an odd sequence number tells the reader the record is being written
+                record = control[CONTROL_FIELDS + i * RECORD_SIZE:CONTROL_FIELDS + (i + 1) * RECORD_SIZE]
+                record[0] += 1
+                record[1:] = (key, GESTURES.index(gesture) if gesture else -1, confidence, capture_time,
+                              time.perf_counter())
+                record[0] += 1
+            control[INFERRED] += 1
+            control[CAPTURE_DROPPED] = ring.dropped - control[INFERENCE_SKIPPED]
+            control[INFERENCE_HEARTBEAT] = time.perf_counter()
+            # Stall checks start once both stages have handled a frame (camera warm-up and the model's first run
+            # count against the startup timeout instead)
+            control[READY] = 1
+            # The preview gets its own copy, and only at the preview rate
+            preview_fps = control[PREVIEW_FPS]
+            if config["show_preview"] and preview_fps and capture_time >= next_preview:
+                next_preview = capture_time + 1.0 / preview_fps
+                preview_slot.put((frame.copy(), tracked))
+            if inference_fps:
+                throttled_from = ring.written
+    finally:
+        # The capture thread may still be writing into the ring
+        state["running"] = False
+        capture_thread.join(1.0)
+        source.release()
+        if recorder:
+            recorder.close()
+        if state["ring"] is not None:
+            state["ring"].close()
+        if config["show_preview"]:
+            cv2.destroyAllWindows()
+        shm.close()
+    return 0
+
+
+class ProcessGestureController:
+    """GestureController stand-in that runs capture and inference in a child process.
+
+    ``source`` is a frame source spec for frame_sources.open_source (camera
+    index, "synthetic", an image directory or a video file; None for camera
+    0), since source objects cannot cross processes. The worker is restarted
+    when it exits unexpectedly or its capture or inference heartbeat is older
+    than ``stall_timeout`` seconds (``startup_timeout`` until the first frame
+    has been through both), at most ``max_restarts`` times.
+    """
+
+    def __init__(self, player_num=1, show_preview=True, preview_fps=15, max_gesture_age=0.25,
+                 inference_scale=1.0, use_roi=False, record_path=None, no_hand_timeout=0.15,
+                 players=None, assignment="screen_half", source=None, stall_timeout=2.0,
+                 startup_timeout=30.0, max_restarts=3, **filter_options):
+        self.players = tuple(players) if players else (player_num,)
+        self.player_num = self.players[0]
+        self.config = {"players": list(self.players), "assignment": assignment, "show_preview": show_preview,
+                       "use_roi": use_roi, "record_path": record_path, "no_hand_timeout": no_hand_timeout,
+                       "filter_options": filter_options, "source": source}
+        self.max_gesture_age = max_gesture_age
+        self.stall_timeout = stall_timeout
+        self.startup_timeout = startup_timeout
+        self.max_restarts = max_restarts
+        self.shm = shared_memory.SharedMemory(create=True, size=(CONTROL_FIELDS + RECORD_SIZE * len(self.players)) * 8)
+        self.control = np.ndarray((self.shm.size // 8,), dtype=np.float64, buffer=self.shm.buf)
+        self.control[:] = 0
+        self.ring_name = self.shm.name + "_frames"
+        self.process = None
+        self.monitor = None
+        self.is_running = False
+        self.restarts = 0
+        self.spawned_at = 0.0
+        self.samples = {player: None for player in self.players}
+        self.current_gestures = {player: None for player in self.players}
+        self.last_seqs = {player: 0 for player in self.players}
+        self.stale_gestures = 0
+        # Punch re-fire latch (see GestureController.get_current_keys)
+        self.attack_cooldown = 1.0
+        self.last_attack_times = {player: float("-inf") for player in self.players}
+        # Quality settings live in the control block, so they reach the worker (and survive restarts) at once
+        self.quality = {PREVIEW_FPS: preview_fps, INFERENCE_SCALE: inference_scale, INFERENCE_FPS: 0}
+        self._write_quality()
+
+    @property
+    def current_gesture(self):
+        return self.current_gestures[self.player_num]
+
+    def start(self, source=None):
+        """Launch the worker process and its monitor; ``source`` overrides the constructor's spec"""
+        if source is not None:
+            self.config["source"] = source
+        self.is_running = True
+        self._spawn()
+        self.monitor = threading.Thread(target=self._monitor_loop, name="gesture-monitor", daemon=True)
+        self.monitor.start()
+
+    def _spawn(self):
+        _unlink(self.ring_name)
+        self.control[:CONTROL_FIELDS] = 0
+        self._write_quality()
+        config = dict(self.config, ring_name=self.ring_name)
+        # A fresh interpreter, not multiprocessing: spawn would re-run main.py, fork would copy SDL state
+        self.process = subprocess.Popen([sys.executable, __file__, "--worker", self.shm.name, json.dumps(config)])
+        self.spawned_at = time.perf_counter()
+
+    def _write_quality(self):
+        for field, value in self.quality.items():
+            self.control[field] = value
+
+    def set_quality(self, preview_fps=None, inference_scale=None, inference_fps=None):
+        """Change pipeline settings while running (see GestureController.set_quality)"""
+        for field, value in ((PREVIEW_FPS, preview_fps), (INFERENCE_SCALE, inference_scale),
+                             (INFERENCE_FPS, inference_fps)):
+            if value is not None:
+                self.quality[field] = value
+        if self.control is not None:
+            self._write_quality()
+
+    def _monitor_loop(self):
+        while self.is_running:
+            time.sleep(0.25)
+            if not self.is_running:
+                break
+            code = self.process.poll()
+            if code is not None:
+                if self.control[DONE]:
+                    GESTURE.info("Gesture worker finished")
+                    break
+                if code == EXIT_NO_CAMERA:
+                    break
+                reason = f"exited with code {code}"
+            elif self.control[READY]:
+                reason = self._stalled()
+                if reason is None:
+                    continue
+            elif time.perf_counter() - self.spawned_at > self.startup_timeout:
+                reason = "did not start in time"
+            else:
+                continue
+            self._terminate()
+            if not self.is_running:
+                break  # stop() began while the old worker was shutting down
+            if self.restarts >= self.max_restarts:
+                GESTURE.error("Gesture worker %s; giving up after %d restarts", reason, self.restarts)
+                break
+            self.restarts += 1
+            GESTURE.warning("Gesture worker %s; restarting (%d/%d)", reason, self.restarts, self.max_restarts)
+            self._spawn()
+
+    def _stalled(self):
+        """Which stage has not finished a frame within stall_timeout, as a reason; None if neither"""
+        now = time.perf_counter()
+        for stage, field in (("capture", CAPTURE_HEARTBEAT), ("inference", INFERENCE_HEARTBEAT)):
+            if now - self.control[field] > self.stall_timeout:
+                return f"{stage} stalled for {now - self.control[field]:.1f} s"
+        return None
+
+    def _terminate(self):
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(1.0)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        _unlink(self.ring_name)
+
+    def stop(self):
+        """Stop the worker and release the shared memory"""
+        if self.shm is None:
+            return
+        self.is_running = False
+        # Join the monitor first: one mid-restart would otherwise spawn a worker (and clear STOP) after this returns
+        if self.monitor is not None:
+            self.monitor.join()
+        if self.process is not None:
+            self.control[STOP] = 1
+            try:
+                self.process.wait(2.0)
+            except subprocess.TimeoutExpired:
+                pass
+            self._terminate()
+        self.control = None
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = None
+
+    def _read(self, player):
+        """Newest record for a player, or None; never blocks on the worker"""
+        i = self.players.index(player)
+        record = self.control[CONTROL_FIELDS + i * RECORD_SIZE:CONTROL_FIELDS + (i + 1) * RECORD_SIZE]
+        cached = self.samples[player]
+        for _ in range(3):
+            seq = record[0]
+            if cached is not None and seq == cached.seq:
+                return cached
+            if seq % 2:
+                continue  # the worker is writing this record
+            values = record[1:].tolist()
+            if record[0] != seq:
+                continue  # the worker started writing while the record was copied
+            if not seq:
+                return None
+            index = int(values[1])
+            self.samples[player] = WorkerSample(seq, GESTURES[index] if index >= 0 else None, int(values[0]),
+                                                *values[2:])
+            return self.samples[player]
+        return cached
+
+    def get_current_keys(self, player=None):
+        """Convert a player's held gesture to Pygame key states (the first player by default)"""
+        player = self.player_num if player is None else player
+        sample = self._read(player) if self.control is not None else None
+        gesture = None
+        key = NO_KEY
+        if sample is not None:
+            age = time.perf_counter() - sample.capture_time
+            if sample.seq != self.last_seqs[player]:
+                self.last_seqs[player] = sample.seq
+                if self.max_gesture_age is not None and age > self.max_gesture_age:
+                    self.stale_gestures += 1
+            # Release keys when the worker has stopped delivering (camera stall, crash, restart)
+            if self.max_gesture_age is None or age <= self.max_gesture_age:
+                gesture, key = sample.gesture, sample.key
+        if gesture == "Punch":
+            # One press, then another every attack_cooldown seconds while the fist is held
+            now = time.perf_counter()
+            if now - self.last_attack_times[player] >= self.attack_cooldown:
+                self.last_attack_times[player] = now
+            else:
+                key = NO_KEY
+        if gesture != self.current_gestures[player]:
+            GESTURE.debug("Player %d gesture: %s", player, gesture)
+            self.current_gestures[player] = gesture
+        return [key] if key != NO_KEY else []
+
+    def latest_sample(self, player=None):
+        """A player's newest WorkerSample (the first player by default), None if there is none"""
+        return self._read(self.player_num if player is None else player) if self.control is not None else None
+
+    def input_age(self, player=None):
+        """Seconds since the frame behind the newest gesture was captured, None if there is none"""
+        sample = self.latest_sample(player)
+        if sample is None:
+            return None
+        return time.perf_counter() - sample.capture_time
+
+    def latency(self, player=None):
+        """Seconds from capture to published gesture for the newest sample, None if there is none"""
+        sample = self.latest_sample(player)
+        if sample is None:
+            return None
+        return sample.inference_time - sample.capture_time
+
+    def get_pipeline_stats(self):
+        """Frames handled and dropped by each stage of the current worker, plus restarts"""
+        control = self.control
+        return {"capture": {"frames": int(control[CAPTURED]), "dropped": int(control[CAPTURE_DROPPED])},
+                "inference": {"frames": int(control[INFERRED]), "dropped": int(control[INFERENCE_SKIPPED])},
+                "preview": {"frames": int(control[PREVIEWED]), "dropped": 0},
+                "worker": {"restarts": self.restarts, "pid": self.process.pid if self.process else None}}
+
+
+def frame_time_run(mode, source, seconds, fps=60):
+    """Run a headless stand-in for the game loop next to the gesture pipeline; returns frame times in seconds.
+
+    Each frame steps a Match and a CPU opponent (pure Python, like the game's
+    simulation), then waits for the next frame like pygame's Clock.tick.
+    """
+    from ai import CpuOpponent
+    from engine import MASK_KEYS, Match, random_script
+
+    controller = None
+    if mode == "thread":
+        from frame_sources import open_source
+        from gesture_controls import GestureController
+        controller = GestureController(show_preview=False)
+        controller.start(open_source(source))
+    elif mode == "process":
+        controller = ProcessGestureController(show_preview=False, source=source)
+        controller.start()
+        while not controller.control[INFERRED] and controller.process.poll() is None:
+            time.sleep(0.05)  # let MediaPipe load before measuring
+
+    match = Match()
+    cpu = CpuOpponent(difficulty="hard")
+    script = random_script(0, int(seconds * fps))
+    frame_times = []
+    interval = 1.0 / fps
+    next_frame = last = time.perf_counter()
+    for tick in range(len(script)):
+        if controller:
+            controller.get_current_keys()
+        mask_1 = script[tick]
+        match.step(MASK_KEYS[1][mask_1], MASK_KEYS[2][cpu.decide(match, mask_1)])
+        next_frame += interval
+        delay = next_frame - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        now = time.perf_counter()
+        frame_times.append(now - last)
+        last = now
+    stats = controller.get_pipeline_stats() if controller else None
+    if controller:
+        controller.stop()
+    return np.array(frame_times), stats
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--worker":
+        LOG.start()
+        try:
+            code = run_worker(sys.argv[2], json.loads(sys.argv[3]))
+        finally:
+            LOG.stop()
+        sys.exit(code)
+
+    parser = argparse.ArgumentParser(description="Compare game-loop frame times across gesture pipeline modes")
+    parser.add_argument("source", nargs="?", default="synthetic", help='frame source spec (default "synthetic")')
+    parser.add_argument("--seconds", type=float, default=9.0, help="per mode; the synthetic source runs out after 10 s")
+    parser.add_argument("--modes", default="none,thread,process")
+    args = parser.parse_args()
+
+    LOG.start()
+    print(f"{'mode':<9}{'mean':>8}{'std':>8}{'p99':>8}{'max':>8}  ms   >20 ms  inferred")
+    for mode in args.modes.split(","):
+        times, stats = frame_time_run(mode, args.source, args.seconds)
+        ms = times * 1000
+        inferred = stats["inference"]["frames"] if stats else "-"
+        print(f"{mode:<9}{ms.mean():>8.2f}{ms.std():>8.2f}{np.percentile(ms, 99):>8.2f}{ms.max():>8.2f}"
+              f"{int((ms > 20).sum()):>11}  {inferred}")
+    LOG.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import time
+import cv2
+from collections import namedtuple
+from gesture_features import landmarks_to_array
+from profiler import PROFILER
+
+# One detected hand; landmarks are a (21, 3) float32 array normalized to the full frame
+TrackedHand = namedtuple("TrackedHand", ["landmarks", "handedness", "score"])
+
+
+class HandTracker:
+    """Runs MediaPipe Hands on a reduced-resolution frame or a region of interest.
+
+    Full-frame detection works on a copy downscaled by ``inference_scale``. With
+    ``use_roi`` enabled, once a hand is found the next frame is cropped around the
+    previous landmarks' bounding box (grown by ``roi_margin`` of its size on each
+    side) and the crop is shrunk so its longest side is at most ``roi_size``.
+    When the crop loses the hand, the tracker falls back to full-frame detection.
+    The crop is only used while ``expected_hands`` hands (one per player) are
+    tracked, and every ``full_frame_every`` frames a full-frame detection runs
+    anyway, so a hand entering outside the crop is still found.
+    Landmarks are always returned in full-frame normalized coordinates, so the
+    gesture rules do not change.
+    """
+
+    def __init__(self, hands, inference_scale=1.0, use_roi=False, roi_margin=0.3, roi_size=256, expected_hands=1,
+                 full_frame_every=15):
+        self.hands = hands
+        self.inference_scale = inference_scale
+        self.use_roi = use_roi
+        self.roi_margin = roi_margin
+        self.roi_size = roi_size
+        self.expected_hands = expected_hands
+        self.full_frame_every = full_frame_every
+        self.roi = None  # (x0, y0, x1, y1) in pixels, None for full-frame detection
+        self.roi_frames = 0  # crop detections since the last full-frame one
+        self.stats = {"full_frame": 0, "roi": 0, "lost": 0}
+        self.timings = {"convert": 0.0, "detect": 0.0}  # seconds spent on the last frame
+
+    def reset(self):
+        self.roi = None
+        self.roi_frames = 0
+
+    def process(self, frame):
+        """Detect hands in a BGR frame and return a list of TrackedHand"""
+        h, w = frame.shape[:2]
+        use_roi = self.roi is not None and self.roi_frames < self.full_frame_every
+        if use_roi:
+            x0, y0, x1, y1 = self.roi
+            image = frame[y0:y1, x0:x1]
+            scale = min(1.0, self.roi_size / max(x1 - x0, y1 - y0))
+            self.roi_frames += 1
+            self.stats["roi"] += 1
+        else:
+            x0, y0, x1, y1 = 0, 0, w, h
+            image = frame
+            scale = self.inference_scale
+            self.roi_frames = 0
+            self.stats["full_frame"] += 1
+
+        start = time.perf_counter()
+        if scale < 1.0:
+            size = (max(1, int(image.shape[1] * scale)), max(1, int(image.shape[0] * scale)))
+            image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        # Color conversion runs on the reduced image only
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        converted = time.perf_counter()
+        results = self.hands.process(image)
+        detected = time.perf_counter()
+        self.timings["convert"] = converted - start
+        self.timings["detect"] = detected - converted
+        PROFILER.record("gesture.convert", start, converted)
+        PROFILER.record("gesture.detect", converted, detected)
+
+        tracked = []
+        if results.multi_hand_landmarks:
+            for idx, hand_landmarks in enumerate(results.multi_hand_landmarks):
+                landmarks = landmarks_to_array(hand_landmarks)
+                # Map crop-relative coordinates back to the full frame
+                landmarks[:, 0] = (x0 + landmarks[:, 0] * (x1 - x0)) / w
+                landmarks[:, 1] = (y0 + landmarks[:, 1] * (y1 - y0)) / h
+                classification = results.multi_handedness[idx].classification[0]
+                tracked.append(TrackedHand(landmarks, classification.label, classification.score))
+
+        if use_roi and len(tracked) < self.expected_hands:
+            self.stats["lost"] += 1
+        self._update_roi(tracked, w, h)
+        return tracked
+
+    def _update_roi(self, tracked, w, h):
+        # Until every expected hand is tracked, keep searching the whole frame
+        if not self.use_roi or not tracked or len(tracked) < self.expected_hands:
+            self.roi = None
+            return
+        xs = [hand.landmarks[:, 0] for hand in tracked]
+        ys = [hand.landmarks[:, 1] for hand in tracked]
+        left = min(x.min() for x in xs) * w
+        right = max(x.max() for x in xs) * w
+        top = min(y.min() for y in ys) * h
+        bottom = max(y.max() for y in ys) * h
+        # Grow the box into a square around the hands so fast moves stay inside it
+        side = max(right - left, bottom - top) * (1 + 2 * self.roi_margin)
+        cx, cy = (left + right) / 2, (top + bottom) / 2
+        x0, y0 = max(0, int(cx - side / 2)), max(0, int(cy - side / 2))
+        x1, y1 = min(w, int(cx + side / 2)), min(h, int(cy + side / 2))
+        self.roi = (x0, y0, x1, y1) if x1 - x0 > 1 and y1 - y0 > 1 else None
+
+
+def draw_hand(frame, landmarks, connections):
+    """Draw one hand's full-frame normalized landmarks onto a BGR frame"""
+    h, w = frame.shape[:2]
+    points = [(int(x * w), int(y * h)) for x, y in landmarks[:, :2]]
+    for start, end in connections:
+        cv2.line(frame, points[start], points[end], (255, 255, 255), 2)
+    for point in points:
+        cv2.circle(frame, point, 4, (0, 0, 255), -1)
@@ -0,0 +1,121 @@
+import pygame
+import numpy as np
+from collections import namedtuple
+
+#collision masks use a coarse grid: one cell per CELL x CELL screen pixels, opaque if any of its pixels are
+CELL = 8
+ALPHA_THRESHOLD = 127
+ATTACK_ACTIONS = (3, 4)
+#hitbox pieces smaller than this many cells are animation noise (a shifted hand or cape), not a strike
+MIN_HIT_CELLS = 4
+
+#one box: rect in screen pixels relative to the fighter rect's top-left corner, and the mask covering that rect
+Box = namedtuple("Box", ["rect", "mask"])
+
+#process-wide bank of built tables, keyed by the frame bank's animation list they were built from
+table_bank = {}
+
+
+class HitboxTable():
+  #per facing, per action, per frame: hurt[flip][action][frame] is the sprite's opaque area as a Box,
+  #hit[flip][action][frame] the attack's reach as a Box (None outside attack frames or when nothing sticks out)
+  def __init__(self, hurt, hit):
+    self.hurt = hurt
+    self.hit = hit
+
+  def cells(self):
+    #mask cells held by the whole table, a measure of how compact it is
+    return sum(box.mask.get_size()[0] * box.mask.get_size()[1] for boxes in (self.hurt, self.hit)
+               for rows in boxes.values() for row in rows for box in row if box is not None)
+
+
+def opaque_pixels(frame, origin=(0, 0), frame_size=None):
+  #(height, width) bool array of pixels above the alpha threshold, read straight from the 32-bit pixel buffer;
+  #a cropped frame is placed at its origin in a frame_size x frame_size array
+  width, height = frame.get_size()
+  opaque = np.zeros((frame_size, frame_size) if frame_size else (height, width), dtype=bool)
+  if width and height:
+    pixels = np.frombuffer(frame.get_buffer(), dtype=np.uint32).reshape(height, frame.get_pitch() // 4)[:, :width]
+    alpha = (pixels >> frame.get_shifts()[3]) & 0xFF
+    opaque[origin[1]:origin[1] + height, origin[0]:origin[0] + width] = alpha > ALPHA_THRESHOLD
+  return opaque
+
+
+def cell_grid(opaque, flip=False):
+  #(width, height) bool array of grid cells holding an opaque pixel, of the frame or its mirror image
+  height, width = opaque.shape
+  grid_width, grid_height = -(-width // CELL), -(-height // CELL)
+  padded = np.zeros((grid_height * CELL, grid_width * CELL), dtype=bool)
+  padded[:height, :width] = opaque[:, ::-1] if flip else opaque
+  #CELL (8) neighbouring bools in a row are one uint64: nonzero if any is set; then OR each CELL rows together
+  cells = padded.view(np.uint64) != 0
+  return cells.reshape(grid_height, CELL, grid_width).any(axis=1).T
+
+
+def grid_box(cells, origin):
+  #crop a cell grid to its opaque cells; origin is the frame's top-left relative to the fighter rect
+  xs = np.flatnonzero(cells.any(axis=1))
+  ys = np.flatnonzero(cells.any(axis=0))
+  if not len(xs):
+    return None
+  x0, x1, y0, y1 = xs[0], xs[-1] + 1, ys[0], ys[-1] + 1
+  cropped = cells[x0:x1, y0:y1]
+  surface = pygame.Surface(cropped.shape, pygame.SRCALPHA)
+  pygame.surfarray.pixels_alpha(surface)[...] = cropped * 255
+  rect = pygame.Rect(origin[0] + x0 * CELL, origin[1] + y0 * CELL, (x1 - x0) * CELL, (y1 - y0) * CELL)
+  return Box(rect, pygame.mask.from_surface(surface, ALPHA_THRESHOLD))
+
+
+def build_table(animation_list, origins, data, body_width):
+  #hurtboxes from every frame's alpha; hitboxes from attack frames: what sticks out past the idle silhouette
+  #on the facing side of the body. The flipped facing uses the mirrored frames, as register_frames does.
+  #origins place cropped frames in the full frame (see fighter.frame_origins).
+  #None for frames without per-pixel alpha (placeholder sheets)
+  if not animation_list[0][0].get_flags() & pygame.SRCALPHA:
+    return None
+  size, image_scale, offset = data
+  origin = (-offset[0] * image_scale, -offset[1] * image_scale)#where Fighter.draw puts the frame
+  centre = (body_width / 2 - origin[0]) / CELL#body centre line in cells from the frame's left edge
+  hurt = {}
+  hit = {}
+  opaque = [[opaque_pixels(frame, origin, size * image_scale) for frame, origin in zip(row, origin_row)]
+            for row, origin_row in zip(animation_list, origins)]
+  for flip in (False, True):
+    grids = [[cell_grid(pixels, flip) for pixels in row] for row in opaque]
+    idle = np.logical_or.reduce(grids[0])
+    front = np.arange(idle.shape[0])[:, None] < centre if flip else np.arange(idle.shape[0])[:, None] > centre
+    hurt[flip] = [[grid_box(cells, origin) for cells in row] for row in grids]
+    hit[flip] = []
+    for action, row in enumerate(grids):
+      hit_row = []
+      for cells in row:
+        reach = cells & ~idle & front if action in ATTACK_ACTIONS else None
+        if reach is not None and reach.sum() >= MIN_HIT_CELLS:
+          hit_row.append(grid_box(reach, origin))
+        else:
+          hit_row.append(None)
+      hit[flip].append(hit_row)
+  return HitboxTable(hurt, hit)
+
+
+def hitbox_table(fighter):
+  #the table for a fighter's current frames, built once per set of frames; None for headless fighters
+  if fighter.animation_list[0][0] is None:
+    return None
+  entry = table_bank.get(id(fighter.animation_list))
+  if entry is None or entry[0] is not fighter.animation_list:
+    entry = (fighter.animation_list, build_table(fighter.animation_list, fighter.origin_list,
+                                                 (fighter.size, fighter.image_scale, fighter.offset),
+                                                 fighter.rect.width))
+    table_bank[id(fighter.animation_list)] = entry
+  return entry[1]
+
+
+def boxes_overlap(hit, hit_pos, hurt, hurt_pos):
+  #broad phase on the boxes' rects, then narrow phase on their masks; positions are the fighters' rect corners
+  hit_rect = hit.rect.move(hit_pos)
+  hurt_rect = hurt.rect.move(hurt_pos)
+  if not hit_rect.colliderect(hurt_rect):
+    return False
+  offset = ((hurt_rect.x - hit_rect.x) // CELL, (hurt_rect.y - hit_rect.y) // CELL)
+  return hit.mask.overlap(hurt.mask, offset) is not None
@@ -0,0 +1,171 @@
+"""Record per-frame hand landmarks and re-run gesture classification offline.
+
+Usage: python landmark_log.py FILE [--vertical-margin M] [--horizontal-margin M] [--smooth] [--labels CSV]
+
+Classification runs over the recorded landmarks in batches with NumPy only,
+so neither OpenCV nor MediaPipe is needed to tune the gesture thresholds.
+With --smooth the frames go through the live temporal filter instead
+(gesture_filter.py); --labels adds activation latency and false triggers.
+"""
+import argparse
+import csv
+from collections import namedtuple
+
+import numpy as np
+
+from columnar import ColumnWriter, iter_chunks
+from gesture_features import (GESTURES, HORIZONTAL_MARGIN, NO_GESTURE, VERTICAL_MARGIN, build_rules,
+                              classify_features, extract_features, rule_bounds)
+from gesture_filter import GestureFilterBank, activation_report
+
+HANDEDNESS = {"Left": 0, "Right": 1}
+HANDEDNESS_NAMES = {code: name for name, code in HANDEDNESS.items()}
+NO_HAND = 255
+# Same fields as hand_tracking.TrackedHand, without importing OpenCV
+RecordedHand = namedtuple("RecordedHand", ["landmarks", "handedness", "score"])
+
+# One row per detected hand per frame; frames without a hand get one row with present = 0
+LANDMARK_COLUMNS = [
+    ("frame", "u4", ()),
+    ("timestamp", "f8", ()),
+    ("hand", "u1", ()),
+    ("present", "u1", ()),
+    ("handedness", "u1", ()),
+    ("score", "f4", ()),
+    ("frame_size", "u2", (2,)),
+    ("landmarks", "f4", (21, 3)),
+]
+
+
+def load_labels(path):
+    """Read a "frame,gesture" sidecar into {frame index: gesture or None}"""
+    labels = {}
+    with open(path, newline="") as f:
+        for row in csv.reader(f):
+            if not row or not row[0].strip().isdigit():
+                continue  # header or blank line
+            gesture = row[1].strip() if len(row) > 1 else ""
+            labels[int(row[0])] = gesture or None
+    return labels
+
+
+class LandmarkRecorder:
+    """Streams tracked hands to an append-only columnar landmark file"""
+
+    def __init__(self, path, chunk_rows=4096):
+        self.writer = ColumnWriter(path, LANDMARK_COLUMNS, chunk_rows)
+        self.frame = 0
+
+    def record(self, timestamp, tracked, frame_size):
+        """Store one frame's TrackedHand list; frame_size is (width, height)"""
+        if not tracked:
+            self.writer.append(frame=self.frame, timestamp=timestamp, present=0,
+                               handedness=NO_HAND, frame_size=frame_size)
+        for i, hand in enumerate(tracked):
+            self.writer.append(frame=self.frame, timestamp=timestamp, hand=i, present=1,
+                               handedness=HANDEDNESS.get(hand.handedness, NO_HAND), score=hand.score,
+                               frame_size=frame_size, landmarks=hand.landmarks)
+        self.frame += 1
+
+    def close(self):
+        self.writer.close()
+
+
+def reclassify(path, rules=None):
+    """Classify the first hand of every recorded frame.
+
+    Returns (gesture index per frame, timestamp per frame), with NO_GESTURE for
+    frames without a hand or without a matching rule.
+    """
+    lower, upper = rule_bounds(rules or build_rules())
+    gestures = []
+    timestamps = []
+    for chunk in iter_chunks(path):
+        first = chunk["hand"] == 0
+        present = chunk["present"][first].astype(bool)
+        result = np.full(int(first.sum()), NO_GESTURE, dtype=np.int64)
+        if present.any():
+            features = extract_features(chunk["landmarks"][first][present], chunk["frame_size"][first][present])
+            result[present] = classify_features(features, lower, upper)
+        gestures.append(result)
+        timestamps.append(chunk["timestamp"][first])
+    if not gestures:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+    return np.concatenate(gestures), np.concatenate(timestamps)
+
+
+def smooth_recording(path, **options):
+    """Run every recorded frame through a GestureFilterBank, as the live controller does.
+
+    Returns (gesture index per frame, timestamp per frame); ``options`` go to
+    the per-hand filters (no_hand_timeout, enter_frames, exit_frames, ...).
+    """
+    bank = GestureFilterBank(**options)
+    index = {name: i for i, name in enumerate(GESTURES)}
+    gestures = []
+    timestamps = []
+
+    def finish(hands, timestamp, frame_size):
+        gesture = bank.update(hands, timestamp, frame_size)
+        gestures.append(index.get(gesture, NO_GESTURE))
+        timestamps.append(timestamp)
+
+    frame = None
+    for chunk in iter_chunks(path):
+        for row in range(len(chunk["frame"])):
+            if chunk["frame"][row] != frame:
+                if frame is not None:
+                    finish(hands, timestamp, frame_size)
+                frame = chunk["frame"][row]
+                timestamp = float(chunk["timestamp"][row])
+                frame_size = tuple(chunk["frame_size"][row])
+                hands = []
+            if chunk["present"][row]:
+                hands.append(RecordedHand(chunk["landmarks"][row], HANDEDNESS_NAMES.get(int(chunk["handedness"][row])),
+                                          float(chunk["score"][row])))
+    if frame is not None:
+        finish(hands, timestamp, frame_size)
+    return np.array(gestures, dtype=np.int64), np.array(timestamps)
+
+
+def gesture_report(gestures, timestamps):
+    """How often each gesture fires and how often the output changes"""
+    total = len(gestures)
+    lines = [f"frames: {total}"]
+    for index, name in [(NO_GESTURE, "(none)")] + list(enumerate(GESTURES)):
+        count = int(np.count_nonzero(gestures == index))
+        lines.append(f"{name:<12}{count:>10}  {count / max(total, 1):6.1%}")
+    changes = np.count_nonzero(gestures[1:] != gestures[:-1])
+    # Flips go straight from one gesture to a different one without a gap
+    flips = np.count_nonzero((gestures[1:] != gestures[:-1]) & (gestures[1:] != NO_GESTURE)
+                             & (gestures[:-1] != NO_GESTURE))
+    duration = float(timestamps[-1] - timestamps[0]) if total > 1 else 0.0
+    lines.append(f"output changes: {changes}  gesture-to-gesture flips: {flips}")
+    if duration > 0:
+        lines.append(f"changes/s: {changes / duration:.2f}  flips/s: {flips / duration:.2f}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-run gesture classification over a landmark recording")
+    parser.add_argument("path")
+    parser.add_argument("--vertical-margin", type=float, default=VERTICAL_MARGIN,
+                        help="finger extension margin in hand sizes")
+    parser.add_argument("--horizontal-margin", type=float, default=HORIZONTAL_MARGIN,
+                        help="pointing margin in hand sizes")
+    parser.add_argument("--smooth", action="store_true", help="use the temporal filter and hysteresis")
+    parser.add_argument("--labels", help='CSV of "frame,gesture" rows to measure latency and false triggers')
+    args = parser.parse_args()
+    if args.smooth:
+        gestures, timestamps = smooth_recording(args.path, vertical_margin=args.vertical_margin,
+                                                horizontal_margin=args.horizontal_margin)
+    else:
+        gestures, timestamps = reclassify(args.path, build_rules(args.vertical_margin, args.horizontal_margin))
+    print(gesture_report(gestures, timestamps))
+    if args.labels:
+        names = [GESTURES[g] if g != NO_GESTURE else None for g in gestures]
+        print(activation_report(names, load_labels(args.labels), timestamps))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,97 @@
-# Define number of steps in each animation
-WARRIOR_ANIMATION_STEPS = [10, 8, 1, 7, 7, 3, 7]
-WIZARD_ANIMATION_STEPS = [8, 8, 1, 8, 8, 3, 7]
-
 import pygame
 from pygame import mixer
 from fighter import Fighter
+from hitboxes import hitbox_table
+from engine import PLAYER_KEYS, Match, keys_to_mask, mask_to_keys
+from renderer import LayeredRenderer, draw_match
+from replay import Replay, ReplayRecorder
+from netplay import LinkSimulator, RollbackSession, UdpTransport
+from ai import DEFAULT_BUDGET, DIFFICULTIES, CpuOpponent
+from eventlog import GAME, INPUT, LOG, parse_levels
+from profiler import PROFILER, ProfilerOverlay
+from quality import QualityGovernor, bounded_ladder
+from startup import AssetLoader, LazyGestureController, StartupTimer
+import sprite_atlas
+from settings import (BASE_DIR, SCREEN_WIDTH, SCREEN_HEIGHT, FPS, SIM_RATE, WARRIOR_ANIMATION_STEPS,
+                      WIZARD_ANIMATION_STEPS, WARRIOR_SIZE, WIZARD_SIZE, WARRIOR_DATA, WIZARD_DATA, WARRIOR_SHEET,
+                      WIZARD_SHEET)
+import argparse
 import os
-
-mixer.init()
-pygame.init()
+import random
+import socket
+import time
+
+parser = argparse.ArgumentParser(description="Gesture-controlled fighting game")
+parser.add_argument("--record", metavar="FILE", help="record every tick's input to a replay file")
+parser.add_argument("--replay", metavar="FILE", help="play back a recorded replay instead of live input")
+parser.add_argument("--seed", type=int, default=None, help="random seed (stored in recordings)")
+parser.add_argument("--profile", action="store_true", help="start with the profiler overlay shown (toggle with F3)")
+parser.add_argument("--trace", metavar="FILE", help="write a Chrome trace of the profiled spans on exit (F4 writes one at any time)")
+parser.add_argument("--gesture-players", type=int, choices=(1, 2), default=1,
+                    help="players controlled by gestures from the one camera (player 2 stands still otherwise)")
+parser.add_argument("--gesture-process", action="store_true",
+                    help="run camera capture and hand inference in a separate worker process")
+parser.add_argument("--hand-assignment", choices=("screen_half", "handedness"), default="screen_half",
+                    help="how hands are split between two gesture players")
+parser.add_argument("--ai", choices=["off"] + sorted(DIFFICULTIES), default="normal",
+                    help="CPU opponent for player 2 when nobody else controls it")
+parser.add_argument("--ai-budget", type=float, default=DEFAULT_BUDGET * 1000, metavar="MS",
+                    help="time the CPU opponent may spend per decision")
+parser.add_argument("--net-player", type=int, choices=(1, 2), help="play online as this player against --net-peer")
+parser.add_argument("--net-peer", metavar="HOST:PORT", help="the other player's address")
+parser.add_argument("--net-port", type=int, default=7000, help="local UDP port for online play")
+parser.add_argument("--input-delay", type=int, default=2, help="ticks between reading local input and using it online")
+parser.add_argument("--max-rollback", type=int, default=8, help="ticks to predict the peer's input before waiting for it")
+parser.add_argument("--net-latency", type=float, default=0.0, metavar="MS", help="add simulated one-way latency")
+parser.add_argument("--net-jitter", type=float, default=0.0, metavar="MS", help="add simulated latency jitter")
+parser.add_argument("--net-loss", type=float, default=0.0, metavar="P", help="drop this fraction of outgoing packets")
+parser.add_argument("--hitboxes", action="store_true",
+                    help="land attacks with per-frame hitboxes and hurtboxes from the sprites' alpha (offline play)")
+parser.add_argument("--fixed-quality", action="store_true",
+                    help="keep full quality instead of lowering it when frames or gestures fall behind")
+parser.add_argument("--max-preview-fps", type=float, default=15, help="camera preview rate at full quality (0 hides it)")
+parser.add_argument("--min-inference-scale", type=float, default=0.5,
+                    help="smallest frame scale the quality governor may use for hand detection")
+parser.add_argument("--min-inference-fps", type=float, default=10,
+                    help="fewest hand detections per second the quality governor may drop to")
+parser.add_argument("--latency-target", type=float, default=100, metavar="MS",
+                    help="gesture latency (capture to gesture) the quality governor tries to stay under")
+parser.add_argument("--keep-visuals", action="store_true",
+                    help="never drop to a flat background or turn off motion interpolation")
+parser.add_argument("--log", metavar="FILE", help="append the event log to a file")
+parser.add_argument("--log-level", default="", metavar="SPEC",
+                    help='event log verbosity, e.g. "debug" or "gesture=debug,input=debug"')
+args = parser.parse_args()
+if args.net_player and not args.net_peer:
+  parser.error("--net-player needs --net-peer")
+if args.net_player and (args.record or args.replay or args.gesture_players != 1):
+  parser.error("online play does not support --record, --replay or --gesture-players")
+if args.hitboxes and (args.net_player or args.record or args.replay):
+  #headless playback and the peer may not have the sprites the hitboxes come from
+  parser.error("--hitboxes does not support online play, --record or --replay")
+
+#event log: hot paths only store records, a background thread formats and writes them
+log_default, log_levels = parse_levels(args.log_level)
+LOG.configure(levels=log_levels, default_level=log_default, path=args.log)
+LOG.start()
+
+replay = Replay(args.replay) if args.replay else None
+seed = replay.seed if replay else (args.seed if args.seed is not None else random.randrange(2 ** 32))
+random.seed(seed)
+
+#every startup step is timed; the report is printed once loading has finished
+startup = StartupTimer()
+
+startup.timed("init pygame", lambda: (mixer.init(), pygame.init()))
 
 #create game window
-SCREEN_WIDTH = 1000
-SCREEN_HEIGHT = 600
-
 #set display to be centered on screen
 os.environ['SDL_VIDEO_CENTERED'] = '1'
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+screen = startup.timed("open window", pygame.display.set_mode, (SCREEN_WIDTH, SCREEN_HEIGHT))
 pygame.display.set_caption("Fighting Game")
 
 #set framerate
 clock = pygame.time.Clock()
-FPS = 60
 
 #define colours
 RED = (255, 0, 0)
@@ -30,216 +100,352 @@ WHITE = (255, 255, 255)
 BLUE = (0, 0, 255)
 BLACK = (0, 0, 0)
 
-#define game variables
-intro_count = 3
-last_count_update = pygame.time.get_ticks()
-score = [0, 0]#player scores. [P1, P2]
-round_over = False
-ROUND_OVER_COOLDOWN = 2000
-
-#define fighter variables
-WARRIOR_SIZE = 162
-WARRIOR_SCALE = 4
-WARRIOR_OFFSET = [72, 56]
-WARRIOR_DATA = [WARRIOR_SIZE, WARRIOR_SCALE, WARRIOR_OFFSET]
-WIZARD_SIZE = 250
-WIZARD_SCALE = 3
-WIZARD_OFFSET = [112, 107]
-WIZARD_DATA = [WIZARD_SIZE, WIZARD_SCALE, WIZARD_OFFSET]
-
-# Define base asset path
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))  # Get the directory of the current file
+#stand-ins so the window and countdown show at once; the real assets replace them as they finish loading
+bg_image = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+bg_image.fill((50, 50, 50))  # Dark gray background
+count_font = pygame.font.Font(None, 80)
+score_font = pygame.font.Font(None, 30)
+warrior_sheet = None
+wizard_sheet = None
+sword_fx = None
+magic_fx = None
+victory_img = None
+
+#layered renderer: background is scaled once, HUD glyphs are cached and only dirty areas reach the display
+renderer = LayeredRenderer(screen, bg_image)
+
+# Gesture controls (cv2, MediaPipe and the hand model) load on their own thread; keyboard works meanwhile
+if replay:
+  gesture_controller_1 = None
+else:
+  #one camera and one hand model serve every gesture player
+  gesture_players = tuple(range(1, args.gesture_players + 1))
+  gesture_controller_1 = LazyGestureController(startup, out_of_process=args.gesture_process, players=gesture_players,
+                                               assignment=args.hand_assignment, show_preview=args.max_preview_fps > 0,
+                                               preview_fps=args.max_preview_fps)
 
 # Load music and sounds
-try:
-    pygame.mixer.music.load(os.path.join(BASE_DIR, "assets", "audio", "assets_audio_music.mp3"))
-    pygame.mixer.music.set_volume(0.5)
-    pygame.mixer.music.play(-1, 0.0, 5000)
-except:
-    print("Warning: Could not load music file. Continuing without music.")
-
-try:
-    sword_fx = pygame.mixer.Sound(os.path.join(BASE_DIR, "assets", "audio", "assets_audio_sword.wav"))
-    sword_fx.set_volume(0.5)
-except:
-    print("Warning: Could not load sword sound. Using empty sound.")
-    sword_fx = pygame.mixer.Sound(buffer=bytes([]))
-
-try:
-    magic_fx = pygame.mixer.Sound(os.path.join(BASE_DIR, "assets", "audio", "assets_audio_magic (1).wav"))
-    magic_fx.set_volume(0.75)
-except:
-    print("Warning: Could not load magic sound. Using empty sound.")
-    magic_fx = pygame.mixer.Sound(buffer=bytes([]))
+def load_music():
+    try:
+        pygame.mixer.music.load(os.path.join(BASE_DIR, "assets", "audio", "assets_audio_music.mp3"))
+        pygame.mixer.music.set_volume(0.5)
+        pygame.mixer.music.play(-1, 0.0, 5000)
+    except:
+        print("Warning: Could not load music file. Continuing without music.")
+
+def load_sound(filename, volume, name):
+    try:
+        sound = pygame.mixer.Sound(os.path.join(BASE_DIR, "assets", "audio", filename))
+        sound.set_volume(volume)
+    except:
+        print(f"Warning: Could not load {name} sound. Using empty sound.")
+        sound = pygame.mixer.Sound(buffer=bytes([]))
+    return sound
 
 #load background image
-try:
-    bg_image = pygame.image.load(os.path.join(BASE_DIR, "assets", "images", "background.jpg")).convert_alpha()
-except:
-    print("Warning: Could not load background image. Creating blank background.")
-    bg_image = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
-    bg_image.fill((50, 50, 50))  # Dark gray background
-
-#load spritesheets
-try:
-    warrior_sheet = pygame.image.load(os.path.join(BASE_DIR, "assets", "images", "hero", "warrior.png")).convert_alpha()
-except:
-    print("Warning: Could not load hero spritesheet. Creating placeholder.")
-    # Calculate the required size based on animation steps
-    max_frames = max(WARRIOR_ANIMATION_STEPS)
-    total_rows = len(WARRIOR_ANIMATION_STEPS)
-    warrior_sheet = pygame.Surface((WARRIOR_SIZE * max_frames, WARRIOR_SIZE * total_rows))
-    warrior_sheet.fill(RED)  # Red placeholder for warrior
-
-try:
-    wizard_sheet = pygame.image.load(os.path.join(BASE_DIR, "assets", "images", "evil_wizard", "wizard.png")).convert_alpha()
-except:
-    print("Warning: Could not load wizard spritesheet. Creating placeholder.")
-    # Calculate the required size based on animation steps
-    max_frames = max(WIZARD_ANIMATION_STEPS)
-    total_rows = len(WIZARD_ANIMATION_STEPS)
-    wizard_sheet = pygame.Surface((WIZARD_SIZE * max_frames, WIZARD_SIZE * total_rows))
-    wizard_sheet.fill(BLUE)  # Blue placeholder for wizard
+def load_background():
+    try:
+        return pygame.image.load(os.path.join(BASE_DIR, "assets", "images", "background.jpg")).convert_alpha()
+    except:
+        print("Warning: Could not load background image. Keeping blank background.")
+        return None
+
+#load spritesheets (scaled frames come from the compiled atlas cache, built on first launch)
+def load_sheet(path, data, animation_steps, size, colour, name):
+    try:
+        return sprite_atlas.load_sheet(path, data, animation_steps)
+    except:
+        print(f"Warning: Could not load {name} spritesheet. Creating placeholder.")
+        # Calculate the required size based on animation steps
+        max_frames = max(animation_steps)
+        total_rows = len(animation_steps)
+        sheet = pygame.Surface((size * max_frames, size * total_rows))
+        sheet.fill(colour)
+        return sheet
+
+#with --hitboxes the tables are built here on the loader thread too; use_sheet then finds them in the table bank
+def load_sheet_and_hitboxes(path, data, animation_steps, size, colour, name):
+    sheet = load_sheet(path, data, animation_steps, size, colour, name)
+    if args.hitboxes:
+        hitbox_table(Fighter(1, 0, 0, False, data, sheet, animation_steps, None))
+    return sheet
 
 #load vicory image
-try:
-    victory_img = pygame.image.load(os.path.join(BASE_DIR, "assets", "images", "victory.png")).convert_alpha()
-except:
-    print("Warning: Could not load victory image. Creating placeholder.")
-    victory_img = pygame.Surface((200, 100))
-    victory_img.fill(YELLOW)  # Yellow placeholder
+def load_victory():
+    try:
+        return pygame.image.load(os.path.join(BASE_DIR, "assets", "images", "victory.png")).convert_alpha()
+    except:
+        print("Warning: Could not load victory image. Creating placeholder.")
+        img = pygame.Surface((200, 100))
+        img.fill(YELLOW)  # Yellow placeholder
+        return img
 
 #define font
-try:
-    count_font = pygame.font.Font(os.path.join(BASE_DIR, "assets", "fonts", "turok.ttf"), 80)
-    score_font = pygame.font.Font(os.path.join(BASE_DIR, "assets", "fonts", "turok.ttf"), 30)
-except:
-    print("Warning: Could not load custom font. Using system font.")
-    count_font = pygame.font.SysFont(None, 80)
-    score_font = pygame.font.SysFont(None, 30)
-
-#function for drawing text
-def draw_text(text, font, text_col, x, y):
-    img = font.render(text, True, text_col)
-    text_rect = img.get_rect(center=(x, y))
-    screen.blit(img, text_rect)
-
-#function for drawing background
-def draw_bg():
-    scaled_bg = pygame.transform.scale(bg_image, (SCREEN_WIDTH, SCREEN_HEIGHT))
-    screen.blit(scaled_bg, (0, 0))
-
-#function for drawing fighter health bars
-def draw_health_bar(health, x, y):
-    ratio = health / 100
-    pygame.draw.rect(screen, WHITE, (x - 2, y - 2, 404, 34))
-    pygame.draw.rect(screen, RED, (x, y, 400, 30))
-    pygame.draw.rect(screen, YELLOW, (x, y, 400 * ratio, 30))
-
+def load_fonts():
+    try:
+        return (pygame.font.Font(os.path.join(BASE_DIR, "assets", "fonts", "turok.ttf"), 80),
+                pygame.font.Font(os.path.join(BASE_DIR, "assets", "fonts", "turok.ttf"), 30))
+    except:
+        print("Warning: Could not load custom font. Using system font.")
+        return pygame.font.SysFont(None, 80), pygame.font.SysFont(None, 30)
+
+#results are applied on the main thread between frames; fighters already on screen get their sprites and sounds
+def use_background(image):
+    global bg_image
+    if image is not None:
+        bg_image = image
+        renderer.set_background(image)
+
+def use_sheet(player, sheet):
+    global warrior_sheet, wizard_sheet
+    if player == 1:
+        warrior_sheet = sheet
+        match.fighter_1.set_sprites(sheet, WARRIOR_ANIMATION_STEPS)
+    else:
+        wizard_sheet = sheet
+        match.fighter_2.set_sprites(sheet, WIZARD_ANIMATION_STEPS)
+    if args.hitboxes:
+        fighter = match.fighter_1 if player == 1 else match.fighter_2
+        fighter.hitboxes = hitbox_table(fighter)
+
+def use_sound(player, sound):
+    global sword_fx, magic_fx
+    if player == 1:
+        sword_fx = sound
+        match.fighter_1.attack_sound = sound
+    else:
+        magic_fx = sound
+        match.fighter_2.attack_sound = sound
+
+def use_victory(img):
+    global victory_img
+    victory_img = img
+
+def use_fonts(fonts):
+    global count_font, score_font
+    count_font, score_font = fonts
+
+assets = AssetLoader(startup)
+assets.submit("warrior sheet", lambda: load_sheet_and_hitboxes(WARRIOR_SHEET, WARRIOR_DATA, WARRIOR_ANIMATION_STEPS, WARRIOR_SIZE, RED, "hero"),
+              lambda sheet: use_sheet(1, sheet))
+assets.submit("wizard sheet", lambda: load_sheet_and_hitboxes(WIZARD_SHEET, WIZARD_DATA, WIZARD_ANIMATION_STEPS, WIZARD_SIZE, BLUE, "wizard"),
+              lambda sheet: use_sheet(2, sheet))
+assets.submit("background", load_background, use_background)
+assets.submit("fonts", load_fonts, use_fonts)
+assets.submit("music", load_music, lambda _: None)
+assets.submit("sword sound", lambda: load_sound("assets_audio_sword.wav", 0.5, "sword"), lambda sound: use_sound(1, sound))
+assets.submit("magic sound", lambda: load_sound("assets_audio_magic (1).wav", 0.75, "magic"), lambda sound: use_sound(2, sound))
+assets.submit("victory image", load_victory, use_victory)
 
 #create two instances of fighters
-fighter_1 = Fighter(1, 200, 310, False, WARRIOR_DATA, warrior_sheet, WARRIOR_ANIMATION_STEPS, sword_fx)
-fighter_2 = Fighter(2, 700, 310, True, WIZARD_DATA, wizard_sheet, WIZARD_ANIMATION_STEPS, magic_fx)
-
-# Create gesture controller only for player 1
-from gesture_controls import GestureController
-gesture_controller_1 = GestureController(player_num=1)
+def make_fighters():
+  fighter_1 = Fighter(1, 200, 310, False, WARRIOR_DATA, warrior_sheet, WARRIOR_ANIMATION_STEPS, sword_fx)
+  fighter_2 = Fighter(2, 700, 310, True, WIZARD_DATA, wizard_sheet, WIZARD_ANIMATION_STEPS, magic_fx)
+  if args.hitboxes:
+    #None (rect attacks) until the sheets have loaded, and for placeholder sheets without alpha
+    fighter_1.hitboxes = hitbox_table(fighter_1)
+    fighter_2.hitboxes = hitbox_table(fighter_2)
+  return fighter_1, fighter_2
+
+if replay:
+  match = replay.make_match(make_fighters)
+  match.profiler = PROFILER
+  replay_masks_1, replay_masks_2 = replay.masks()
+else:
+  match = Match(make_fighters, profiler=PROFILER)
+
+#online play: only this player's input is read, the peer's arrives over UDP
+netplay = None
+if args.net_player:
+  peer_host, _, peer_port = args.net_peer.rpartition(":")
+  transport = UdpTransport(("", args.net_port), (socket.gethostbyname(peer_host or "127.0.0.1"), int(peer_port)))
+  if args.net_latency or args.net_jitter or args.net_loss:
+    transport = LinkSimulator(transport, args.net_latency / 1000, args.net_jitter / 1000, args.net_loss, seed)
+  netplay = RollbackSession(match, args.net_player, transport, args.input_delay, args.max_rollback, profiler=PROFILER)
+  print(f"Playing online as player {args.net_player} on port {args.net_port} against {args.net_peer}")
+
+#CPU opponent for player 2 when it is not played by a second gesture player or over the network
+cpu = None
+if not replay and not netplay and args.gesture_players == 1 and args.ai != "off":
+  cpu = CpuOpponent(2, args.ai, args.ai_budget / 1000, seed=seed, profiler=PROFILER)
+
+recorder = None
+if args.record:
+  recorder = ReplayRecorder(args.record, seed, match.intro_start, match.round_over_limit,
+                            match.screen_width, match.screen_height)
+  print(f"Recording input to {args.record} (seed {seed})")
+
+#read one player's input for one simulation tick
+def read_input(player=1):
+  # Get gesture-based key states and merge them with keyboard input
+  with PROFILER.section("gesture.poll"):
+    gesture_keys = gesture_controller_1.get_current_keys(player)
+
+  # Create a dictionary for key states
+  key_state = {}
+  real_keys = pygame.key.get_pressed()
+
+  # Add keyboard keys to the dictionary (pygame 2 maps key codes beyond the scancode range, e.g. arrows)
+  for key_code in PLAYER_KEYS[player]:
+    key_state[key_code] = real_keys[key_code]
+
+  # Add gesture keys to the dictionary
+  for key in gesture_keys:
+    key_state[key] = True
+    INPUT.debug("Player %d gesture key: %s", player, key)
+  return key_state
+
+#quality governor: lowers preview, gesture and background quality when frames run long, raises it with headroom
+interpolate = True
+def apply_quality(quality):
+  global interpolate
+  interpolate = quality.interpolate
+  renderer.set_flat_background(quality.background == "flat")
+  if gesture_controller_1:
+    gesture_controller_1.set_quality(preview_fps=quality.preview_fps, inference_scale=quality.inference_scale,
+                                     inference_fps=quality.inference_fps)
+
+governor = None
+if not args.fixed_quality:
+  quality_levels = bounded_ladder(max_preview_fps=args.max_preview_fps, min_inference_scale=args.min_inference_scale,
+                                  min_inference_fps=args.min_inference_fps, allow_low_visuals=not args.keep_visuals)
+  governor = QualityGovernor(apply_quality, FPS, args.latency_target / 1000, quality_levels)
+last_gesture_time = None#inference time of the last gesture sample the governor saw
+
+#latency of the newest gesture sample if it arrived since the last call, so each sample counts once
+def new_gesture_latency():
+  global last_gesture_time
+  sample = gesture_controller_1.latest_sample() if gesture_controller_1 else None
+  if sample is None or sample.inference_time == last_gesture_time:
+    return None
+  last_gesture_time = sample.inference_time
+  return sample.inference_time - sample.capture_time
+
+#draw one frame, alpha is how far the render time is between the last two simulation ticks
+def render(alpha):
+  draw_match(renderer, match, count_font, score_font, victory_img, alpha)
+
+  #profiler table on top of everything
+  profiler_overlay.draw(renderer)
+
+  #update display (dirty rectangles only)
+  with PROFILER.section("present"):
+    renderer.present()
+
+#profiler overlay (F3) and trace export (F4)
+try:
+  overlay_font = pygame.font.SysFont("dejavusansmono,couriernew,monospace", 14)
+except:
+  overlay_font = pygame.font.Font(None, 18)
+profiler_overlay = ProfilerOverlay(PROFILER, overlay_font)
+if args.profile or args.trace:
+  profiler_overlay.toggle()
 
-# Start the gesture controller
-gesture_controller_1.start()
+def export_trace(path):
+  count = PROFILER.export_chrome_trace(path)
+  print(f"Wrote {count} trace events to {path}")
 
 #game loop
 run = True
 print("Starting game loop...")
+SIM_STEP = 1000 / SIM_RATE#milliseconds per simulation tick
+MAX_FRAME_TIME = 250#clamp long stalls so the simulation does not spiral trying to catch up
+accumulator = 0
+loading = True
+first_frame = True
 
 while run:
-  clock.tick(FPS)
-
-  #draw background
-  draw_bg()
-
-  #show player stats
-  draw_health_bar(fighter_1.health, 20, 20)
-  draw_health_bar(fighter_2.health, 580, 20)
-  draw_text("P1: " + str(score[0]), score_font, RED, 20, 60)
-  draw_text("P2: " + str(score[1]), score_font, RED, 580, 60)
-
-  #update countdown
-  if intro_count <= 0:
-    # Get gesture-based key states and merge them with keyboard input
-    gesture_keys_1 = gesture_controller_1.get_current_keys()
-    
-    # Create a dictionary for key states
-    key_state = {}
-    real_keys = pygame.key.get_pressed()
-    
-    # Add keyboard keys to the dictionary
-    for key_code in [pygame.K_a, pygame.K_d, pygame.K_w, pygame.K_r, pygame.K_t]:
-        key_state[key_code] = real_keys[key_code] if key_code < len(real_keys) else False
-    
-    # Add gesture keys to the dictionary
-    for key in gesture_keys_1:
-        key_state[key] = True
-        print(f"Active gesture key: {key}")
-
-    #move fighters
-    fighter_1.move(SCREEN_WIDTH, SCREEN_HEIGHT, screen, fighter_2, round_over, key_state)
-    
-    # AI movement for fighter 2 (make it stand still)
-    fighter_2.move(SCREEN_WIDTH, SCREEN_HEIGHT, screen, fighter_1, round_over, {})
-  else:
-    #display count timer
-    draw_text(str(intro_count), count_font, RED, SCREEN_WIDTH / 2, SCREEN_HEIGHT / 3)
-    #update count timer
-    if (pygame.time.get_ticks() - last_count_update) >= 1000:
-      intro_count -= 1
-      last_count_update = pygame.time.get_ticks()
-      print(f"Countdown: {intro_count}")
-
-  #update fighters
-  fighter_1.update()
-  fighter_2.update()
-
-  #draw fighters
-  fighter_1.draw(screen)
-  fighter_2.draw(screen)
-
-  #check for player defeat
-  if round_over == False:
-    if fighter_1.alive == False:
-      score[1] += 1
-      round_over = True
-      round_over_time = pygame.time.get_ticks()
-      print("Player 2 wins!")
-    elif fighter_2.alive == False:
-      score[0] += 1
-      round_over = True
-      round_over_time = pygame.time.get_ticks()
-      print("Player 1 wins!")
-  else:
-    #display victory image
-    screen.blit(victory_img, (360, 150))
-    if pygame.time.get_ticks() - round_over_time > ROUND_OVER_COOLDOWN:
-      round_over = False
-      intro_count = 3
-      print("Starting new round...")
-      fighter_1 = Fighter(1, 200, 310, False, WARRIOR_DATA, warrior_sheet, WARRIOR_ANIMATION_STEPS, sword_fx)
-      fighter_2 = Fighter(2, 700, 310, True, WIZARD_DATA, wizard_sheet, WIZARD_ANIMATION_STEPS, magic_fx)
+  frame_start = time.perf_counter()
+  accumulator += min(clock.tick(FPS), MAX_FRAME_TIME)
+  work_start = time.perf_counter()#frame time without the frame-rate wait, for the quality governor
 
   #event handler
   for event in pygame.event.get():
     if event.type == pygame.QUIT:
-      print("Game closing...")
-      # Clean up gesture controller before quitting
-      gesture_controller_1.stop()
+      GAME.info("Game closing...")
       run = False
-
-  #update display
-  pygame.display.update()
+    elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+      profiler_overlay.toggle()
+    elif event.type == pygame.KEYDOWN and event.key == pygame.K_F4:
+      export_trace(args.trace or time.strftime("trace-%Y%m%d-%H%M%S.json"))
+
+  #run as many fixed simulation ticks as the elapsed time covers
+  while accumulator >= SIM_STEP:
+    tick = match.tick
+    if netplay:
+      #the local player uses player 1's keys and gestures whichever fighter they control
+      events = netplay.advance(keys_to_mask(1, read_input(1)) if match.intro_count <= 0 else 0)
+      if events is None:
+        #too far ahead of the peer: wait for its inputs instead of predicting further
+        accumulator = 0
+        break
+    else:
+      if replay:
+        if tick >= replay.ticks:
+          GAME.info("Replay finished.")
+          run = False
+          break
+        mask_1 = replay_masks_1[tick]
+        mask_2 = replay_masks_2[tick]
+      else:
+        fighting = match.intro_count <= 0
+        mask_1 = keys_to_mask(1, read_input(1)) if fighting else 0
+        if args.gesture_players == 2:
+          mask_2 = keys_to_mask(2, read_input(2)) if fighting else 0
+        elif cpu:
+          mask_2 = cpu.decide(match, mask_1)
+        else:
+          #no opponent: fighter 2 stands still
+          mask_2 = 0
+      if recorder:
+        recorder.record(tick, mask_1, mask_2)
+      events = match.step(mask_to_keys(1, mask_1), mask_to_keys(2, mask_2))
+    for event in events:
+      if event == "countdown":
+        GAME.info("Countdown: %d", match.intro_count)
+      elif event == "p1_wins":
+        GAME.info("Player 1 wins!")
+        if recorder:
+          recorder.round_over(tick, 1)
+      elif event == "p2_wins":
+        GAME.info("Player 2 wins!")
+        if recorder:
+          recorder.round_over(tick, 2)
+      elif event == "new_round":
+        GAME.info("Starting new round...")
+    accumulator -= SIM_STEP
+
+  #without interpolation fighters are drawn where the latest tick left them
+  render(accumulator / SIM_STEP if interpolate else 1.0)
+  frame_end = time.perf_counter()
+  PROFILER.record("frame", frame_start, frame_end)
+  if governor:
+    governor.frame(frame_end - work_start, new_gesture_latency())
+  if first_frame:
+    startup.mark("first frame")
+    first_frame = False
+
+  #hand finished assets to the game, report startup once the gesture controller has settled too
+  if loading and assets.poll() and (gesture_controller_1 is None or gesture_controller_1.done):
+    loading = False
+    print(startup.report())
 
 print("Game ended.")
+if args.trace:
+  export_trace(args.trace)
+if recorder:
+  recorder.close(match)
+if cpu:
+  print(cpu.stats.summary(cpu.budget))
+if governor:
+  print(governor.summary())
+if netplay:
+  print(netplay.stats.summary(netplay.input_delay, netplay.max_rollback))
+  netplay.close()
 # Clean up gesture controller
-gesture_controller_1.stop()
+if gesture_controller_1:
+  gesture_controller_1.stop()
+LOG.stop()
 
 #exit pygame
-pygame.quit()
\ No newline at end of file
+pygame.quit()
@@ -0,0 +1,403 @@
+"""Two-player online matches over UDP with rollback and input delay.
+
+Usage: python netplay.py [--seconds S] [--latency MS] [--jitter MS] [--loss P] [--delay N]
+(a loopback test: two peers on 127.0.0.1 with a simulated link, checked against an offline run)
+
+Each peer runs the full match and sends only its own per-tick input masks.
+A local input is scheduled ``input_delay`` ticks ahead, which gives it that
+long to reach the other peer. When the remote input for a tick has not
+arrived yet it is predicted (the last one received is repeated). Once it
+arrives and differs from the prediction, the match is restored from the
+snapshot taken before that tick and the ticks since are simulated again.
+A peer that would have to predict more than ``max_rollback`` ticks stalls
+until the remote inputs catch up.
+
+Packets are a header followed by one byte per input mask:
+  header = magic | player | first tick | ack | check tick | checksum | count
+Every packet repeats all inputs the peer has not acknowledged yet, so a lost
+packet is covered by the next one. The checksum is of the state after a fully
+confirmed tick (every CHECK_INTERVAL ticks), so the peers can detect a desync.
+"""
+import argparse
+import heapq
+import math
+import random
+import socket
+import struct
+import time
+import zlib
+from collections import deque
+
+import numpy as np
+
+from engine import MASK_KEYS, Match, random_script
+from eventlog import GAME
+from settings import SIM_RATE
+
+MAGIC = b"GN"
+PACKET = struct.Struct("<2sBIiiHB")
+MAX_INPUTS_PER_PACKET = 255
+CHECK_INTERVAL = 30#ticks between desync checks
+RESIM_BUDGET = 0.004#seconds per frame the suggested input delay leaves for resimulation
+
+
+def snapshot_checksum(state):
+  #16-bit digest of a Match.snapshot(), as in replay.state_checksum
+  return zlib.crc32(repr(state).encode()) & 0xFFFF
+
+
+class UdpTransport():
+  #non-blocking datagram socket talking to one peer
+  def __init__(self, local_address, remote_address):
+    self.remote_address = remote_address
+    self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    self.sock.bind(local_address)
+    self.sock.setblocking(False)
+    self.errors = 0
+
+  def send(self, data):
+    try:
+      self.sock.sendto(data, self.remote_address)
+    except OSError:
+      #the peer is not up yet or the network hiccupped; later packets repeat the same inputs
+      self.errors += 1
+
+  def receive(self):
+    packets = []
+    while True:
+      try:
+        data, _ = self.sock.recvfrom(2048)
+      except BlockingIOError:
+        break
+      except OSError:
+        self.errors += 1
+        break
+      packets.append(data)
+    return packets
+
+  def close(self):
+    self.sock.close()
+
+
+class LinkSimulator():
+  #wraps a transport and delays, jitters and drops outgoing packets, for testing on one machine
+  def __init__(self, transport, latency=0.0, jitter=0.0, loss=0.0, seed=0, clock=time.perf_counter):
+    self.transport = transport
+    self.latency = latency#one-way, in seconds
+    self.jitter = jitter
+    self.loss = loss
+    self.rng = random.Random(seed)
+    self.clock = clock
+    self.queue = []#(release time, sequence, data)
+    self.sequence = 0
+    self.lost = 0
+
+  def send(self, data):
+    self._release()
+    if self.rng.random() < self.loss:
+      self.lost += 1
+      return
+    delay = max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter))
+    heapq.heappush(self.queue, (self.clock() + delay, self.sequence, data))
+    self.sequence += 1
+    self._release()
+
+  def receive(self):
+    self._release()
+    return self.transport.receive()
+
+  def _release(self):
+    now = self.clock()
+    while self.queue and self.queue[0][0] <= now:
+      self.transport.send(heapq.heappop(self.queue)[2])
+
+  def close(self):
+    self.transport.close()
+
+
+class RollbackStats():
+  #per-session counters plus rolling windows of rollback depth, resimulation time and round trip time
+  def __init__(self, window=600):
+    self.frames = 0
+    self.stalls = 0
+    self.rollbacks = 0
+    self.resimulated_ticks = 0
+    self.resim_time = 0.0
+    self.mispredictions = 0
+    self.desyncs = 0
+    self.packets_sent = 0
+    self.packets_received = 0
+    self.max_depth = 0
+    self.depths = deque(maxlen=window)#ticks resimulated per rollback
+    self.frame_resim = deque(maxlen=window)#seconds spent resimulating per advanced frame
+    self.rtt = deque(maxlen=window)
+
+  def suggested_delay(self, max_rollback, budget=RESIM_BUDGET):
+    #input delay that leaves at most `budget` seconds of resimulation per frame at the measured p95 round trip
+    if not self.rtt:
+      return None
+    one_way = math.ceil(np.percentile(np.fromiter(self.rtt, dtype=np.float64), 95) / 2 * SIM_RATE)
+    per_tick = self.resim_time / self.resimulated_ticks if self.resimulated_ticks else 0.0
+    affordable = min(max_rollback, int(budget / per_tick)) if per_tick > 0 else max_rollback
+    return max(0, one_way - affordable)
+
+  def summary(self, input_delay, max_rollback):
+    lines = [f"frames: {self.frames}  stalled: {self.stalls}  packets sent/received: "
+             f"{self.packets_sent}/{self.packets_received}  desyncs: {self.desyncs}"]
+    lines.append(f"rollbacks: {self.rollbacks} ({self.rollbacks / max(self.frames, 1):.1%} of frames)  "
+                 f"mispredicted ticks: {self.mispredictions}")
+    if self.depths:
+      depths = np.fromiter(self.depths, dtype=np.float64)
+      lines.append(f"rollback depth: mean {depths.mean():.1f}  p95 {np.percentile(depths, 95):.0f}  "
+                   f"max {self.max_depth} ticks")
+    if self.frame_resim:
+      resim = np.fromiter(self.frame_resim, dtype=np.float64) * 1000
+      per_tick = self.resim_time / self.resimulated_ticks * 1e6 if self.resimulated_ticks else 0.0
+      lines.append(f"resimulation per frame: p50 {np.percentile(resim, 50):.3f}  p95 {np.percentile(resim, 95):.3f}  "
+                   f"max {resim.max():.3f} ms  ({per_tick:.1f} us per tick)")
+    if self.rtt:
+      rtt = np.fromiter(self.rtt, dtype=np.float64) * 1000
+      lines.append(f"round trip: p50 {np.percentile(rtt, 50):.0f}  p95 {np.percentile(rtt, 95):.0f} ms  "
+                   f"input delay: {input_delay}  suggested: {self.suggested_delay(max_rollback)}")
+    return "\n".join(lines)
+
+
+class RollbackSession():
+  #drives one peer's Match: call advance() once per simulation tick with the local player's input mask
+  def __init__(self, match, local_player, transport, input_delay=2, max_rollback=8, clock=time.perf_counter,
+               profiler=None):
+    self.match = match
+    self.local_player = local_player
+    self.remote_player = 3 - local_player
+    self.transport = transport
+    self.input_delay = input_delay
+    self.max_rollback = max_rollback
+    self.clock = clock#drives round trip times; the loopback test passes a simulated clock
+    self.profiler = profiler
+    self.stats = RollbackStats()
+    #the first input_delay ticks have no local input: they are idle for this peer
+    self.local_inputs = {tick: 0 for tick in range(input_delay)}
+    self.local_frame = input_delay - 1#newest tick with a local input
+    self.remote_inputs = {}
+    self.remote_frame = -1#newest tick up to which every remote input has arrived
+    self.last_remote_mask = 0#what unknown remote inputs are predicted to be
+    self.predicted = {}#tick -> remote mask the simulation guessed
+    self.snapshots = {}#tick -> match state before that tick, kept until the tick is confirmed
+    self.rollback_from = None
+    self.confirmed = -1#newest tick simulated with both players' real inputs
+    self.peer_ack = -1#newest local tick the peer has received
+    self.sent_at = {}#tick -> clock when its local input was first sent
+    self.check = (-1, 0)#(tick, checksum) of the newest confirmed state checked
+    self.local_checks = {}
+    self.remote_checks = {}
+    self.verified = -1
+
+  def advance(self, local_mask):
+    #simulate one tick; returns its events, or None if the peer is too far behind and this tick has to wait
+    self.poll()
+    tick = self.match.tick
+    if tick - self.remote_frame > self.max_rollback:
+      self.stats.stalls += 1
+      self._send()
+      return None
+    self.local_frame = tick + self.input_delay
+    self.local_inputs[self.local_frame] = local_mask
+    self.sent_at[self.local_frame] = self.clock()
+    self._send()
+    events = self._step(tick)
+    self.stats.frames += 1
+    self._confirm()
+    return events
+
+  def idle(self):
+    #exchange inputs and apply rollbacks without advancing, e.g. while waiting for the peer at the end of a match
+    self.poll()
+    self._send()
+    self._confirm()
+
+  def poll(self):
+    #read every packet that has arrived and resimulate from the first mispredicted tick
+    for data in self.transport.receive():
+      self._receive(data)
+    resim = 0.0
+    if self.rollback_from is not None:
+      resim = self._rollback()
+    self.stats.frame_resim.append(resim)
+
+  def _step(self, tick):
+    self.snapshots[tick] = self.match.snapshot()
+    local = self.local_inputs[tick]
+    remote = self.remote_inputs.get(tick)
+    if remote is None:
+      remote = self.predicted[tick] = self.last_remote_mask
+    if self.local_player == 1:
+      return self.match.step(MASK_KEYS[1][local], MASK_KEYS[2][remote])
+    return self.match.step(MASK_KEYS[1][remote], MASK_KEYS[2][local])
+
+  def _rollback(self):
+    start = time.perf_counter()
+    match = self.match
+    first = self.rollback_from
+    end = match.tick
+    self.rollback_from = None
+    #resimulated attacks already played their sound the first time round
+    sounds = (match.fighter_1.attack_sound, match.fighter_2.attack_sound)
+    match.fighter_1.attack_sound = match.fighter_2.attack_sound = None
+    try:
+      match.restore(self.snapshots[first])
+      for tick in range(first, end):
+        self._step(tick)
+    finally:
+      match.fighter_1.attack_sound, match.fighter_2.attack_sound = sounds
+    elapsed = time.perf_counter() - start
+    stats = self.stats
+    stats.rollbacks += 1
+    stats.resimulated_ticks += end - first
+    stats.resim_time += elapsed
+    stats.depths.append(end - first)
+    stats.max_depth = max(stats.max_depth, end - first)
+    if self.profiler is not None:
+      self.profiler.record("netplay.rollback", start, start + elapsed)
+    return elapsed
+
+  def _send(self):
+    first = self.peer_ack + 1
+    count = min(self.local_frame - first + 1, MAX_INPUTS_PER_PACKET)
+    masks = bytes(self.local_inputs[tick] for tick in range(first, first + count))
+    self.transport.send(PACKET.pack(MAGIC, self.local_player, first, self.remote_frame, self.check[0], self.check[1],
+                                    count) + masks)
+    self.stats.packets_sent += 1
+
+  def _receive(self, data):
+    if len(data) < PACKET.size:
+      return
+    magic, player, first, ack, check_tick, checksum, count = PACKET.unpack_from(data)
+    if magic != MAGIC or player != self.remote_player:
+      return
+    self.stats.packets_received += 1
+    if ack > self.peer_ack:
+      sent = self.sent_at.get(ack)
+      if sent is not None:
+        self.stats.rtt.append(self.clock() - sent)
+      for tick in range(self.peer_ack + 1, ack + 1):
+        self.sent_at.pop(tick, None)
+      self.peer_ack = ack
+    masks = data[PACKET.size:PACKET.size + count]
+    #inputs are only taken in order: anything past a gap comes again in a later packet
+    for tick in range(max(first, self.remote_frame + 1), first + len(masks)):
+      if tick != self.remote_frame + 1:
+        break
+      mask = masks[tick - first]
+      self.remote_inputs[tick] = mask
+      self.remote_frame = tick
+      self.last_remote_mask = mask
+      guess = self.predicted.pop(tick, None)
+      if guess is not None and guess != mask:
+        self.stats.mispredictions += 1
+        if self.rollback_from is None or tick < self.rollback_from:
+          self.rollback_from = tick
+    if check_tick > self.verified:
+      self.remote_checks[check_tick] = checksum
+      self._verify()
+
+  def _confirm(self):
+    #ticks up to `confirmed` can no longer roll back: checksum them and drop their snapshots and inputs
+    match = self.match
+    confirmed = min(self.remote_frame, match.tick - 1)
+    for tick in range(self.confirmed + 1, confirmed + 1):
+      if (tick + 1) % CHECK_INTERVAL == 0:
+        state = self.snapshots[tick + 1] if tick + 1 < match.tick else match.snapshot()
+        self.check = (tick, snapshot_checksum(state))
+        self.local_checks[tick] = self.check[1]
+      self.snapshots.pop(tick, None)
+      self.remote_inputs.pop(tick, None)
+    self.confirmed = max(self.confirmed, confirmed)
+    for tick in [tick for tick in self.local_inputs if tick <= min(self.confirmed, self.peer_ack)]:
+      del self.local_inputs[tick]
+    self._verify()
+
+  def _verify(self):
+    for tick in sorted(set(self.local_checks) & set(self.remote_checks)):
+      if self.local_checks.pop(tick) != self.remote_checks.pop(tick):
+        self.stats.desyncs += 1
+        GAME.warning("Desync at tick %d: the peers' states differ", tick)
+      self.verified = max(self.verified, tick)
+    for checks in (self.local_checks, self.remote_checks):
+      for tick in [tick for tick in checks if tick <= self.verified]:
+        del checks[tick]
+
+  def close(self):
+    self.transport.close()
+
+
+def scripted_mask(script, input_delay, tick):
+  #the mask a peer feeding `script` into advance() ends up using on `tick`
+  return script[tick - input_delay] if input_delay <= tick < len(script) + input_delay else 0
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Loopback test of rollback netplay over a simulated link")
+  parser.add_argument("--seconds", type=float, default=60.0, help="match length per peer")
+  parser.add_argument("--latency", type=float, default=60.0, help="one-way latency in ms")
+  parser.add_argument("--jitter", type=float, default=10.0, help="latency jitter in ms (uniform +-)")
+  parser.add_argument("--loss", type=float, default=0.05, help="fraction of packets dropped")
+  parser.add_argument("--delay", type=int, default=2, help="input delay in ticks")
+  parser.add_argument("--max-rollback", type=int, default=8, help="ticks a peer may predict before it stalls")
+  parser.add_argument("--seed", type=int, default=0)
+  args = parser.parse_args()
+
+  ticks = int(args.seconds * SIM_RATE)
+  scripts = {1: random_script(args.seed, ticks), 2: random_script(args.seed + 1, ticks)}
+  #both peers run on one simulated clock: one simulation step per loop, no waiting
+  now = [0.0]
+  clock = lambda: now[0]
+  socks = [UdpTransport(("127.0.0.1", 0), None) for _ in range(2)]
+  socks[0].remote_address = socks[1].sock.getsockname()
+  socks[1].remote_address = socks[0].sock.getsockname()
+  links = [LinkSimulator(sock, args.latency / 1000, args.jitter / 1000, args.loss, args.seed + i, clock)
+           for i, sock in enumerate(socks)]
+  peers = {player: RollbackSession(Match(), player, links[player - 1], args.delay, args.max_rollback, clock)
+           for player in (1, 2)}
+
+  start = time.perf_counter()
+  steps = 0
+  while any(peer.match.tick < ticks for peer in peers.values()) and steps < 100 * ticks:
+    for player, peer in peers.items():
+      if peer.match.tick < ticks:
+        peer.advance(scripts[player][peer.match.tick])
+      else:
+        peer.idle()
+    now[0] += 1 / SIM_RATE
+    steps += 1
+  #let the last inputs arrive so both peers end on a fully confirmed state
+  for _ in range(100 * SIM_RATE):
+    if all(peer.confirmed >= ticks - 1 for peer in peers.values()):
+      break
+    for peer in peers.values():
+      peer.idle()
+    now[0] += 1 / SIM_RATE
+  elapsed = time.perf_counter() - start
+
+  reference = Match()
+  for tick in range(ticks):
+    reference.step(MASK_KEYS[1][scripted_mask(scripts[1], args.delay, tick)],
+                   MASK_KEYS[2][scripted_mask(scripts[2], args.delay, tick)])
+  expected = reference.snapshot()
+
+  print(f"{ticks} ticks per peer, {args.latency:.0f}+-{args.jitter:.0f} ms one-way, {args.loss:.0%} loss, "
+        f"input delay {args.delay}, max rollback {args.max_rollback}  ({elapsed:.2f} s, {steps} steps)")
+  ok = True
+  for player, peer in peers.items():
+    print(f"\npeer {player} (lost {links[player - 1].lost} packets on its uplink)")
+    print(peer.stats.summary(args.delay, args.max_rollback))
+    if peer.match.snapshot() != expected:
+      print(f"peer {player}: final state differs from the offline run")
+      ok = False
+    peer.close()
+  if not ok:
+    raise SystemExit(1)
+  print(f"\nboth peers match the offline run, score {reference.score[0]}-{reference.score[1]}")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,515 @@
+"""Regression benchmarks for the game and gesture hot paths.
+
+Usage: python perf_bench.py [--save] [--threshold T] [--filter TEXT] [--baseline FILE] [--repeat N]
+
+Runs headless (SDL dummy video and audio drivers) and times:
+  - loading both sheets from their compiled atlas (frames not yet banked), and Fighter.load_images once banked
+  - Fighter.move / update / draw in every action state
+  - the single-rect attack check against per-frame hitbox collision, and building the hitbox tables
+  - draw_bg, draw_health_bar and draw_text on the layered renderer
+  - full frames of the game loop (simulation tick, draw_match, present) on an off-screen surface
+  - gesture feature extraction, classification and filtering over synthetic landmark sets
+Each benchmark is timed in batches of at least 20 ms; the median batch over
+--repeat runs gives the time per call. Results are compared with the JSON
+baseline for this machine (bench_baselines/<machine>.json) and the run fails
+when any benchmark is slower than baseline by more than --threshold.
+--save writes the current results as the new baseline. Sprite sheets that
+are not on disk are replaced by generated sheets of the same size. Either way
+the frames come through sprite_atlas.load_sheet, as in the game, with the
+atlases compiled into a temporary directory.
+"""
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse
+import json
+import platform
+import re
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pygame
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baselines")
+DEFAULT_THRESHOLD = 0.25
+MIN_BATCH_TIME = 0.02
+ACTIONS = ["idle", "run", "jump", "attack1", "attack2", "hit", "death"]
+
+#name -> setup function returning the zero-argument callable to time
+BENCHMARKS = {}
+
+
+def benchmark(name):
+  def register(setup):
+    BENCHMARKS[name] = setup
+    return setup
+  return register
+
+
+def machine_id():
+  #baselines are only comparable on the same host, CPU architecture and Python version
+  name = f"{platform.node()}-{platform.machine()}-py{sys.version_info[0]}{sys.version_info[1]}"
+  return re.sub(r"[^A-Za-z0-9_.-]", "_", name)
+
+
+def time_call(fn, repeat):
+  #(median, min) seconds per call over `repeat` batches of at least MIN_BATCH_TIME each
+  fn()#warm caches and lazy imports
+  number = 1
+  while True:
+    start = time.perf_counter()
+    for _ in range(number):
+      fn()
+    elapsed = time.perf_counter() - start
+    if elapsed >= MIN_BATCH_TIME:
+      break
+    number *= 2 if elapsed <= 0 else max(2, int(MIN_BATCH_TIME / elapsed * 1.2))
+  samples = [elapsed / number]
+  for _ in range(repeat - 1):
+    start = time.perf_counter()
+    for _ in range(number):
+      fn()
+    samples.append((time.perf_counter() - start) / number)
+  return float(np.median(samples)), float(min(samples))
+
+
+#shared fixtures, built on first use
+_fixtures = {}
+
+
+def fixtures():
+  if _fixtures:
+    return _fixtures
+  from renderer import LayeredRenderer
+  from settings import (SCREEN_HEIGHT, SCREEN_WIDTH, WARRIOR_ANIMATION_STEPS, WARRIOR_DATA, WARRIOR_SHEET,
+                        WIZARD_ANIMATION_STEPS, WIZARD_DATA, WIZARD_SHEET)
+  pygame.init()
+  pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+  background_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "background.jpg")
+  if os.path.exists(background_path):
+    background = pygame.image.load(background_path).convert()
+  else:
+    background = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+    background.fill((50, 50, 50))
+  screen = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))#off-screen target for every draw
+  atlas_dir = tempfile.TemporaryDirectory(prefix="perf_bench_")#removed when the process exits
+  _fixtures.update(
+    atlas_dir=atlas_dir,
+    screen=screen,
+    renderer=LayeredRenderer(screen, background),
+    font=pygame.font.Font(None, 30),
+    count_font=pygame.font.Font(None, 80),
+    sheets={
+      "warrior": atlas_sheet("warrior", WARRIOR_SHEET, WARRIOR_DATA, WARRIOR_ANIMATION_STEPS, atlas_dir.name),
+      "wizard": atlas_sheet("wizard", WIZARD_SHEET, WIZARD_DATA, WIZARD_ANIMATION_STEPS, atlas_dir.name),
+    },
+  )
+  return _fixtures
+
+
+def atlas_sheet(name, path, data, animation_steps, atlas_dir):
+  #load a sheet the way the game does, through its compiled atlas; a missing sheet is generated into a temporary PNG
+  #returns (sheet handle, data, animation steps, source path)
+  import sprite_atlas
+  if not os.path.exists(path):
+    generated = os.path.join(atlas_dir, name + ".png")
+    pygame.image.save(load_sheet(path, data, animation_steps), generated)
+    path = generated
+  return sprite_atlas.load_sheet(path, data, animation_steps, atlas_dir), data, animation_steps, path
+
+
+def load_sheet(path, data, animation_steps):
+  #the real sheet when it is on disk, otherwise a generated one of the same size with an opaque figure per frame
+  #and, in the attack rows, a blade that swings out in front of it
+  if os.path.exists(path):
+    return pygame.image.load(path).convert_alpha()
+  size = data[0]
+  sheet = pygame.Surface((size * max(animation_steps), size * len(animation_steps)), pygame.SRCALPHA)
+  for y, frames in enumerate(animation_steps):
+    for x in range(frames):
+      rect = pygame.Rect(x * size + size // 3, y * size + size // 4, size // 3, size // 2)
+      pygame.draw.ellipse(sheet, (200, 60 + 20 * y, 40 + 20 * x, 255), rect)
+      if y in (3, 4):
+        blade = pygame.Rect(x * size + size // 2, y * size + size // 3 + x * size // 24, size * 2 // 5, size // 16)
+        pygame.draw.rect(sheet, (220, 220, 230, 255), blade)
+  return sheet
+
+
+def sprite_fighters():
+  from fighter import Fighter
+  sheets = fixtures()["sheets"]
+  warrior_sheet, warrior_data, warrior_steps, _ = sheets["warrior"]
+  wizard_sheet, wizard_data, wizard_steps, _ = sheets["wizard"]
+  fighter_1 = Fighter(1, 200, 310, False, warrior_data, warrior_sheet, warrior_steps, None)
+  fighter_2 = Fighter(2, 700, 310, True, wizard_data, wizard_sheet, wizard_steps, None)
+  return fighter_1, fighter_2
+
+
+def action_state(fighter, action):
+  #put a fighter into one action state and return its snapshot
+  fighter.action = ACTIONS.index(action)
+  fighter.frame_index = 0
+  if action == "run":
+    fighter.running = True
+  elif action == "jump":
+    fighter.jump = True
+    fighter.vel_y = -10
+    fighter.rect.y -= 100
+  elif action in ("attack1", "attack2"):
+    fighter.attacking = True
+    fighter.attack_type = 1 if action == "attack1" else 2
+  elif action == "hit":
+    fighter.hit = True
+  elif action == "death":
+    fighter.health = 0
+    fighter.alive = False
+  fighter.update_action(fighter.action)
+  fighter.show_frame()
+  return fighter.snapshot()
+
+
+for _name in ("warrior", "wizard"):
+  @benchmark(f"sprite_atlas.load_sheet[{_name}]")
+  def _load_atlas(name=_name):
+    #a warm start: the atlas is compiled, the sheet's frames are not banked yet (other sheets stay banked)
+    import sprite_atlas
+    from fighter import frame_bank
+    handle, data, steps, path = fixtures()["sheets"][name]
+    atlas_dir = fixtures()["atlas_dir"].name
+    def run():
+      for flip in (False, True):
+        del frame_bank[(handle, data[0], data[1], tuple(steps), flip)]
+      sprite_atlas.load_sheet(path, data, steps, atlas_dir)
+    return run
+
+  @benchmark(f"fighter.load_images[{_name},cached]")
+  def _load_cached(name=_name):
+    sheet, data, steps, _ = fixtures()["sheets"][name]
+    fighter = sprite_fighters()[0 if name == "warrior" else 1]
+    return lambda: fighter.load_images(sheet, steps)
+
+
+for _action in ACTIONS:
+  @benchmark(f"fighter.move[{_action}]")
+  def _move(action=_action):
+    from engine import MASK_KEYS, RIGHT
+    from settings import SCREEN_HEIGHT, SCREEN_WIDTH
+    fighter, target = sprite_fighters()
+    state = action_state(fighter, action)
+    keys = MASK_KEYS[1][RIGHT if action == "run" else 0]
+    def run():
+      fighter.restore(state)
+      fighter.move(SCREEN_WIDTH, SCREEN_HEIGHT, None, target, False, keys)
+    return run
+
+  @benchmark(f"fighter.update[{_action}]")
+  def _update(action=_action):
+    fighter, _ = sprite_fighters()
+    state = action_state(fighter, action)
+    def run():
+      fighter.restore(state)
+      fighter.update()
+    return run
+
+  @benchmark(f"fighter.draw[{_action}]")
+  def _draw(action=_action):
+    fighter, _ = sprite_fighters()
+    action_state(fighter, action)
+    screen = fixtures()["screen"]
+    return lambda: fighter.draw(screen)
+
+
+@benchmark("fighter.restore")
+def _restore():
+  #the restore cost included in every fighter.move and fighter.update benchmark
+  fighter, _ = sprite_fighters()
+  state = fighter.snapshot()
+  return lambda: fighter.restore(state)
+
+
+def strike_fighters(gap, hitboxes):
+  #attacker on the first frame of attack1, target `gap` pixels to its right; returns both and their snapshots
+  from hitboxes import hitbox_table
+  attacker, target = sprite_fighters()
+  if hitboxes:
+    attacker.hitboxes = hitbox_table(attacker)
+    target.hitboxes = hitbox_table(target)
+  target.rect.x = attacker.rect.x + gap
+  state = action_state(attacker, "attack1")
+  return attacker, target, state, target.snapshot()
+
+
+#the single attack rect, checked once as the attack starts, against per-tick hitbox checks
+#gap 100 puts the target inside both the rect's and the hitbox's reach, 500 outside both
+for _case, _gap in (("hit", 100), ("miss", 500)):
+  @benchmark(f"collision.rect[{_case}]")
+  def _collision_rect(gap=_gap):
+    attacker, target, state, target_state = strike_fighters(gap, False)
+    def run():
+      attacker.restore(state)
+      target.restore(target_state)
+      attacker.attack(target)
+    return run
+
+  @benchmark(f"collision.hitbox[{_case}]")
+  def _collision_hitbox(gap=_gap):
+    attacker, target, state, target_state = strike_fighters(gap, True)
+    def run():
+      attacker.restore(state)
+      target.restore(target_state)
+      attacker.strike(target)
+    return run
+
+
+for _name in ("warrior", "wizard"):
+  @benchmark(f"hitboxes.build[{_name}]")
+  def _build_hitboxes(name=_name):
+    from hitboxes import hitbox_table, table_bank
+    fighter = sprite_fighters()[0 if name == "warrior" else 1]
+    def run():
+      table_bank.clear()
+      hitbox_table(fighter)
+    return run
+
+
+@benchmark("renderer.draw_bg")
+def _draw_bg():
+  #a full background repaint, as after a resize or the first frame
+  renderer = fixtures()["renderer"]
+  def run():
+    renderer.invalidate()
+    renderer.begin_frame()
+    renderer.present()
+  return run
+
+
+@benchmark("renderer.draw_bg[flat]")
+def _draw_bg_flat():
+  #the same repaint at the quality governor's flat-background level
+  renderer = fixtures()["renderer"]
+  def run():
+    renderer.set_flat_background(True)
+    renderer.invalidate()
+    renderer.begin_frame()
+    renderer.present()
+    renderer.set_flat_background(False)
+  return run
+
+
+@benchmark("renderer.draw_health_bar")
+def _health_bar():
+  renderer = fixtures()["renderer"]
+  health = [0]
+  def run():
+    health[0] = (health[0] + 10) % 110
+    renderer.health_bar(health[0], 20, 20)
+    if len(renderer.items) > 1000:
+      renderer.begin_frame()
+  return run
+
+
+@benchmark("renderer.draw_health_bar[uncached]")
+def _health_bar_uncached():
+  renderer = fixtures()["renderer"]
+  def run():
+    renderer.bars.clear()
+    renderer.health_bar(55, 20, 20)
+    renderer.begin_frame()
+  return run
+
+
+@benchmark("renderer.draw_text")
+def _text():
+  renderer = fixtures()["renderer"]
+  font = fixtures()["font"]
+  def run():
+    renderer.text("P1: 3", font, (255, 0, 0), 20, 60)
+    if len(renderer.items) > 1000:
+      renderer.begin_frame()
+  return run
+
+
+@benchmark("renderer.draw_text[uncached]")
+def _text_uncached():
+  renderer = fixtures()["renderer"]
+  font = fixtures()["font"]
+  def run():
+    renderer.glyphs.clear()
+    renderer.text("P1: 3", font, (255, 0, 0), 20, 60)
+    renderer.begin_frame()
+  return run
+
+
+def _frame_benchmark(intro):
+  #one pass of the game loop body: a simulation tick, draw_match and the dirty-rect present
+  from engine import MASK_KEYS, Match, random_script
+  from profiler import Profiler
+  from renderer import draw_match
+  f = fixtures()
+  renderer = f["renderer"]
+  match = Match(sprite_fighters, intro_count=3 if intro else 0)
+  script_1 = random_script(1, 3600)
+  script_2 = random_script(2, 3600)
+  profiler = Profiler()
+  tick = [0]
+  def run():
+    i = tick[0] % 3600
+    tick[0] += 1
+    if intro and match.intro_count <= 0:
+      match.intro_count = 3
+    match.step(MASK_KEYS[1][script_1[i]], MASK_KEYS[2][script_2[i]])
+    draw_match(renderer, match, f["count_font"], f["font"], None, 0.5, profiler)
+    renderer.present()
+  return run
+
+
+@benchmark("frame[intro]")
+def _frame_intro():
+  return _frame_benchmark(True)
+
+
+@benchmark("frame[fight]")
+def _frame_fight():
+  return _frame_benchmark(False)
+
+
+def synthetic_hands(count, seed=0):
+  #(count, 21, 3) noisy landmark sets cycling through every gesture and an open hand
+  from gesture_features import GESTURES
+  rng = np.random.default_rng(seed)
+  shapes = []
+  for gesture in GESTURES + [None]:
+    hand = np.zeros((21, 3), dtype=np.float32)
+    hand[:, :2] = (0.5, 0.6)
+    hand[0, :2] = (0.5, 0.75)#wrist
+    hand[5, :2] = (0.47, 0.6)#index MCP
+    hand[9, :2] = (0.5, 0.6)#middle MCP
+    for tip, pip in zip((8, 12, 16, 20), (6, 10, 14, 18)):
+      hand[pip, 1] = 0.55
+      hand[tip, 1] = 0.45 if gesture == "Jump" else 0.58
+    if gesture in ("Move Left", "Move Right"):
+      hand[8, :2] = (0.58 if gesture == "Move Right" else 0.38, 0.595)
+      hand[6, 1] = 0.615
+    elif gesture is None:
+      hand[8, 1] = 0.45#index up, others curled: no rule matches
+    shapes.append(hand)
+  hands = np.stack([shapes[i % len(shapes)] for i in range(count)])
+  return hands + rng.normal(0, 0.004, hands.shape).astype(np.float32)
+
+
+@benchmark("gesture.extract_features[batch 256]")
+def _extract_features():
+  from gesture_features import extract_features
+  hands = synthetic_hands(256)
+  return lambda: extract_features(hands)
+
+
+@benchmark("gesture.classify_hand[x256]")
+def _classify_hand():
+  from gesture_features import classify_hand
+  hands = synthetic_hands(256)
+  def run():
+    for hand in hands:
+      classify_hand(hand)
+  return run
+
+
+@benchmark("gesture.classify[batch 256]")
+def _classify_batch():
+  from gesture_features import classify
+  hands = synthetic_hands(256)
+  return lambda: classify(hands)
+
+
+@benchmark("gesture.filter_bank[x256]")
+def _filter_bank():
+  #the live path: One-Euro smoothing, classification and hysteresis, one frame per hand
+  from gesture_filter import GestureFilterBank
+  from hand_tracking import TrackedHand
+  frames = [[TrackedHand(hand, "Right", 0.9)] for hand in synthetic_hands(256)]
+  bank = GestureFilterBank()
+  clock = [0.0]
+  def run():
+    for tracked in frames:
+      clock[0] += 1 / 30
+      bank.update(tracked, clock[0], (640, 480))
+  return run
+
+
+def run_benchmarks(names, repeat, report=print):
+  results = {}
+  for name in names:
+    median, best = time_call(BENCHMARKS[name](), repeat)
+    results[name] = {"median": median, "min": best}
+    report(f"{name:<38}{median * 1e6:>12.2f} us")
+  return results
+
+
+def compare(results, baseline, threshold):
+  #(report lines, names slower than baseline by more than threshold)
+  lines = [f"{'benchmark':<38}{'now us':>12}{'baseline':>12}{'change':>9}"]
+  regressions = []
+  for name, result in results.items():
+    base = baseline.get(name)
+    if base is None:
+      lines.append(f"{name:<38}{result['median'] * 1e6:>12.2f}{'-':>12}{'new':>9}")
+      continue
+    change = result["median"] / base["median"] - 1
+    flag = ""
+    if change > threshold:
+      regressions.append(name)
+      flag = "  REGRESSION"
+    lines.append(f"{name:<38}{result['median'] * 1e6:>12.2f}{base['median'] * 1e6:>12.2f}{change:>+9.1%}{flag}")
+  return lines, regressions
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Benchmark the game and gesture hot paths against a per-machine baseline")
+  parser.add_argument("--save", action="store_true", help="store the results as this machine's baseline")
+  parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                      help="fail when a benchmark is this fraction slower than baseline (default %(default)s)")
+  parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this text")
+  parser.add_argument("--baseline", help="baseline file (default bench_baselines/<machine>.json)")
+  parser.add_argument("--repeat", type=int, default=7, help="timed batches per benchmark")
+  parser.add_argument("--list", action="store_true", help="list benchmark names and exit")
+  args = parser.parse_args()
+
+  names = [name for name in BENCHMARKS if args.filter in name]
+  if args.list:
+    print("\n".join(names))
+    return
+  path = args.baseline or os.path.join(BASELINE_DIR, machine_id() + ".json")
+  print(f"{len(names)} benchmarks, {args.repeat} batches each, machine {machine_id()}")
+  results = run_benchmarks(names, args.repeat)
+
+  if args.save:
+    baseline = {}
+    if os.path.exists(path):
+      with open(path) as f:
+        baseline = json.load(f)["results"]
+    baseline.update(results)#a filtered run only replaces its own entries
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+      json.dump({"machine": machine_id(), "python": platform.python_version(), "pygame": pygame.version.ver,
+                 "saved": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": baseline}, f, indent=1, sort_keys=True)
+    print(f"saved baseline {path}")
+    return
+  if not os.path.exists(path):
+    print(f"no baseline at {path}; run with --save to create one")
+    return
+  with open(path) as f:
+    baseline = json.load(f)["results"]
+  lines, regressions = compare(results, baseline, args.threshold)
+  print("\n" + "\n".join(lines))
+  if regressions:
+    print(f"\n{len(regressions)} benchmarks regressed by more than {args.threshold:.0%}: {', '.join(regressions)}")
+    raise SystemExit(1)
+  print(f"\nno regressions beyond {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,158 @@
+import json
+import threading
+import time
+from collections import deque
+
+import numpy as np
+import pygame
+
+
+class _Section:
+    """Context manager that records one timed span"""
+
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, self.start, time.perf_counter())
+        return False
+
+
+class _NullSection:
+    """Shared no-op section handed out while profiling is off"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SECTION = _NullSection()
+
+
+class Profiler:
+    """Named timing spans from any thread: rolling per-name samples plus a trace ring.
+
+    ``window`` durations are kept per name for the percentile overlay, and the
+    newest ``trace_events`` spans (with their thread) are kept for export as a
+    Chrome trace. While ``enabled`` is False, ``section`` returns a shared no-op
+    context and ``record`` returns at once.
+    """
+
+    def __init__(self, window=240, trace_events=100000):
+        self.enabled = False
+        self.window = window
+        self.samples = {}  # name -> deque of durations in seconds
+        self.trace = deque(maxlen=trace_events)  # (name, start, end, thread id)
+        self.thread_names = {}
+        self.origin = time.perf_counter()
+
+    def section(self, name):
+        """``with profiler.section("name"):`` times the block"""
+        if not self.enabled:
+            return _NULL_SECTION
+        return _Section(self, name)
+
+    def record(self, name, start, end):
+        """Add a span measured elsewhere, with time.perf_counter() start and end"""
+        if not self.enabled:
+            return
+        samples = self.samples.get(name)
+        if samples is None:
+            samples = self.samples.setdefault(name, deque(maxlen=self.window))
+        samples.append(end - start)
+        thread_id = threading.get_ident()
+        if thread_id not in self.thread_names:
+            self.thread_names[thread_id] = threading.current_thread().name
+        self.trace.append((name, start, end, thread_id))
+
+    def reset(self):
+        self.samples.clear()
+        self.trace.clear()
+
+    def percentiles(self, name, q=(50, 95, 99)):
+        """Percentiles of the rolling window for one name, in seconds"""
+        samples = self.samples.get(name)
+        if not samples:
+            return None
+        return np.percentile(np.fromiter(samples, dtype=np.float64), q)
+
+    def summary(self):
+        """(name, p50, p95, p99, max) in seconds for every name, sorted by name"""
+        rows = []
+        for name in sorted(self.samples):
+            values = np.fromiter(self.samples[name], dtype=np.float64)
+            if len(values):
+                p50, p95, p99 = np.percentile(values, [50, 95, 99])
+                rows.append((name, p50, p95, p99, values.max()))
+        return rows
+
+    def export_chrome_trace(self, path):
+        """Write the trace ring as Chrome trace JSON (chrome://tracing, ui.perfetto.dev)"""
+        pid = 1
+        events = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+                  for tid, name in self.thread_names.items()]
+        for name, start, end, tid in list(self.trace):
+            events.append({"name": name, "ph": "X", "pid": pid, "tid": tid,
+                           "ts": (start - self.origin) * 1e6, "dur": (end - start) * 1e6})
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        return len(events)
+
+
+# Process-wide profiler shared by the game loop and the gesture threads
+PROFILER = Profiler()
+
+
+class ProfilerOverlay:
+    """On-screen table of rolling p50/p95/p99 per span, redrawn a few times a second"""
+
+    def __init__(self, profiler, font, position=(10, 100), refresh=0.25):
+        self.profiler = profiler
+        self.font = font
+        self.position = position
+        self.refresh = refresh
+        self.visible = False
+        self.surface = None
+        self.last_refresh = 0.0
+
+    def toggle(self):
+        """Show or hide the overlay; profiling runs while it is visible"""
+        self.visible = not self.visible
+        self.profiler.enabled = self.visible
+        if self.visible:
+            self.profiler.reset()
+
+    def draw(self, renderer):
+        if not self.visible:
+            return
+        now = time.perf_counter()
+        if self.surface is None or now - self.last_refresh >= self.refresh:
+            if self.surface is not None:
+                renderer.release(self.surface)
+            self.surface = self._render()
+            self.last_refresh = now
+        renderer.blit(self.surface, self.position)
+
+    def _render(self):
+        lines = [f"{'span':<18}{'p50':>7}{'p95':>7}{'p99':>7}{'max':>7}  ms"]
+        for name, p50, p95, p99, worst in self.profiler.summary():
+            lines.append(f"{name:<18}{p50 * 1000:>7.2f}{p95 * 1000:>7.2f}{p99 * 1000:>7.2f}{worst * 1000:>7.2f}")
+        rendered = [self.font.render(line, True, (255, 255, 255)) for line in lines]
+        line_height = self.font.get_linesize()
+        width = max(img.get_width() for img in rendered) + 12
+        surface = pygame.Surface((width, line_height * len(rendered) + 12), pygame.SRCALPHA)
+        surface.fill((0, 0, 0, 170))
+        for i, img in enumerate(rendered):
+            surface.blit(img, (6, 6 + i * line_height))
+        return surface
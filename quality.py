@@ -0,0 +1,126 @@
+import time
+from collections import deque, namedtuple
+
+import numpy as np
+
+from eventlog import QUALITY
+from settings import FPS
+
+#one level of visual and gesture quality
+#preview_fps: camera preview rate (0 hides the preview), inference_scale: frame scale for full-frame hand detection,
+#inference_fps: most hand detections per second (0 for every camera frame),
+#background: "image" or "flat" (one fill colour), interpolate: draw fighters between simulation ticks
+Quality = namedtuple("Quality", ["preview_fps", "inference_scale", "inference_fps", "background", "interpolate"])
+
+#best first; the cheapest sacrifices come first: the preview window, then gesture work, then the game's own visuals
+LADDER = [
+  Quality(15, 1.0, 0, "image", True),
+  Quality(5, 1.0, 0, "image", True),
+  Quality(0, 1.0, 0, "image", True),
+  Quality(0, 0.75, 30, "image", True),
+  Quality(0, 0.5, 20, "image", True),
+  Quality(0, 0.5, 20, "flat", False),
+  Quality(0, 0.5, 10, "flat", False),
+]
+
+
+def bounded_ladder(ladder=LADDER, max_preview_fps=15, min_inference_scale=0.5, min_inference_fps=10,
+                   allow_low_visuals=True):
+  #clamp every level into the configured bounds, dropping levels that end up the same as the one before
+  levels = []
+  for quality in ladder:
+    quality = quality._replace(
+      preview_fps=min(quality.preview_fps, max_preview_fps),
+      inference_scale=max(quality.inference_scale, min_inference_scale),
+      inference_fps=max(quality.inference_fps, min_inference_fps) if quality.inference_fps else 0,
+      background=quality.background if allow_low_visuals else "image",
+      interpolate=quality.interpolate or not allow_low_visuals)
+    if not levels or quality != levels[-1]:
+      levels.append(quality)
+  return levels
+
+
+def describe(quality):
+  preview = f"preview {quality.preview_fps:g} fps" if quality.preview_fps else "preview off"
+  rate = f" at {quality.inference_fps:g} fps" if quality.inference_fps else ""
+  motion = "" if quality.interpolate else ", no interpolation"
+  return f"{preview}, inference x{quality.inference_scale:g}{rate}, {quality.background} background{motion}"
+
+
+class QualityGovernor():
+  #steps one level at a time along the quality ladder to hold the target frame rate and gesture latency
+  #frame() takes each frame's work time (excluding the frame-rate wait) and the latency of a gesture sample that
+  #arrived since the last frame (None if none did, so each sample counts once);
+  #apply(quality) is called with the new Quality on every change, and once at start with the best level
+  def __init__(self, apply, target_fps=FPS, latency_target=0.1, levels=None, window=90, settle=1.5,
+               recover_after=5.0, max_recover_after=60.0, clock=time.perf_counter):
+    self.apply = apply
+    self.budget = 1.0 / target_fps
+    self.latency_target = latency_target
+    self.levels = levels or bounded_ladder()
+    self.settle = settle#seconds after a change before its effect is judged
+    self.recover_after = recover_after#seconds of comfortable headroom before stepping back up
+    self.max_recover_after = max_recover_after
+    self.clock = clock
+    self.frame_times = deque(maxlen=window)
+    self.latencies = deque(maxlen=window)
+    self.level = 0
+    self.changed_at = clock()
+    self.last_raise = None#time of the latest step up, to catch oscillation
+    self.next_check = 0.0
+    self.adjustments = []#(seconds since start, old level, new level, reason)
+    self.started = self.changed_at
+    apply(self.levels[0])
+
+  @property
+  def quality(self):
+    return self.levels[self.level]
+
+  def frame(self, work_time, gesture_latency=None):
+    self.frame_times.append(work_time)
+    if gesture_latency is not None:
+      self.latencies.append(gesture_latency)
+    now = self.clock()
+    #percentiles are only taken a few times a second, and only over measurements from the current level
+    if now < self.next_check or len(self.frame_times) < self.frame_times.maxlen or now - self.changed_at < self.settle:
+      return
+    self.next_check = now + 0.25
+    frame_p90 = float(np.percentile(np.fromiter(self.frame_times, dtype=np.float64), 90))
+    latency_p90 = None
+    if len(self.latencies) >= self.latencies.maxlen // 2:
+      latency_p90 = float(np.percentile(np.fromiter(self.latencies, dtype=np.float64), 90))
+
+    if frame_p90 > self.budget * 0.9:
+      self._lower(now, f"frame p90 {frame_p90 * 1000:.1f} ms over 90% of the {self.budget * 1000:.1f} ms budget")
+    elif latency_p90 is not None and latency_p90 > self.latency_target:
+      self._lower(now, f"gesture latency p90 {latency_p90 * 1000:.0f} ms over the "
+                       f"{self.latency_target * 1000:.0f} ms target")
+    elif (self.level > 0 and now - self.changed_at >= self.recover_after and frame_p90 < self.budget * 0.5
+          and (latency_p90 is None or latency_p90 < self.latency_target * 0.5)):
+      latency = f", gesture latency p90 {latency_p90 * 1000:.0f} ms" if latency_p90 is not None else ""
+      self.last_raise = now
+      self._change(now, self.level - 1, f"headroom: frame p90 {frame_p90 * 1000:.1f} ms{latency}")
+
+  def _lower(self, now, reason):
+    if self.level == len(self.levels) - 1:
+      return
+    if self.last_raise is not None and now - self.last_raise < self.recover_after * 2:
+      #the level above could not hold: wait longer before trying it again
+      self.recover_after = min(self.recover_after * 2, self.max_recover_after)
+      reason += f"; next raise after {self.recover_after:g} s"
+    self.last_raise = None
+    self._change(now, self.level + 1, reason)
+
+  def _change(self, now, level, reason):
+    QUALITY.info("Quality %d -> %d (%s): %s", self.level, level, describe(self.levels[level]), reason)
+    self.adjustments.append((now - self.started, self.level, level, reason))
+    self.level = level
+    self.changed_at = now
+    self.frame_times.clear()
+    self.latencies.clear()
+    self.apply(self.levels[level])
+
+  def summary(self):
+    lowered = sum(1 for _, old, new, _ in self.adjustments if new > old)
+    return (f"quality: level {self.level}/{len(self.levels) - 1} ({describe(self.quality)}), "
+            f"{lowered} steps down, {len(self.adjustments) - lowered} steps up")
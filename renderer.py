@@ -0,0 +1,147 @@
+import pygame
+from profiler import PROFILER
+
+#colours used by the cached HUD pieces
+RED = (255, 0, 0)
+YELLOW = (255, 255, 0)
+WHITE = (255, 255, 255)
+
+
+class LayeredRenderer():
+  #retained renderer: background scaled once, HUD glyphs cached, display updated only where the frame changed
+  def __init__(self, screen, bg_image):
+    self.screen = screen
+    self.screen_rect = screen.get_rect()
+    self.flat_background = False
+    self.set_background(bg_image)
+    self.items = []#(surface, position, screen rect of its opaque pixels, blend flags) in draw order
+    self.last_items = []
+    self.bounds = {}#surface -> bounding rect of its opaque pixels
+    self.glyphs = {}#(text, font, colour) -> rendered text
+    self.bars = {}#health -> rendered health bar
+    self.full_redraw = True
+    self.dirty_rects = []
+
+  def set_background(self, bg_image):
+    self.background = pygame.transform.scale(bg_image, self.screen_rect.size).convert()
+    #the image's average colour stands in for it at low quality: a fill is cheaper to repaint than a blit
+    self.background_colour = pygame.transform.average_color(self.background)[:3]
+    self.full_redraw = True
+
+  def set_flat_background(self, flat):
+    #low quality draws the background as one flat colour
+    if flat != self.flat_background:
+      self.flat_background = flat
+      self.full_redraw = True
+
+  def release(self, surface):
+    #forget cached data for a surface that will not be drawn again
+    self.bounds.pop(surface, None)
+
+  def begin_frame(self):
+    self.last_items = self.items
+    self.items = []
+
+  def invalidate(self):
+    #force the next present to redraw and push the whole screen
+    self.full_redraw = True
+
+  def blit(self, source, dest, area=None, special_flags=0):
+    #same call shape as Surface.blit so Fighter.draw can target the renderer directly
+    bounds = self.bounds.get(source)
+    if bounds is None:
+      bounds = source.get_bounding_rect()
+      self.bounds[source] = bounds
+    x, y = dest[0], dest[1]
+    rect = bounds.move(x, y)
+    self.items.append((source, (x, y), rect, special_flags))
+    return rect
+
+  def text(self, text, font, text_col, x, y):
+    #glyphs are only rendered again when the text itself changes
+    key = (text, font, text_col)
+    img = self.glyphs.get(key)
+    if img is None:
+      img = font.render(text, True, text_col)
+      self.glyphs[key] = img
+    return self.blit(img, img.get_rect(center=(x, y)).topleft)
+
+  def health_bar(self, health, x, y):
+    #one cached bar surface per health value, rebuilt only when health changes
+    img = self.bars.get(health)
+    if img is None:
+      ratio = health / 100
+      img = pygame.Surface((404, 34))
+      pygame.draw.rect(img, WHITE, (0, 0, 404, 34))
+      pygame.draw.rect(img, RED, (2, 2, 400, 30))
+      pygame.draw.rect(img, YELLOW, (2, 2, 400 * ratio, 30))
+      self.bars[health] = img
+    return self.blit(img, (x - 2, y - 2))
+
+  def _dirty(self):
+    #rects covered by anything that appeared, disappeared or moved since the last frame
+    if self.full_redraw:
+      self.full_redraw = False
+      return [self.screen_rect.copy()]
+    old = set((item[0], item[1], item[3]) for item in self.last_items)
+    new = set((item[0], item[1], item[3]) for item in self.items)
+    dirty = [item[2] for item in self.last_items if (item[0], item[1], item[3]) not in new]
+    dirty += [item[2] for item in self.items if (item[0], item[1], item[3]) not in old]
+    #merge overlapping rects so no area is redrawn twice
+    merged = []
+    for rect in dirty:
+      rect = rect.clip(self.screen_rect)
+      if rect.width == 0 or rect.height == 0:
+        continue
+      i = rect.collidelist(merged)
+      while i != -1:
+        rect.union_ip(merged.pop(i))
+        i = rect.collidelist(merged)
+      merged.append(rect)
+    return merged
+
+  def present(self):
+    #repaint the dirty areas from the cached layers and push only those to the display
+    self.dirty_rects = self._dirty()
+    screen = self.screen
+    for rect in self.dirty_rects:
+      screen.set_clip(rect)
+      if self.flat_background:
+        screen.fill(self.background_colour, rect)
+      else:
+        screen.blit(self.background, rect, rect)
+      for source, pos, item_rect, flags in self.items:
+        if item_rect.colliderect(rect):
+          screen.blit(source, pos, special_flags=flags)
+    screen.set_clip(None)
+    if self.dirty_rects:
+      with PROFILER.section("display.update"):
+        pygame.display.update(self.dirty_rects)
+
+
+def draw_match(renderer, match, count_font, score_font, victory_img, alpha, profiler=PROFILER):
+  #queue one frame of a match: HUD, countdown, fighters (interpolated by alpha) and the victory banner
+  screen_width, screen_height = renderer.screen_rect.size
+  #draw background
+  with profiler.section("draw_bg"):
+    renderer.begin_frame()
+
+  #show player stats
+  with profiler.section("hud"):
+    renderer.health_bar(match.fighter_1.health, 20, 20)
+    renderer.health_bar(match.fighter_2.health, 580, 20)
+    renderer.text("P1: " + str(match.score[0]), score_font, RED, 20, 60)
+    renderer.text("P2: " + str(match.score[1]), score_font, RED, 580, 60)
+
+    #display count timer
+    if match.intro_count > 0:
+      renderer.text(str(match.intro_count), count_font, RED, screen_width / 2, screen_height / 3)
+
+  #draw fighters
+  with profiler.section("fighter.draw"):
+    match.fighter_1.draw(renderer, alpha)
+    match.fighter_2.draw(renderer, alpha)
+
+  #display victory image
+  if match.round_over and victory_img:
+    renderer.blit(victory_img, (360, 150))
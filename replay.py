@@ -0,0 +1,160 @@
+"""Record the per-tick inputs of a match and play them back deterministically.
+
+Usage: python replay.py FILE [--profile]
+
+A replay file is a header followed by fixed-size records:
+  header = magic | version | sim rate | seed | intro count | round over ticks | screen size
+  record = kind (u8) | tick (u32) | payload (u16)
+INPUT records are only written when either player's input mask changes; the
+payload is player 1's mask in the low 5 bits and player 2's in the next 5.
+ROUND records carry the winner (1 or 2) of the round that ended on that tick,
+CHECK holds a 16-bit checksum of both fighters' final state and END closes the
+file with the tick count and number of finished rounds. Playback re-runs the
+match headlessly and checks every recorded round result and the final state.
+"""
+import argparse
+import struct
+import time
+import zlib
+
+from engine import INTRO_COUNT, ROUND_OVER_TICKS, Match, fighter_state, mask_to_keys
+from settings import SCREEN_WIDTH, SCREEN_HEIGHT, SIM_RATE
+
+MAGIC = b"GRPL"
+VERSION = 1
+HEADER = struct.Struct("<4sHHQHIHH")
+RECORD = struct.Struct("<BIH")
+INPUT, ROUND, CHECK, END = 0, 1, 2, 3
+MASK_BITS = 5
+
+
+def state_checksum(match):
+  #16-bit digest of both fighters' state, enough to catch a desynced playback
+  states = (fighter_state(match.fighter_1), fighter_state(match.fighter_2), match.score)
+  return zlib.crc32(repr(states).encode()) & 0xFFFF
+
+
+class ReplayRecorder():
+  #writes one record per input change, so a long idle stretch costs nothing
+  def __init__(self, path, seed, intro_count=INTRO_COUNT, round_over_ticks=ROUND_OVER_TICKS,
+               screen_width=SCREEN_WIDTH, screen_height=SCREEN_HEIGHT):
+    self.file = open(path, "wb")
+    self.file.write(HEADER.pack(MAGIC, VERSION, SIM_RATE, seed, intro_count, round_over_ticks, screen_width, screen_height))
+    self.last_masks = None
+    self.ticks = 0
+    self.rounds = 0
+
+  def record(self, tick, mask_1, mask_2):
+    #call once per simulation tick with the masks passed to Match.step on that tick
+    masks = (mask_1, mask_2)
+    if masks != self.last_masks:
+      self.file.write(RECORD.pack(INPUT, tick, mask_1 | (mask_2 << MASK_BITS)))
+      self.last_masks = masks
+    self.ticks = tick + 1
+
+  def round_over(self, tick, winner):
+    self.file.write(RECORD.pack(ROUND, tick, winner))
+    self.rounds += 1
+
+  def close(self, match=None):
+    if self.file.closed:
+      return
+    if match is not None:
+      self.file.write(RECORD.pack(CHECK, self.ticks, state_checksum(match)))
+    self.file.write(RECORD.pack(END, self.ticks, self.rounds))
+    self.file.close()
+
+
+class Replay():
+  #a loaded replay: match settings, the per-tick inputs and the recorded round results
+  def __init__(self, path):
+    with open(path, "rb") as f:
+      data = f.read()
+    magic, version, self.sim_rate, self.seed, self.intro_count, self.round_over_ticks, self.screen_width, \
+      self.screen_height = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+      raise ValueError(f"{path} is not a replay file")
+    self.changes = []#(tick, mask_1, mask_2)
+    self.round_results = []#(tick, winner)
+    self.checksum = None
+    self.ticks = None
+    mask = (1 << MASK_BITS) - 1
+    for offset in range(HEADER.size, len(data) - RECORD.size + 1, RECORD.size):
+      kind, tick, payload = RECORD.unpack_from(data, offset)
+      if kind == INPUT:
+        self.changes.append((tick, payload & mask, (payload >> MASK_BITS) & mask))
+      elif kind == ROUND:
+        self.round_results.append((tick, payload))
+      elif kind == CHECK:
+        self.checksum = payload
+      elif kind == END:
+        self.ticks = tick
+    if self.ticks is None:
+      #recording was cut off: play up to the last input change
+      self.ticks = self.changes[-1][0] + 1 if self.changes else 0
+
+  def masks(self):
+    #dense per-tick (mask_1, mask_2) lists
+    masks_1 = [0] * self.ticks
+    masks_2 = [0] * self.ticks
+    for i, (tick, mask_1, mask_2) in enumerate(self.changes):
+      end = self.changes[i + 1][0] if i + 1 < len(self.changes) else self.ticks
+      masks_1[tick:end] = [mask_1] * (end - tick)
+      masks_2[tick:end] = [mask_2] * (end - tick)
+    return masks_1, masks_2
+
+  def make_match(self, make_fighters=None):
+    options = {} if make_fighters is None else {"make_fighters": make_fighters}
+    return Match(screen_width=self.screen_width, screen_height=self.screen_height, intro_count=self.intro_count,
+                 round_over_ticks=self.round_over_ticks, **options)
+
+
+def play_replay(replay, match=None):
+  #re-run a replay headlessly; returns (match, round results seen during playback)
+  if match is None:
+    match = replay.make_match()
+  masks_1, masks_2 = replay.masks()
+  keys_1 = [mask_to_keys(1, mask) for mask in range(32)]
+  keys_2 = [mask_to_keys(2, mask) for mask in range(32)]
+  results = []
+  for tick in range(replay.ticks):
+    for event in match.step(keys_1[masks_1[tick]], keys_2[masks_2[tick]]):
+      if event == "p1_wins":
+        results.append((tick, 1))
+      elif event == "p2_wins":
+        results.append((tick, 2))
+  return match, results
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Play back a recorded match headlessly")
+  parser.add_argument("path")
+  parser.add_argument("--profile", action="store_true", help="run the playback under cProfile")
+  args = parser.parse_args()
+
+  replay = Replay(args.path)
+  print(f"{args.path}: seed {replay.seed}, {replay.ticks} ticks ({replay.ticks / replay.sim_rate:.1f} s), "
+        f"{len(replay.changes)} input changes, {len(replay.round_results)} rounds")
+  start = time.perf_counter()
+  if args.profile:
+    import cProfile
+    import pstats
+    profiler = cProfile.Profile()
+    match, results = profiler.runcall(play_replay, replay)
+    pstats.Stats(profiler).sort_stats("cumulative").print_stats(20)
+  else:
+    match, results = play_replay(replay)
+  elapsed = time.perf_counter() - start
+  print(f"played in {elapsed * 1000:.1f} ms ({replay.ticks / replay.sim_rate / max(elapsed, 1e-9):,.0f}x real time), "
+        f"score {match.score[0]}-{match.score[1]}")
+  if results != replay.round_results:
+    print(f"round results differ: recorded {replay.round_results}, played {results}")
+    raise SystemExit(1)
+  if replay.checksum is not None and replay.checksum != state_checksum(match):
+    print("final state differs from the recording")
+    raise SystemExit(1)
+  print("playback matches the recording")
+
+
+if __name__ == "__main__":
+  main()
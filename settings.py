@@ -0,0 +1,36 @@
+import os
+
+# Define base asset path
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))  # Get the directory of the current file
+
+#game window
+SCREEN_WIDTH = 1000
+SCREEN_HEIGHT = 600
+
+#render framerate and fixed simulation rate (ticks per second)
+FPS = 60
+SIM_RATE = 60
+
+# Define number of steps in each animation
+WARRIOR_ANIMATION_STEPS = [10, 8, 1, 7, 7, 3, 7]
+WIZARD_ANIMATION_STEPS = [8, 8, 1, 8, 8, 3, 7]
+
+#define fighter variables
+WARRIOR_SIZE = 162
+WARRIOR_SCALE = 4
+WARRIOR_OFFSET = [72, 56]
+WARRIOR_DATA = [WARRIOR_SIZE, WARRIOR_SCALE, WARRIOR_OFFSET]
+WIZARD_SIZE = 250
+WIZARD_SCALE = 3
+WIZARD_OFFSET = [112, 107]
+WIZARD_DATA = [WIZARD_SIZE, WIZARD_SCALE, WIZARD_OFFSET]
+
+#spritesheet locations
+WARRIOR_SHEET = os.path.join(BASE_DIR, "assets", "images", "hero", "warrior.png")
+WIZARD_SHEET = os.path.join(BASE_DIR, "assets", "images", "evil_wizard", "wizard.png")
+
+#characters as (name, spritesheet, data, animation steps)
+CHARACTERS = [
+  ("warrior", WARRIOR_SHEET, WARRIOR_DATA, WARRIOR_ANIMATION_STEPS),
+  ("wizard", WIZARD_SHEET, WIZARD_DATA, WIZARD_ANIMATION_STEPS),
+]
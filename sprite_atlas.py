@@ -0,0 +1,152 @@
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import time
+
+import pygame
+from fighter import frame_bank, register_frames
+
+#compiled sprite atlas: the scaled, premultiplied frames of one character in a single file
+#layout: header | frame table | raw RGBA pixel data of each frame's opaque bounding box
+#frames stay cropped to that box once loaded; the frame bank's origins place them in the full frame
+ATLAS_MAGIC = b"GFAT"
+ATLAS_VERSION = 1
+HEADER = struct.Struct("<4sHH32sII")#magic, version, frame count, cache key, frame width, frame height
+FRAME_ENTRY = struct.Struct("<HHHHHHI")#row, column, trim x, trim y, trim width, trim height, data offset
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "atlas_cache")
+
+
+def atlas_key(source_path, data, animation_steps):
+  #hash of the source sheet plus everything that changes the scaled frames
+  digest = hashlib.sha256()
+  with open(source_path, "rb") as f:
+    digest.update(f.read())
+  digest.update(repr((ATLAS_VERSION, data[0], data[1], list(animation_steps))).encode())
+  return digest.digest()
+
+
+def atlas_path(source_path, cache_dir=CACHE_DIR):
+  name = os.path.splitext(os.path.basename(source_path))[0]
+  return os.path.join(cache_dir, name + ".atlas")
+
+
+def build_atlas(source_path, data, animation_steps, path, key=None):
+  #decode and scale the sheet once, then write the trimmed frames to the atlas file
+  size, image_scale = data[0], data[1]
+  if key is None:
+    key = atlas_key(source_path, data, animation_steps)
+  sheet = pygame.image.load(source_path)
+  frame_size = size * image_scale
+  entries = []
+  blobs = []
+  offset = 0
+  for y, animation in enumerate(animation_steps):
+    for x in range(animation):
+      frame = sheet.subsurface(x * size, y * size, size, size)
+      #the opaque region is found at source size, nearest-neighbour scaling keeps it exact
+      trim = frame.get_bounding_rect()
+      scaled = pygame.transform.scale(frame.subsurface(trim), (trim.width * image_scale, trim.height * image_scale))
+      blob = pygame.image.tobytes(scaled, "RGBA_PREMULT")
+      entries.append(FRAME_ENTRY.pack(y, x, trim.x * image_scale, trim.y * image_scale, scaled.get_width(), scaled.get_height(), offset))
+      blobs.append(blob)
+      offset += len(blob)
+  os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+  tmp_path = path + ".tmp"
+  with open(tmp_path, "wb") as f:
+    f.write(HEADER.pack(ATLAS_MAGIC, ATLAS_VERSION, len(entries), key, frame_size, frame_size))
+    f.write(b"".join(entries))
+    for blob in blobs:
+      f.write(blob)
+  os.replace(tmp_path, path)
+
+
+def load_atlas(path, animation_steps, key):
+  #map the atlas and build both facing directions of each cropped frame straight from the buffer, None if missing or
+  #stale; returns (frames, flipped frames, origins, flipped origins)
+  try:
+    f = open(path, "rb")
+  except OSError:
+    return None
+  with f:
+    if os.fstat(f.fileno()).st_size < HEADER.size:
+      return None
+    buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+  with buf:
+    magic, version, count, stored_key, width, height = HEADER.unpack_from(buf, 0)
+    if magic != ATLAS_MAGIC or version != ATLAS_VERSION or stored_key != key or count != sum(animation_steps):
+      return None
+    data_start = HEADER.size + count * FRAME_ENTRY.size
+    view = memoryview(buf)
+    #frames are converted to the display's pixel format when there is one; blits between mismatched formats are
+    #many times slower
+    convert = pygame.display.get_surface() is not None
+    animation_list = [[None] * animation for animation in animation_steps]
+    flipped_list = [[None] * animation for animation in animation_steps]
+    origins = [[None] * animation for animation in animation_steps]
+    flipped_origins = [[None] * animation for animation in animation_steps]
+    for i in range(count):
+      row, column, trim_x, trim_y, trim_w, trim_h, offset = FRAME_ENTRY.unpack_from(buf, HEADER.size + i * FRAME_ENTRY.size)
+      start = data_start + offset
+      trimmed = view[start:start + trim_w * 4 * trim_h]
+      if trim_w and trim_h:
+        img = pygame.image.frombuffer(trimmed, (trim_w, trim_h), "RGBA")
+        #both copy the pixels out of the mapping, so the atlas can be closed afterwards
+        img = img.convert_alpha() if convert else img.copy()
+      else:
+        img = pygame.Surface((0, 0), pygame.SRCALPHA)
+      trimmed.release()
+      animation_list[row][column] = img
+      flipped_list[row][column] = pygame.transform.flip(img, True, False)
+      origins[row][column] = (trim_x, trim_y)
+      flipped_origins[row][column] = (width - trim_x - trim_w, trim_y)
+    view.release()
+  return animation_list, flipped_list, origins, flipped_origins
+
+
+def load_sheet(source_path, data, animation_steps, cache_dir=CACHE_DIR):
+  #fill the frame bank from the compiled atlas (building it on a cold cache) and return the sheet handle
+  key = atlas_key(source_path, data, animation_steps)
+  handle = "atlas:" + key.hex()
+  if (handle, data[0], data[1], tuple(animation_steps), False) in frame_bank:
+    return handle
+  path = atlas_path(source_path, cache_dir)
+  frames = load_atlas(path, animation_steps, key)
+  if frames is None:
+    build_atlas(source_path, data, animation_steps, path, key)
+    frames = load_atlas(path, animation_steps, key)
+  register_frames(handle, data[0], data[1], animation_steps, *frames)
+  return handle
+
+
+if __name__ == "__main__":
+  #build the atlases for both characters and report cold and warm startup times
+  from fighter import load_frames
+  from settings import CHARACTERS
+  pygame.display.init()
+  pygame.display.set_mode((1, 1))
+  cache_dir = sys.argv[1] if len(sys.argv) > 1 else CACHE_DIR
+  for name, source_path, data, animation_steps in CHARACTERS:
+    if not os.path.exists(source_path):
+      print(f"{name}: missing spritesheet {source_path}")
+      continue
+    path = atlas_path(source_path, cache_dir)
+    if os.path.exists(path):
+      os.remove(path)
+    frame_bank.clear()
+    start = time.perf_counter()
+    load_sheet(source_path, data, animation_steps, cache_dir)
+    cold = time.perf_counter() - start
+    frame_bank.clear()
+    start = time.perf_counter()
+    load_sheet(source_path, data, animation_steps, cache_dir)
+    warm = time.perf_counter() - start
+    frame_bank.clear()
+    start = time.perf_counter()
+    sheet = pygame.image.load(source_path).convert_alpha()
+    for flip in (False, True):
+      load_frames(sheet, data[0], data[1], animation_steps, flip)
+    uncached = time.perf_counter() - start
+    print(f"{name}: uncached {uncached * 1000:.1f} ms, cold cache {cold * 1000:.1f} ms, warm cache {warm * 1000:.1f} ms, atlas {os.path.getsize(path) / 1e6:.1f} MB")
@@ -0,0 +1,132 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from eventlog import GESTURE
+
+
+class StartupTimer():
+  #records how long each startup step took and on which thread, relative to process start
+  def __init__(self):
+    self.origin = time.perf_counter()
+    self.steps = []#(name, start, end, thread name) in seconds since origin
+    self.lock = threading.Lock()
+
+  def timed(self, name, fn, *args, **kwargs):
+    #run fn and record its duration, also when it raises
+    start = time.perf_counter()
+    try:
+      return fn(*args, **kwargs)
+    finally:
+      end = time.perf_counter()
+      with self.lock:
+        self.steps.append((name, start - self.origin, end - self.origin, threading.current_thread().name))
+
+  def mark(self, name):
+    #record an instant, e.g. the first frame on screen
+    now = time.perf_counter() - self.origin
+    with self.lock:
+      self.steps.append((name, now, now, threading.current_thread().name))
+
+  def report(self):
+    lines = [f"{'startup step':<24}{'start ms':>10}{'took ms':>10}  thread"]
+    for name, start, end, thread in sorted(self.steps, key=lambda step: step[1]):
+      lines.append(f"{name:<24}{start * 1000:>10.1f}{(end - start) * 1000:>10.1f}  {thread}")
+    return "\n".join(lines)
+
+
+class AssetLoader():
+  #runs loader functions on a thread pool and hands their results back on the main thread
+  def __init__(self, timer, workers=4):
+    self.timer = timer
+    self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="assets")
+    self.pending = []#(name, future, apply callback)
+
+  def submit(self, name, load, apply):
+    #load() runs on a worker thread, apply(result) later on the thread that calls poll()
+    self.pending.append((name, self.pool.submit(self.timer.timed, name, load), apply))
+
+  def poll(self):
+    #apply every finished load; returns True once nothing is pending
+    still_pending = []
+    for name, future, apply in self.pending:
+      if future.done():
+        apply(future.result())
+      else:
+        still_pending.append((name, future, apply))
+    self.pending = still_pending
+    if not self.pending:
+      self.pool.shutdown(wait=False)
+    return not self.pending
+
+  def wait(self):
+    for _, future, _ in self.pending:
+      future.result()
+    return self.poll()
+
+
+class LazyGestureController():
+  #builds and starts a GestureController on a background thread; until it is ready no gesture keys are reported
+  #out_of_process=True uses gesture_worker.ProcessGestureController (inference in a child process) instead
+  def __init__(self, timer, out_of_process=False, **options):
+    self.timer = timer
+    self.module, self.factory = (("gesture_worker", "ProcessGestureController") if out_of_process
+                                 else ("gesture_controls", "GestureController"))
+    self.options = options
+    self.quality = {}#latest set_quality settings, applied once the controller exists
+    self.controller = None
+    self.error = None
+    self.stopped = False
+    self.thread = threading.Thread(target=self._load, name="gestures", daemon=True)
+    self.thread.start()
+
+  def _load(self):
+    try:
+      #cv2 and mediapipe are only imported here, off the main thread (or only in the worker process)
+      module = self.timer.timed("import " + self.module, __import__, self.module)
+      controller = self.timer.timed("build hand model", getattr(module, self.factory), **self.options)
+      self.timer.timed("start camera", controller.start)
+    except Exception as e:
+      self.error = e
+      GESTURE.warning("Gesture controls unavailable, using keyboard only: %s", e)
+      return
+    self.controller = controller
+    #settings from before the controller existed (set_quality calls from now on reach it directly)
+    if self.quality:
+      controller.set_quality(**self.quality)
+    if self.stopped:
+      controller.stop()
+      return
+    GESTURE.info("Gesture controls ready")
+
+  @property
+  def ready(self):
+    return self.controller is not None
+
+  @property
+  def done(self):
+    #loading finished, successfully or not
+    return not self.thread.is_alive()
+
+  def get_current_keys(self, player=None):
+    controller = self.controller
+    return controller.get_current_keys(player) if controller is not None else []
+
+  def latency(self, player=None):
+    controller = self.controller
+    return controller.latency(player) if controller is not None else None
+
+  def latest_sample(self, player=None):
+    controller = self.controller
+    return controller.latest_sample(player) if controller is not None else None
+
+  def set_quality(self, **settings):
+    self.quality.update(settings)
+    controller = self.controller
+    if controller is not None:
+      controller.set_quality(**settings)
+
+  def stop(self):
+    self.stopped = True
+    if self.controller is not None:
+      self.controller.stop()
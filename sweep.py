@@ -0,0 +1,163 @@
+"""Run seeded headless matches over a grid of fighter rules on a process pool.
+
+Usage: python sweep.py OUT [--grid NAME=V1,V2,...]... [--seeds N] [--ticks T] [--rounds R] [--workers W]
+
+Every combination of grid values is played on the same seeded input scripts.
+Results stream into OUT as a columnar file (see columnar.py) in task order, so
+the file is identical for any worker count.
+"""
+import argparse
+import itertools
+import os
+import time
+from multiprocessing import Pool, shared_memory
+
+import numpy as np
+from batch_engine import BatchMatch, DEFAULT_RULES
+from columnar import ColumnWriter
+from engine import random_script
+
+RULE_NAMES = ["SPEED", "GRAVITY", "JUMP_VELOCITY", "ATTACK_DAMAGE", "ATTACK_COOLDOWN", "ATTACK_WIDTH"]
+#one row per match
+RESULT_COLUMNS = [("config", "u4", ()), ("seed", "u4", ())] + [(name, "f8", ()) for name in RULE_NAMES] + [
+  ("score", "u2", (2,)),
+  ("rounds", "u2", ()),
+  ("ticks", "u4", ()),
+  ("health", "i2", (2,)),
+]
+SCRIPT_SEED_OFFSET = 1000003#player 2 script seed = seed + offset
+SEEDS_PER_TASK = 256
+
+#read-only state each worker receives once from the pool initializer
+_shared = {}
+
+
+def build_grid(grid):
+  #expand {rule name: [values]} into a list of rule dicts, one per combination
+  names = list(grid)
+  return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def build_scripts(seeds, ticks):
+  #(seeds, 2, ticks) input masks, one pair of scripts per seed
+  scripts = np.empty((len(seeds), 2, ticks), dtype=np.uint8)
+  for i, seed in enumerate(seeds):
+    scripts[i, 0] = random_script(seed, ticks)
+    scripts[i, 1] = random_script(seed + SCRIPT_SEED_OFFSET, ticks)
+  return scripts
+
+
+def _init_worker(configs, seeds, shm_name, shape, ticks, rounds, match_options):
+  #attach to the shared script block instead of pickling scripts into every task
+  shm = shared_memory.SharedMemory(name=shm_name)
+  _shared.update(configs=configs, seeds=seeds, ticks=ticks, rounds=rounds, match_options=match_options, shm=shm,
+                 scripts=np.ndarray(shape, dtype=np.uint8, buffer=shm.buf))
+
+
+def play_task(task):
+  #play one block of seeds under one config; results depend only on (config, seed), never on the blocking
+  config_index, start, stop = task
+  rules = _shared["configs"][config_index]
+  scripts = _shared["scripts"][start:stop]
+  ticks = _shared["ticks"]
+  target = _shared["rounds"]
+  n = stop - start
+  batch = BatchMatch(n, rules=rules, **_shared["match_options"])
+
+  score = np.zeros((2, n), dtype=np.int32)
+  health = np.zeros((2, n), dtype=np.int32)
+  end_tick = np.full(n, ticks, dtype=np.int64)
+  done = np.zeros(n, dtype=bool)
+  for tick in range(ticks):
+    batch.step(scripts[:, 0, tick], scripts[:, 1, tick])
+    if target is not None:
+      #freeze each match's result on the tick it reaches the round target
+      finished = ~done & (batch.rounds >= target)
+      if finished.any():
+        score[:, finished] = batch.score[:, finished]
+        health[:, finished] = batch.health[:, finished]
+        end_tick[finished] = batch.tick
+        done |= finished
+        if done.all():
+          break
+  score[:, ~done] = batch.score[:, ~done]
+  health[:, ~done] = batch.health[:, ~done]
+  rounds = np.minimum(batch.rounds, target) if target is not None else batch.rounds
+  return config_index, start, score, rounds, end_tick, health
+
+
+def run_sweep(path, grid, seeds, ticks, rounds=None, workers=None, match_options=None, report=print):
+  #play every (config, seed) pair and stream one result row per match into path
+  configs = build_grid(grid)
+  seeds = list(seeds)
+  workers = workers or os.cpu_count()
+  match_options = match_options or {}
+  scripts = build_scripts(seeds, ticks)
+  shm = shared_memory.SharedMemory(create=True, size=max(scripts.nbytes, 1))
+  np.ndarray(scripts.shape, dtype=np.uint8, buffer=shm.buf)[:] = scripts
+  init_args = (configs, seeds, shm.name, scripts.shape, ticks, rounds, match_options)
+  tasks = [(c, start, min(start + SEEDS_PER_TASK, len(seeds)))
+           for c in range(len(configs)) for start in range(0, len(seeds), SEEDS_PER_TASK)]
+
+  writer = ColumnWriter(path, RESULT_COLUMNS)
+  start_time = time.perf_counter()
+  try:
+    if workers == 1:
+      _init_worker(*init_args)
+      results = map(play_task, tasks)
+      _write_results(writer, configs, seeds, results)
+      _shared.clear()
+    else:
+      with Pool(workers, initializer=_init_worker, initargs=init_args) as pool:
+        #imap keeps task order, so the file does not depend on which worker finishes first
+        _write_results(writer, configs, seeds, pool.imap(play_task, tasks))
+  finally:
+    writer.close()
+    shm.close()
+    shm.unlink()
+  elapsed = time.perf_counter() - start_time
+  matches = len(configs) * len(seeds)
+  report(f"{matches} matches ({len(configs)} configs x {len(seeds)} seeds) on {workers} workers in {elapsed:.2f} s: "
+         f"{matches / elapsed:,.0f} matches/s, {matches / elapsed / workers:,.0f} matches/s/core")
+  return matches, elapsed
+
+
+def _write_results(writer, configs, seeds, results):
+  for config_index, start, score, rounds, end_tick, health in results:
+    rules = dict(DEFAULT_RULES, **configs[config_index])
+    values = {name: rules[name] for name in RULE_NAMES}
+    for i in range(len(end_tick)):
+      writer.append(config=config_index, seed=seeds[start + i], score=score[:, i], rounds=rounds[i],
+                    ticks=end_tick[i], health=health[:, i], **values)
+
+
+def _parse_grid(items):
+  grid = {}
+  for item in items:
+    name, _, values = item.partition("=")
+    name = name.strip().upper()
+    if name not in RULE_NAMES:
+      raise SystemExit(f"unknown rule {name!r}, expected one of {', '.join(RULE_NAMES)}")
+    grid[name] = [float(v) if "." in v else int(v) for v in values.split(",")]
+  return grid
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Sweep fighter rules over seeded headless matches")
+  parser.add_argument("out", help="columnar results file")
+  parser.add_argument("--grid", action="append", default=[], metavar="NAME=V1,V2",
+                      help=f"rule values to sweep ({', '.join(RULE_NAMES)})")
+  parser.add_argument("--seeds", type=int, default=1000, help="matches per config")
+  parser.add_argument("--first-seed", type=int, default=0)
+  parser.add_argument("--ticks", type=int, default=3600, help="tick limit per match")
+  parser.add_argument("--rounds", type=int, default=None, help="stop each match after this many rounds")
+  parser.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+  args = parser.parse_args()
+  if os.path.exists(args.out):
+    os.remove(args.out)#a sweep always writes a fresh file
+  run_sweep(args.out, _parse_grid(args.grid), range(args.first_seed, args.first_seed + args.seeds), args.ticks,
+            args.rounds, args.workers)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,12 @@
+import pytest
+
+from batch_engine import PARITY_OPTIONS, check_parity
+
+
+#every tick of every match must equal the Fighter/Match reference, so a rule change in fighter.py or
+#engine.py that batch_engine does not follow fails here
+@pytest.mark.parametrize("options", PARITY_OPTIONS, ids=lambda options: ",".join(options) or "default")
+@pytest.mark.parametrize("seed", [0, 1])
+def test_parity(options, seed):
+  mismatches = check_parity(n=32, ticks=2000, seed=seed, **options)
+  assert not mismatches, mismatches[:3]